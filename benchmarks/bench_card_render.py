@@ -0,0 +1,134 @@
+"""
+通知卡片渲染基准：Pillow 直接绘制，可选与无头浏览器截图 HTML 模板对比
+
+用法（在插件根目录执行）：
+    python benchmarks/bench_card_render.py [--font 字体路径] [--rounds 次数]
+
+以 test_data.json 中录制的事件为样本，分别生成单个事件和 5 个事件的摘要卡片，
+测量每次渲染的耗时和输出图片大小。
+
+HTML 一栏不是 AstrBot 的 html_render（它需要运行中的 AstrBot 和 t2i 服务），
+而是用 Playwright 的 Chromium 直接截图同一个模板，只能作为本地渲染开销的近似：
+不含 html_render 的模板上传、排队和图片下载，远程 t2i 服务还会叠加网络往返时间。
+未安装 Playwright 时只测量 Pillow。与真实 html_render 的对比需要在 AstrBot 中
+分别用两种 image_renderer 运行，并查看 /yandere metrics 中按渲染方式统计的 render_seconds。
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name: str, relative_path: str):
+    """直接按文件加载模块，不经过 src/__init__.py，因此无需安装 AstrBot"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+card_renderer = load_module("card_renderer", "src/card_renderer.py")
+
+SAMPLE_DESCRIPTION = ("（瞳孔发亮）呀~{username}君往{repo}推送了{count}个提交...让我看看你都写了些什么♥\n"
+                      "啊...修复了调度器里一个很长很长的问题...{username}君的代码真是太棒了呢 ♥")
+
+
+def make_events(count: int):
+    """从录制的事件生成 process_event 格式的字典"""
+    with open(os.path.join(ROOT, "test_data.json"), "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    events = []
+    for i in range(count):
+        event = fixtures[i % len(fixtures)]
+        username = event.get("actor", {}).get("login", "")
+        repo = event.get("repo", {}).get("name", "")
+        events.append({
+            "type": event.get("type", ""),
+            "repo_name": repo,
+            "description": SAMPLE_DESCRIPTION.format(
+                username=username, repo=repo, count=len(event.get("payload", {}).get("commits", []))),
+            "created_at": event.get("created_at", "").replace("T", " ").rstrip("Z")
+        })
+    return events
+
+
+def render_html(events, remaining_text: str) -> str:
+    env = Environment(
+        loader=FileSystemLoader(os.path.join(ROOT, "src", "templates")),
+        autoescape=select_autoescape(["html", "xml"]),
+        trim_blocks=True,
+        lstrip_blocks=True
+    )
+    return env.get_template("notification.html").render(
+        username=events[0]["repo_name"].split("/")[0], events=events, remaining_text=remaining_text)
+
+
+def report(label: str, timings, size: int):
+    timings = sorted(timings)
+    print(f"  {label:<8} 平均 {statistics.mean(timings) * 1000:8.1f} ms  "
+          f"中位 {statistics.median(timings) * 1000:8.1f} ms  输出 {size / 1024:7.1f} KB")
+
+
+def bench_pillow(renderer, events, remaining_text: str, rounds: int):
+    fd, path = tempfile.mkstemp(suffix=".jpg")
+    os.close(fd)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        renderer.render(events, remaining_text, path)
+        timings.append(time.perf_counter() - start)
+    size = os.path.getsize(path)
+    os.remove(path)
+    report("pillow", timings, size)
+
+
+async def bench_browser(html: str, rounds: int):
+    try:
+        from playwright.async_api import async_playwright
+    except ImportError:
+        print("  chromium Playwright 未安装，跳过（pip install playwright && playwright install chromium）")
+        return
+    fd, path = tempfile.mkstemp(suffix=".jpg")
+    os.close(fd)
+    timings = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        page = await browser.new_page(viewport={"width": card_renderer.PillowCardRenderer.WIDTH, "height": 520})
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await page.set_content(html)
+            await page.screenshot(path=path, full_page=True, type="jpeg", quality=90)
+            timings.append(time.perf_counter() - start)
+        await browser.close()
+    size = os.path.getsize(path)
+    os.remove(path)
+    report("chromium", timings, size)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--font", default="", help="中文字体路径，留空时自动查找")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    renderer = card_renderer.PillowCardRenderer(args.font)
+    for label, count, remaining_text in (("单个事件", 1, ""), ("摘要（5个事件）", 5, "还有3个动态...真是太活跃了呢 ♥")):
+        events = make_events(count)
+        print(f"{label}：")
+        if renderer.available:
+            bench_pillow(renderer, events, remaining_text, args.rounds)
+        else:
+            print("  pillow   Pillow 未安装或找不到中文字体，跳过（可用 --font 指定）")
+        asyncio.run(bench_browser(render_html(events, remaining_text), args.rounds))
+
+
+if __name__ == "__main__":
+    main()
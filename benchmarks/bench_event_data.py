@@ -0,0 +1,107 @@
+"""
+GitHubEventData 内存/CPU 对比：旧版 dataclass vs 当前 __slots__ 实现
+
+用法（在插件根目录执行）：
+    python benchmarks/bench_event_data.py [用户数]
+
+构造一个合成的“N 个用户 × 每人 30 条事件”的动态，分别测量：
+- 构造全部事件对象的耗时与对象自身占用的内存（不含两种实现都引用的事件内容）
+- 去重热路径（读取 id 与事件时间）的耗时
+"""
+import importlib.util
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name: str, relative_path: str):
+    """直接按文件加载模块，不经过 src/__init__.py，因此无需安装 AstrBot"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+GitHubEventData = load_module("github_event_data", "src/github_event_data.py").GitHubEventData
+
+
+@dataclass
+class LegacyGitHubEventData:
+    """旧版实现：所有字段都是实例属性，时间在每个使用处单独 strptime"""
+    id: str
+    type: str
+    actor: Dict[str, Any]
+    repo: Dict[str, Any]
+    payload: Dict[str, Any]
+    public: bool
+    created_at: str
+    org: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LegacyGitHubEventData':
+        return cls(
+            id=str(data.get("id")),
+            type=data.get("type", ""),
+            actor=data.get("actor", {}),
+            repo=data.get("repo", {}),
+            payload=data.get("payload", {}),
+            public=data.get("public", True),
+            created_at=data.get("created_at", ""),
+            org=data.get("org")
+        )
+
+
+def make_feed(users: int, events_per_user: int = 30):
+    feed = []
+    event_id = 40000000000
+    for user in range(users):
+        for i in range(events_per_user):
+            event_id += 1
+            feed.append({
+                "id": str(event_id),
+                "type": "PushEvent",
+                "actor": {"id": user, "login": f"user{user}", "avatar_url": "https://avatars.githubusercontent.com/u/1"},
+                "repo": {"id": user, "name": f"user{user}/repo{i % 5}", "url": "https://api.github.com/repos/x/y"},
+                "payload": {"ref": "refs/heads/main", "commits": [{"sha": "0" * 40, "message": "fix: bug " * 8}]},
+                "public": True,
+                "created_at": f"2024-01-{1 + i % 28:02d}T12:{i % 60:02d}:00Z"
+            })
+    return feed
+
+
+def measure(label: str, cls, feed, parse_time):
+    tracemalloc.start()
+    start = time.perf_counter()
+    events = [cls.from_dict(data) for data in feed]
+    build_seconds = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(3):  # 去重、调度和渲染各读取一次事件时间
+        for event in events:
+            _ = event.id
+            parse_time(event)
+    dedup_seconds = time.perf_counter() - start
+
+    print(f"{label:<22} 构造 {build_seconds * 1000:8.1f} ms   "
+          f"对象内存 {current / 1024 / 1024:7.2f} MiB   时间读取x3 {dedup_seconds * 1000:8.1f} ms")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    feed = make_feed(users)
+    print(f"合成动态：{users} 个用户，共 {len(feed)} 条事件")
+    measure("dataclass（旧）", LegacyGitHubEventData, feed,
+            lambda e: datetime.strptime(e.created_at, "%Y-%m-%dT%H:%M:%SZ"))
+    measure("__slots__（当前）", GitHubEventData, feed, lambda e: e.created_datetime)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+GitHub 响应 JSON 解码基准：标准库 json vs orjson，以及大响应放到工作线程后的事件循环延迟
+
+用法（在插件根目录执行）：
+    python benchmarks/bench_json_decode.py
+
+以 test_data.json 中录制的事件为样本，生成一页 30 条的普通动态和一个约 1MB 的大响应
+（模拟携带大量提交的 PushEvent），分别测量解码耗时；再在事件循环中运行一个 1ms 的心跳协程，
+比较在事件循环线程中解码与 decode_json（超过阈值时使用工作线程）造成的最大心跳延迟。
+"""
+import asyncio
+import copy
+import importlib.util
+import json
+import os
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name: str, relative_path: str):
+    """直接按文件加载模块，不经过 src/__init__.py，因此无需安装 AstrBot"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+json_decoder = load_module("json_decoder", "src/json_decoder.py")
+
+
+def make_payloads():
+    with open(os.path.join(ROOT, "test_data.json"), "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+
+    page = [copy.deepcopy(fixtures[i % len(fixtures)]) for i in range(30)]
+    for i, event in enumerate(page):
+        event["id"] = str(40000000000 + i)
+
+    large = copy.deepcopy(page)
+    for event in large:
+        if event.get("type") == "PushEvent":
+            commits = event["payload"]["commits"]
+            event["payload"]["commits"] = [dict(commits[i % len(commits)], sha=f"{i:040d}") for i in range(120)]
+    return json.dumps(page).encode(), json.dumps(large).encode()
+
+
+def bench_decode(label: str, loads, raw: bytes, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        loads(raw)
+    per_call = (time.perf_counter() - start) / rounds
+    print(f"  {label:<8} {per_call * 1e6:10.1f} µs/次")
+
+
+async def max_loop_lag(decode, raw: bytes, rounds: int) -> float:
+    """在解码的同时运行 1ms 心跳，返回观察到的最大心跳延迟（毫秒）"""
+    lag = 0.0
+    running = True
+
+    async def heartbeat():
+        nonlocal lag
+        while running:
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - expected)
+
+    task = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    for _ in range(rounds):
+        await decode(raw)
+        await asyncio.sleep(0)
+    running = False
+    await task
+    return lag * 1000
+
+
+async def bench_loop_lag(raw: bytes):
+    async def inline(data):
+        return json.loads(data)
+
+    async def offloaded(data):
+        return await json_decoder.decode_json(data)
+
+    print(f"  事件循环内解码（json）      最大延迟 {await max_loop_lag(inline, raw, 20):8.2f} ms")
+    print(f"  decode_json（{json_decoder.get_backend_name()}，线程）  最大延迟 {await max_loop_lag(offloaded, raw, 20):8.2f} ms")
+
+
+def main():
+    page, large = make_payloads()
+    for label, raw, rounds in (("普通动态页", page, 2000), ("大响应", large, 50)):
+        print(f"{label}：{len(raw) / 1024:.1f} KB")
+        bench_decode("json", json.loads, raw, rounds)
+        if json_decoder.orjson is not None:
+            bench_decode("orjson", json_decoder.orjson.loads, raw, rounds)
+        else:
+            print("  orjson   未安装")
+    print(f"大响应解码时的事件循环延迟（阈值 {json_decoder.LARGE_RESPONSE_BYTES // 1024} KB）：")
+    asyncio.run(bench_loop_lag(large))
+
+
+if __name__ == "__main__":
+    main()
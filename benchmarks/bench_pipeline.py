@@ -0,0 +1,346 @@
+"""
+端到端吞吐基准：GitHubAPI → EventProcessor → NotificationRenderer → NotificationSender
+
+用法（在插件根目录执行）：
+    python benchmarks/bench_pipeline.py [--users 10,100,1000,10000] [--cycles 3] [--latency-ms 20]
+                                        [--active-ratio 0.1] [--digest] [--tracemalloc]
+                                        [--output 结果.json] [--compare 旧结果.json]
+
+启动一个本地 aiohttp 服务模拟 GitHub 的 /users/{u}/events（ETag 条件请求、Link 分页、可配置延迟、
+速率限制响应头），用临时 SQLite 文件代替 AstrBot 数据库，用计数的 send_message 代替真实发送，
+让插件的真实流水线逐轮检查所有用户。第一轮是冷启动（每个用户都有新事件），之后每轮只有
+active-ratio 比例的用户产生新动态，其余用户应当命中 304。
+
+每个规模报告每轮耗时、每个用户的数据库查询数、HTTP 请求数/304 数、发送的通知数和内存，
+结果保存为 JSON（默认 benchmarks/results/），可用 --compare 与旧版本的结果对比。
+未安装 AstrBot 时使用 tests/astrbot_stand_ins.py 中最小的替代模块。
+"""
+import argparse
+import asyncio
+import copy
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests.astrbot_stand_ins import install_astrbot_stand_ins  # noqa: E402
+
+install_astrbot_stand_ins()
+
+from astrbot.api import logger  # noqa: E402
+from src.config_manager import ConfigManager  # noqa: E402
+from src.event_processor import EventProcessor  # noqa: E402
+from src.feed_validator_manager import FeedValidatorManager  # noqa: E402
+from src.github_api import GitHubAPI  # noqa: E402
+from src.metrics import metrics  # noqa: E402
+from src.notification_pipeline import NotificationPipeline  # noqa: E402
+from src.notification_renderer import NotificationRenderer  # noqa: E402
+from src.notification_sender import NotificationSender  # noqa: E402
+from src.pushed_event_id_manager import PushedEventIdManager  # noqa: E402
+
+EVENTS_PER_USER = 30
+MAX_EVENTS = 300
+
+
+class FakeGitHub:
+    """模拟 GitHub 用户动态接口，事件ID全局递增，按时间倒序返回"""
+
+    def __init__(self, latency: float, seed: int = 0):
+        self.latency = latency
+        self.random = random.Random(seed)
+        with open(os.path.join(ROOT, "test_data.json"), "r", encoding="utf-8") as f:
+            self.fixtures = json.load(f)
+        self.next_id = 40000000000
+        self.events = {}
+        self.requests = 0
+        self.not_modified = 0
+        self.base_url = ""
+
+    def _make_event(self, username: str) -> dict:
+        event = copy.deepcopy(self.fixtures[self.next_id % len(self.fixtures)])
+        event["id"] = str(self.next_id)
+        event["actor"] = {"login": username, "display_login": username}
+        event["repo"] = {"name": f"{username}/repo"}
+        event["created_at"] = (datetime.now(timezone.utc) - timedelta(seconds=MAX_EVENTS)
+                               + timedelta(seconds=self.next_id % MAX_EVENTS)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.next_id += 1
+        return event
+
+    def add_events(self, username: str, count: int) -> None:
+        events = self.events.setdefault(username, [])
+        events[:0] = [self._make_event(username) for _ in range(count)][::-1]
+        del events[MAX_EVENTS:]
+
+    def seed_users(self, usernames) -> None:
+        for username in usernames:
+            self.add_events(username, EVENTS_PER_USER)
+
+    def advance(self, usernames, active_ratio: float) -> int:
+        """让一部分用户产生 1~3 条新动态，返回新事件数"""
+        active = self.random.sample(usernames, max(1, int(len(usernames) * active_ratio))) if active_ratio > 0 else []
+        total = 0
+        for username in active:
+            count = self.random.randint(1, 3)
+            self.add_events(username, count)
+            total += count
+        return total
+
+    async def handle_user_events(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        username = request.match_info["username"]
+        events = self.events.get(username)
+        if events is None:
+            return web.json_response({"message": "Not Found"}, status=404)
+
+        headers = {
+            "X-RateLimit-Limit": "1000000",
+            "X-RateLimit-Remaining": "999999",
+            "X-RateLimit-Reset": str(int(time.time()) + 3600),
+            "ETag": f'W/"{username}-{events[0]["id"]}"',
+        }
+        if request.headers.get("If-None-Match") == headers["ETag"]:
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+
+        per_page = min(int(request.query.get("per_page", 30)), 100)
+        page = int(request.query.get("page", 1))
+        body = events[(page - 1) * per_page:page * per_page]
+        if page * per_page < len(events):
+            headers["Link"] = (f'<{self.base_url}/users/{username}/events?per_page={per_page}&page={page + 1}>; '
+                               f'rel="next"')
+        return web.json_response(body, headers=headers)
+
+    async def start(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_get("/users/{username}/events", self.handle_user_events)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return runner
+
+
+class BenchDB:
+    """临时目录中的 SQLite 数据库（与 AstrBot 相同使用 aiosqlite），并统计执行的SQL语句数
+
+    不使用共享单连接的内存数据库：并发会话共用一个连接时事务会互相干扰。
+    """
+
+    def __init__(self, path: str):
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        self.sessionmaker = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.queries = 0
+        sqlalchemy_event.listen(self.engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args, **kwargs) -> None:
+        self.queries += 1
+
+    @asynccontextmanager
+    async def get_db(self):
+        async with self.sessionmaker() as session:
+            yield session
+
+
+class BenchContext:
+    """AstrBot Context 的替代：提供数据库，send_message 只计数"""
+
+    def __init__(self, db_path: str, send_latency: float):
+        self.db = BenchDB(db_path)
+        self.send_latency = send_latency
+        self.sent = 0
+
+    def get_db(self) -> BenchDB:
+        return self.db
+
+    async def send_message(self, session: str, message_chain) -> bool:
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        return True
+
+
+def rss_mb() -> float:
+    """进程的峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def bench_size(user_count: int, args) -> dict:
+    fake_github = FakeGitHub(args.latency_ms / 1000, seed=user_count)
+    runner = await fake_github.start()
+    usernames = [f"user{i:05d}" for i in range(user_count)]
+    fake_github.seed_users(usernames)
+
+    temp_dir = tempfile.TemporaryDirectory()
+    context = BenchContext(os.path.join(temp_dir.name, "data.db"), args.send_latency_ms / 1000)
+    config_manager = ConfigManager({
+        "github_api_base_url": fake_github.base_url,
+        "github_token": "bench",
+        "github_api_pool_size": args.concurrency,
+        "max_concurrent_requests": args.concurrency,
+        "enable_image_notification": False,
+        "enable_digest_notification": args.digest,
+        "platform_send_rate": 0,
+        "outbox_max_attempts": 0,
+        "enable_metrics": True,
+    })
+    github_api = GitHubAPI(config_manager, FeedValidatorManager(context))
+    pushed_event_ids_manager = PushedEventIdManager(context, config_manager.get_seen_cache_size())
+    event_processor = EventProcessor(
+        config_manager.get_notification_event_limit(), pushed_event_ids_manager, config_manager)
+    notification_sender = NotificationSender(NotificationRenderer(config_manager), context, html_render=None)
+    pipeline = NotificationPipeline(github_api, event_processor, notification_sender, config_manager)
+    target_sessions = ["bench:10000:GroupMessage"]
+
+    metrics.reset()
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+
+    await github_api.start()
+    pipeline.start()
+    cycles = []
+    try:
+        for cycle in range(args.cycles):
+            new_events = fake_github.advance(usernames, args.active_ratio) if cycle else user_count * EVENTS_PER_USER
+            requests, not_modified = fake_github.requests, fake_github.not_modified
+            queries, sent = context.db.queries, context.sent
+
+            started = time.perf_counter()
+            futures = [await pipeline.submit(username, target_sessions) for username in usernames]
+            await asyncio.gather(*(future for future in futures if future is not None), return_exceptions=True)
+            await pipeline.drain()
+            elapsed = time.perf_counter() - started
+
+            db_queries = context.db.queries - queries
+            cycles.append({
+                "cycle": cycle + 1,
+                "kind": "cold" if cycle == 0 else "warm",
+                "seconds": round(elapsed, 4),
+                "users_per_second": round(user_count / elapsed, 1),
+                "new_events": new_events,
+                "http_requests": fake_github.requests - requests,
+                "not_modified": fake_github.not_modified - not_modified,
+                "db_queries": db_queries,
+                "db_queries_per_user": round(db_queries / user_count, 3),
+                "notifications_sent": context.sent - sent,
+            })
+    finally:
+        await pipeline.stop()
+        await github_api.close()
+        await runner.cleanup()
+        await context.db.engine.dispose()
+        temp_dir.cleanup()
+
+    memory = {"rss_peak_mb": round(rss_mb(), 1)}
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        memory["python_peak_mb"] = round((peak - traced_before) / 1024 / 1024, 2)
+        memory["python_retained_mb"] = round((current - traced_before) / 1024 / 1024, 2)
+    return {"users": user_count, "cycles": cycles, "memory": memory, "metrics": metrics.format_summary()}
+
+
+def load_plugin_version() -> str:
+    with open(os.path.join(ROOT, "metadata.yaml"), "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("version:"):
+                return line.split(":", 1)[1].split("#", 1)[0].strip()
+    return "unknown"
+
+
+def print_result(result: dict) -> None:
+    memory = "，".join(f"{key} {value}" for key, value in result["memory"].items())
+    print(f"{result['users']} 个用户（{memory}）：")
+    for cycle in result["cycles"]:
+        print(f"  第{cycle['cycle']}轮（{cycle['kind']}） {cycle['seconds'] * 1000:9.1f} ms  "
+              f"{cycle['users_per_second']:9.1f} 用户/秒  请求 {cycle['http_requests']}（304 {cycle['not_modified']}）  "
+              f"SQL {cycle['db_queries']}（{cycle['db_queries_per_user']}/用户）  通知 {cycle['notifications_sent']}")
+
+
+def print_comparison(results: list, baseline_path: str) -> None:
+    """按规模和轮次对比耗时与每用户查询数"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["users"], c["cycle"]): c for r in baseline["results"] for c in r["cycles"]}
+    print(f"\n与 {baseline_path}（{baseline.get('plugin_version', '?')}）对比：")
+    for result in results:
+        for cycle in result["cycles"]:
+            old = previous.get((result["users"], cycle["cycle"]))
+            if not old:
+                continue
+            change = (cycle["seconds"] - old["seconds"]) / old["seconds"] * 100 if old["seconds"] else 0.0
+            print(f"  {result['users']:>6} 用户 第{cycle['cycle']}轮  {old['seconds'] * 1000:9.1f} → "
+                  f"{cycle['seconds'] * 1000:9.1f} ms（{change:+.1f}%）  SQL/用户 "
+                  f"{old['db_queries_per_user']} → {cycle['db_queries_per_user']}")
+
+
+async def main_async(args) -> list:
+    results = []
+    for user_count in args.users:
+        result = await bench_size(user_count, args)
+        print_result(result)
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=lambda v: [int(n) for n in v.split(",")], default=[10, 100, 1000, 10000],
+                        help="逗号分隔的用户规模")
+    parser.add_argument("--cycles", type=int, default=3, help="每个规模检查的轮数（第一轮为冷启动）")
+    parser.add_argument("--latency-ms", type=float, default=20, help="模拟的GitHub响应延迟")
+    parser.add_argument("--send-latency-ms", type=float, default=0, help="模拟的消息发送延迟")
+    parser.add_argument("--active-ratio", type=float, default=0.1, help="每轮产生新动态的用户比例")
+    parser.add_argument("--concurrency", type=int, default=20, help="max_concurrent_requests 与连接池大小")
+    parser.add_argument("--digest", action="store_true", help="使用摘要通知")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计Python内存分配（会拖慢运行）")
+    parser.add_argument("--output", default="", help="结果JSON路径，默认 benchmarks/results/pipeline-<版本>-<时间>.json")
+    parser.add_argument("--compare", default="", help="与之前保存的结果JSON对比")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    if args.tracemalloc:
+        tracemalloc.start()
+    results = asyncio.run(main_async(args))
+
+    version = load_plugin_version()
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"pipeline-{version}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "plugin_version": version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
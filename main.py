@@ -4,18 +4,31 @@ Yandere Github Stalker Plugin
 import asyncio
 import json
 import os
+import time
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger, AstrBotConfig
 from astrbot.core.star.filter.permission import PermissionType
 from datetime import datetime
+from typing import List
 
 from .src.github_api import GitHubAPI
+from .src.user_poll_scheduler import UserPollScheduler
+from .src.received_feed_router import ReceivedFeedRouter
+from .src.feed_validator_manager import FeedValidatorManager
 from .src.notification_renderer import NotificationRenderer
 from .src.pushed_event_id_manager import PushedEventIdManager
 from .src.event_processor import EventProcessor
 from .src.notification_sender import NotificationSender
+from .src.platform_rate_limiter import PlatformRateLimiter
+from .src.render_cache import RenderCache
+from .src.image_compressor import ImageCompressor
+from .src.user_profile_cache import UserProfileCache
+from .src.outbox_manager import OutboxManager
+from .src.outbox_drainer import OutboxDrainer
+from .src.notification_pipeline import NotificationPipeline
 from .src.config_manager import ConfigManager
+from .src.metrics import metrics, MetricsServer
 from .src.github_event_data import GitHubEventData
 
 
@@ -27,13 +40,17 @@ class YandereGithubStalker(Star):
 
         # 初始化组件
         self.config_manager = ConfigManager(config)
-        self.github_api = GitHubAPI(self.config_manager)
+        metrics.enabled = self.config_manager.is_metrics_enabled()
+        self.metrics_server = MetricsServer(metrics)
+        self.feed_validator_manager = FeedValidatorManager(context)
+        self.github_api = GitHubAPI(self.config_manager, self.feed_validator_manager)
 
         # 初始化事件ID管理器
         os.makedirs("data", exist_ok=True)
         self.pushed_event_ids_path = os.path.join(
             "data", "github_pushed_event_ids.json")
-        self.pushed_event_ids_manager = PushedEventIdManager(context)
+        self.pushed_event_ids_manager = PushedEventIdManager(
+            context, self.config_manager.get_seen_cache_size())
 
         # 初始化其他组件
         self.event_processor = EventProcessor(
@@ -41,12 +58,33 @@ class YandereGithubStalker(Star):
             pushed_event_ids_manager=self.pushed_event_ids_manager,
             config_manager=self.config_manager
         )
-        self.notification_renderer = NotificationRenderer(self.config_manager)
+        self.user_scheduler = UserPollScheduler(self.config_manager)
+        self.feed_router = ReceivedFeedRouter(self.github_api, self.config_manager)
+        self._next_feed_poll_at = 0.0
+        self.profile_cache = UserProfileCache(
+            self.github_api,
+            os.path.join("data", "yandere_github_stalker", "profiles"),
+            self.config_manager.get_profile_cache_ttl_hours() * 3600)
+        self.notification_renderer = NotificationRenderer(self.config_manager, self.profile_cache)
+        self.platform_rate_limiter = PlatformRateLimiter(self.config_manager)
+        self.render_cache = RenderCache(
+            os.path.join("data", "yandere_github_stalker", "render_cache"),
+            self.config_manager.get_render_cache_max_mb() * 1024 * 1024,
+            self.config_manager.get_render_cache_max_age_hours() * 3600)
         self.notification_sender = NotificationSender(
             notification_renderer=self.notification_renderer,
             context=self.context,
-            html_render=self.html_render
+            html_render=self.html_render,
+            rate_limiter=self.platform_rate_limiter,
+            render_cache=self.render_cache,
+            image_compressor=ImageCompressor(self.config_manager)
         )
+        self.outbox_manager = OutboxManager(
+            context, os.path.join("data", "yandere_github_stalker", "outbox"))
+        self.outbox = OutboxDrainer(self.outbox_manager, self.notification_sender, self.config_manager)
+        self.pipeline = NotificationPipeline(
+            self.github_api, self.event_processor, self.notification_sender, self.config_manager,
+            self.profile_cache, self.outbox)
 
         # 初始化状态
         self.is_monitoring = False
@@ -86,24 +124,36 @@ class YandereGithubStalker(Star):
                 "created_at", ""), reverse=True)[:3]
             username = test_events[0].get("actor", {}).get(
                 "login", "test") if test_events else "test"
-
-            if self.config_manager.is_image_notification_enabled():
+            if self.config_manager.is_image_notification_enabled() and self.config_manager.is_user_profile_enabled():
+                await self.profile_cache.refresh(username)
+
+            if self.config_manager.is_digest_notification_enabled():
+                _, results = await self.notification_sender.send_digest_notification(
+                    username,
+                    [GitHubEventData.from_dict(test_event) for test_event in test_events],
+                    [event.unified_msg_origin],
+                    self.config_manager.get_digest_max_events(),
+                    self.config_manager.is_image_notification_enabled()
+                )
+                if not self.notification_sender.is_delivered(results):
+                    return event.plain_result("❌ 摘要通知发送失败").stop_event()
+            elif self.config_manager.is_image_notification_enabled():
                 for test_event in test_events:
-                    success = await self.notification_sender.send_image_notification(
+                    results = await self.notification_sender.send_image_notification(
                         username,
                         GitHubEventData.from_dict(test_event),
                         [event.unified_msg_origin]
                     )
-                    if not success:
+                    if not self.notification_sender.is_delivered(results):
                         return event.plain_result("❌ 图片生成失败").stop_event()
             else:
                 for test_event in test_events:
-                    success = await self.notification_sender.send_text_notification(
+                    results = await self.notification_sender.send_text_notification(
                         username,
-                        test_event,
+                        GitHubEventData.from_dict(test_event),
                         [event.unified_msg_origin]
                     )
-                    if not success:
+                    if not self.notification_sender.is_delivered(results):
                         return event.plain_result("❌ 文本通知发送失败").stop_event()
 
             return event.plain_result("✅ 测试完成").stop_event()
@@ -121,12 +171,50 @@ class YandereGithubStalker(Star):
             monitored_users = self.config_manager.get_monitored_users()
             total_events = len(self.pushed_event_ids_manager)
             is_monitoring = self.is_monitoring
+            connection_stats = self.github_api.get_connection_stats()
+            rate_status = self.github_api.rate_limiter.get_status(len(monitored_users))
+            cache_stats = self.pushed_event_ids_manager.seen_cache.get_stats()
+            send_stats = self.platform_rate_limiter.get_stats()
+            pipeline_stats = self.pipeline.get_stats()
+            render_stats = self.render_cache.get_stats()
+            profile_stats = self.profile_cache.get_stats()
+            outbox_stats = await self.outbox.get_stats()
+            stage_names = {"fetch": "获取", "render": "渲染", "send": "发送"}
+            pipeline_text = "，".join(
+                f"{stage_names[stage]}{stats['queue_size']}/{stats['queue_capacity']}排队"
+                f"（{stats['workers']}协程，平均{stats['avg_seconds']:.2f}秒，等待下游{stats['blocked_seconds']:.0f}秒）"
+                for stage, stats in pipeline_stats.items()) or "未启动"
+            if rate_status["remaining"] is not None:
+                reset_time = datetime.fromtimestamp(rate_status["reset_at"]).strftime("%H:%M:%S") \
+                    if rate_status["reset_at"] else "未知"
+                quota_text = f"{rate_status['remaining']}/{rate_status['limit']}（{reset_time}重置）"
+            else:
+                quota_text = "未知（尚未请求）"
+            if rate_status["blocked_for"] > 0:
+                quota_text += f"，⛔ 速率限制退避中（剩余{rate_status['blocked_for']:.0f}秒）"
 
             # 构建状态信息
             status_lines = [
                 "📊 Yandere Github Stalker 状态",
                 f"├── 监控状态：{'🟢 运行中' if is_monitoring else '🔴 已停止'}",
                 f"├── 总事件数：{total_events}",
+                f"├── API连接：{connection_stats['requests']}次请求，"
+                f"新建{connection_stats['new_connections']}个，复用{connection_stats['reused_connections']}次，"
+                f"未变化(304){connection_stats['not_modified']}次",
+                f"├── API配额：{quota_text}",
+                f"├── 预计检查周期：{rate_status['cycle_interval']:.0f}秒",
+                f"├── 去重缓存：命中{cache_stats['hits']}次，未命中{cache_stats['misses']}次"
+                f"（命中率{cache_stats['hit_rate']:.1%}，{cache_stats['entries']}条）",
+                f"├── 平台限速：{send_stats['platforms']}个平台，排队{send_stats['throttled']}次"
+                f"（共{send_stats['throttled_seconds']:.1f}秒）",
+                f"├── 流水线：{pipeline_text}",
+                f"├── 渲染缓存：命中{render_stats['hits']}次，未命中{render_stats['misses']}次"
+                f"（命中率{render_stats['hit_rate']:.1%}，{render_stats['entries']}张，"
+                f"{render_stats['bytes'] / 1024 / 1024:.1f}MB，淘汰{render_stats['evictions']}次）",
+                f"├── 用户资料：缓存{profile_stats['profiles']}个，请求{profile_stats['requests']}次"
+                f"（未变化{profile_stats['not_modified']}次），下载头像{profile_stats['avatar_downloads']}次",
+                f"├── 发件箱：{outbox_stats['pending']}个会话等待重试，死信{outbox_stats['dead']}个"
+                f"（本次运行重试{outbox_stats['retried']}次，成功{outbox_stats['recovered']}次）",
                 "└── 监控列表："
             ]
 
@@ -137,7 +225,9 @@ class YandereGithubStalker(Star):
                         # 获取每个用户的事件数
                         event_count = await self.pushed_event_ids_manager.get_pushed_event_count(user)
                         prefix = "└──" if i == len(monitored_users) else "├──"
-                        status_lines.append(f"    {prefix} {user}（{event_count}条事件）")
+                        schedule = self.user_scheduler.get_user_schedule(user)
+                        schedule_text = f"，每{schedule[0]:.0f}秒检查，{schedule[1]:.0f}秒后" if schedule else ""
+                        status_lines.append(f"    {prefix} {user}（{event_count}条事件{schedule_text}）")
                     except Exception as e:
                         logger.error(f"获取用户 {user} 事件数量失败: {e}")
                         prefix = "└──" if i == len(monitored_users) else "├──"
@@ -152,6 +242,28 @@ class YandereGithubStalker(Star):
             logger.error(f"获取监控状态失败: {e}")
             return event.plain_result("❌ 获取监控状态失败，请查看日志").stop_event()
 
+    @yandere_group.command("metrics")
+    async def metrics_status(self, event: AstrMessageEvent):
+        """查看各环节的耗时和计数指标"""
+        try:
+            self._prepare_command(event)
+
+            if not metrics.enabled:
+                return event.plain_result("📈 指标统计未启用（enable_metrics）").stop_event()
+            summary = metrics.format_summary()
+            uptime = time.time() - metrics.started_at
+            lines = [f"📈 Yandere Github Stalker 指标（最近{uptime / 3600:.1f}小时）"]
+            if not summary:
+                lines.append("└── 暂无数据")
+            for i, line in enumerate(summary, 1):
+                lines.append(f"{'└──' if i == len(summary) else '├──'} {line}")
+            if self.metrics_server.is_running:
+                lines.append(f"Prometheus：http://127.0.0.1:{self.metrics_server.port}/metrics")
+            return event.plain_result("\n".join(lines)).stop_event()
+        except Exception as e:
+            logger.error(f"获取指标失败: {e}")
+            return event.plain_result("❌ 获取指标失败，请查看日志").stop_event()
+
     @yandere_group.command("add")
     async def add_user(self, event: AstrMessageEvent, username: str):
         """添加一个GitHub用户到视奸列表"""
@@ -163,7 +275,7 @@ class YandereGithubStalker(Star):
                 return event.plain_result(f"❌ 用户 {username} 已经在视奸列表中了哦~").stop_event()
 
             # 验证用户是否存在
-            events = await self.github_api.get_user_events(username)
+            events = await self.github_api.get_user_events(username, conditional=False)
             if not events:
                 return event.plain_result(f"❌ 无法获取用户 {username} 的动态，请检查用户名是否正确").stop_event()
 
@@ -235,6 +347,34 @@ class YandereGithubStalker(Star):
             logger.error(f"Yandere Github Stalker: 禁用会话失败: {e}")
             return event.plain_result(f"禁用失败: {e}").stop_event()
 
+    async def _submit_received_feed(self, covered_users: List[str],
+                                    target_sessions: List[str]) -> None:
+        """获取收到的动态，按用户提交到与单独轮询相同的去重和推送流水线
+
+        上一次收到的动态还没处理完时本轮不获取，处理完之前它的校验值和最新事件ID不会保存。
+        """
+        if self.pipeline.is_feed_busy():
+            logger.debug("Yandere Github Stalker: 上一次收到的动态仍在处理，本轮跳过")
+            return
+        routed_events = await self.feed_router.fetch_routed_events(covered_users)
+        if routed_events is not None:
+            await self.pipeline.submit_feed(routed_events, target_sessions)
+
+    async def _export_metrics(self) -> None:
+        """按配置启用指标，写入 Prometheus 文件，启动或停止本地HTTP服务"""
+        metrics.enabled = self.config_manager.is_metrics_enabled()
+        prometheus_file = self.config_manager.get_metrics_prometheus_file()
+        if metrics.enabled and prometheus_file:
+            await metrics.write_prometheus_file(prometheus_file)
+        port = self.config_manager.get_metrics_http_port()
+        try:
+            if metrics.enabled and port:
+                await self.metrics_server.start(port)
+            else:
+                await self.metrics_server.stop()
+        except Exception as e:
+            logger.error(f"Yandere Github Stalker: 启动指标服务失败（端口 {port}），更换端口前不再重试: {e}")
+
     async def _monitoring_loop(self):
         """监控循环"""
         logger.debug("Yandere Github Stalker: 开始监控循环")
@@ -248,12 +388,17 @@ class YandereGithubStalker(Star):
                     logger.debug("Yandere Github Stalker: 开始清理过期事件ID")
                     retention_days = self.config_manager.get_event_retention_days()
                     success = await self.pushed_event_ids_manager.cleanup_old_events(retention_days)
+                    await self.outbox_manager.cleanup_dead(retention_days)
                     if success:
                         self.last_cleanup_time = now
                         logger.debug("Yandere Github Stalker: 清理完成")
                     else:
                         logger.warning("Yandere Github Stalker: 清理失败，将在下次检查时重试")
 
+                # 配置或schema有变化时重新加载通知模板（每轮只检查一次）
+                self.notification_renderer.refresh_templates()
+                await self._export_metrics()
+
                 # 获取配置
                 monitored_users = self.config_manager.get_monitored_users()
                 target_sessions = self.config_manager.get_target_sessions()
@@ -269,49 +414,46 @@ class YandereGithubStalker(Star):
                     await asyncio.sleep(check_interval)
                     continue
 
-                # 获取并处理每个用户的事件
-                for username in monitored_users:
-                    try:
-                        # 获取用户事件
-                        events = await self.github_api.get_user_events(username)
-                        if not events:
-                            continue
-
-                        # 处理事件
-                        new_events = await self.event_processor.process_events(events, username)
-                        if not new_events:
-                            continue
-
-                        # 推送新事件通知
-                        for event in new_events:
-                            try:
-                                # 根据配置选择通知方式
-                                if self.config_manager.is_image_notification_enabled():
-                                    success = await self.notification_sender.send_image_notification(
-                                        username, event, target_sessions)
-                                else:
-                                    success = await self.notification_sender.send_text_notification(
-                                        username, event, target_sessions)
-
-                                # 标记事件状态
-                                if success:
-                                    if not await self.event_processor.mark_event_as_pushed(event.id, username, event.created_at):
-                                        logger.warning(
-                                            f"Yandere Github Stalker: 事件 {event.id} 标记失败，可能会在下次重复推送")
-                                else:
-                                    # 如果发送失败，也标记为已处理，避免重复推送
-                                    await self.event_processor.mark_event_as_ignored(event.id, username, event.created_at)
-                            except Exception as e:
-                                logger.error(
-                                    f"Yandere Github Stalker: 处理事件 {event.id} 时出错: {str(e)}")
-                                continue
-                    except Exception as e:
-                        logger.error(
-                            f"Yandere Github Stalker: 处理用户 {username} 的事件时出错: {str(e)}")
-                        continue
-
-                # 等待下一次检查
-                await asyncio.sleep(check_interval)
+                # 关注的用户由收到的动态（一次请求）覆盖，其余用户单独轮询
+                covered_users = await self.feed_router.get_covered_users(monitored_users)
+                polled_users = [username for username in monitored_users if username not in covered_users]
+
+                # 基础间隔根据剩余配额和速率限制自动调整
+                base_interval = self.github_api.rate_limiter.get_cycle_interval(
+                    len(polled_users) + (1 if covered_users else 0))
+
+                if covered_users and time.monotonic() >= self._next_feed_poll_at:
+                    self._next_feed_poll_at = time.monotonic() + base_interval
+                    await self._submit_received_feed(covered_users, target_sessions)
+
+                # 只提交已到期的用户；流水线队列已满时 submit 会等待，渲染和发送跟不上时轮询随之放慢
+                self.user_scheduler.sync_users(polled_users)
+                due_users = self.user_scheduler.pop_due()
+                if due_users:
+                    futures = [await self.pipeline.submit(username, target_sessions)
+                               for username in due_users]
+                    results = await asyncio.gather(*(
+                        future for future in futures if future is not None
+                    ), return_exceptions=True)
+                    results = iter(results)
+                    # 根据本次结果和用户活跃度重新调度；上一批通知仍在处理的用户视为活跃，
+                    # 因速率限制没有请求的用户（None）不计入连续无新事件的次数，出错视为没有新事件
+                    for username, future in zip(due_users, futures):
+                        result = next(results) if future is not None else True
+                        had_new_events = None if result is None else result is True
+                        self.user_scheduler.reschedule(
+                            username, base_interval, had_new_events,
+                            self.event_processor.get_latest_event_time(username))
+
+                # 等待到下一个用户到期，但不超过基础间隔，以便及时发现新加入的用户
+                next_due_in = self.user_scheduler.get_next_due_in()
+                if covered_users:
+                    feed_due_in = max(self._next_feed_poll_at - time.monotonic(), 0.0)
+                    next_due_in = feed_due_in if next_due_in is None else min(next_due_in, feed_due_in)
+                sleep_time = base_interval if next_due_in is None else min(next_due_in, base_interval)
+                sleep_time = max(sleep_time, self.github_api.rate_limiter.get_block_remaining(), 1.0)
+                logger.debug(f"Yandere Github Stalker: 下一次检查将在 {sleep_time:.0f} 秒后开始")
+                await asyncio.sleep(sleep_time)
             except Exception as e:
                 logger.error(f"Yandere Github Stalker: 监控循环出错: {str(e)}")
                 await asyncio.sleep(check_interval)  # 出错后也要等待，避免频繁重试
@@ -319,6 +461,9 @@ class YandereGithubStalker(Star):
     async def start(self) -> None:
         """启动插件"""
         if not self.is_monitoring:
+            # 创建GitHub API共享连接池
+            await self.github_api.start()
+
             # 启动时先清理一次数据库
             logger.debug("Yandere Github Stalker: 插件启动，执行初始数据库清理")
             retention_days = self.config_manager.get_event_retention_days()
@@ -326,7 +471,9 @@ class YandereGithubStalker(Star):
             if not success:
                 logger.warning("Yandere Github Stalker: 初始数据库清理失败，将在下次定时任务重试")
             
-            # 启动监控任务
+            # 启动流水线、发件箱重试和监控任务
+            self.pipeline.start()
+            self.outbox.start()
             self.monitoring_task = asyncio.create_task(self._monitoring_loop())
             logger.debug("Yandere Github Stalker: 监控任务已启动")
 
@@ -341,12 +488,29 @@ class YandereGithubStalker(Star):
                 except asyncio.CancelledError:
                     pass
                 self.monitoring_task = None
+            await self.pipeline.stop()
+            await self.outbox.stop()
             logger.info("Yandere Github Stalker: 监控任务已停止")
 
     async def terminate(self):
         """插件卸载时调用"""
         if self.monitoring_task and not self.monitoring_task.done():
             self.monitoring_task.cancel()
+            try:
+                await self.monitoring_task
+            except asyncio.CancelledError:
+                pass
+        await self.pipeline.stop()
+        await self.outbox.stop()
+        await self.metrics_server.stop()
+        # 写入尚未落库的事件标记，避免重启后重复推送
+        if self.event_processor.has_pending_marks():
+            if not await self.event_processor.flush_marks():
+                logger.error("Yandere Github Stalker: 部分事件标记写入失败，重启后可能会重复推送")
+        try:
+            await self.github_api.close()
+        except Exception as e:
+            logger.error(f"Error closing GitHub API session: {e}")
         if hasattr(self, "pushed_event_ids_manager") and self.pushed_event_ids_manager is not None:
             logger.info("Closing pushed event ids manager...")
             try:
@@ -3,14 +3,40 @@
 """
 from .config_manager import ConfigManager
 from .github_api import GitHubAPI
+from .feed_validator_manager import FeedValidatorManager
+from .rate_limit_scheduler import RateLimitScheduler
+from .user_poll_scheduler import UserPollScheduler
+from .received_feed_router import ReceivedFeedRouter
 from .event_processor import EventProcessor
 from .pushed_event_id_manager import PushedEventIdManager
 from .notification_renderer import NotificationRenderer
+from .template_cache import TemplateCache
+from .platform_rate_limiter import PlatformRateLimiter
+from .notification_pipeline import NotificationPipeline
+from .render_cache import RenderCache
+from .card_renderer import PillowCardRenderer
+from .user_profile_cache import UserProfileCache
+from .image_compressor import ImageCompressor
+from .outbox_manager import OutboxManager
+from .outbox_drainer import OutboxDrainer
 
 __all__ = [
     "ConfigManager",
     "GitHubAPI",
+    "FeedValidatorManager",
+    "RateLimitScheduler",
+    "UserPollScheduler",
+    "ReceivedFeedRouter",
     "EventProcessor",
     "PushedEventIdManager",
-    "NotificationRenderer"
+    "NotificationRenderer",
+    "TemplateCache",
+    "PlatformRateLimiter",
+    "NotificationPipeline",
+    "RenderCache",
+    "PillowCardRenderer",
+    "UserProfileCache",
+    "ImageCompressor",
+    "OutboxManager",
+    "OutboxDrainer"
 ] 
\ No newline at end of file
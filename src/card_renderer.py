@@ -0,0 +1,314 @@
+"""
+用 Pillow 直接绘制通知卡片
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+except ImportError:  # Pillow 是可选依赖，未安装时只能使用 html_render
+    Image = None
+
+# 未配置字体时按顺序查找的中文字体
+FONT_CANDIDATES = [
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/msyh.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Medium.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/wqy-microhei/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+]
+
+RED = (255, 0, 0, 255)
+BACKGROUND = (0, 0, 0, 255)
+BADGE_BACKGROUND = (255, 0, 0, 51)
+BORDER = (255, 0, 0, 77)
+# 与 notification.html 中 .event-description 的 text-shadow 一致：(x偏移, y偏移, 颜色)
+DESCRIPTION_SHADOWS = [
+    (10, 10, (255, 0, 0, 77)),
+    (-12, 8, (255, 105, 180, 77)),
+    (8, -12, (255, 20, 147, 77)),
+    (-10, -10, (255, 0, 0, 77)),
+    (12, -8, (255, 105, 180, 77)),
+]
+
+
+def find_font(font_path: str = "") -> Optional[str]:
+    """查找可用的中文字体，优先使用配置的路径"""
+    for path in ([font_path] if font_path else []) + FONT_CANDIDATES:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+class PillowCardRenderer:
+    """按 notification.html 的布局绘制卡片：用户资料、事件类型标签、仓库名、带阴影的描述、时间，以及剩余动态提示
+
+    尺寸与HTML模板的CSS保持一致（body和容器各60px内边距，内容宽1600px）。
+    """
+
+    BODY_PADDING = 60
+    CONTAINER_PADDING = 60
+    CONTENT_WIDTH = 1600
+    WIDTH = CONTENT_WIDTH + 2 * (BODY_PADDING + CONTAINER_PADDING)
+    MIN_HEIGHT = 520
+    USER_INFO_PADDING = 40
+    USER_INFO_GAP = 60
+    USER_INFO_MARGIN = 80
+    AVATAR_SIZE = 240
+    AVATAR_BORDER = 6
+    USERNAME_FONT_SIZE = 72
+    PROFILE_META_FONT_SIZE = 40
+    PROFILE_META_MARGIN = 20
+    ITEM_PADDING = (60, 40)  # (上下, 左右)
+    HEADER_GAP = 30
+    HEADER_PADDING_RIGHT = 40
+    BADGE_FONT_SIZE = 48
+    BADGE_PADDING = (10, 30)
+    BADGE_RADIUS = 16
+    REPO_FONT_SIZE = 56
+    DESCRIPTION_FONT_SIZE = 60
+    DESCRIPTION_LINE_HEIGHT = 1.6
+    DESCRIPTION_MARGIN = 20
+    DESCRIPTION_PADDING_RIGHT = 40
+    SHADOW_BLUR = 2
+    TIME_FONT_SIZE = 36
+    TIME_MARGIN_TOP = 30
+    REMAINING_FONT_SIZE = 48
+    REMAINING_PADDING = 40
+    BORDER_WIDTH = 3
+
+    def __init__(self, font_path: str = "", jpeg_quality: int = 90):
+        self.font_path = find_font(font_path) if Image is not None else None
+        self.jpeg_quality = jpeg_quality
+        self._fonts: Dict[int, Any] = {}
+        # 每个字号下单个字符的宽度，换行时逐字累加，避免反复测量整行
+        self._char_widths: Dict[int, Dict[str, float]] = {}
+
+    @property
+    def available(self) -> bool:
+        """Pillow 已安装且找到了中文字体"""
+        return self.font_path is not None
+
+    def _font(self, size: int):
+        font = self._fonts.get(size)
+        if font is None:
+            # 中文不需要复杂的字形排版，BASIC 布局比 raqm 快得多
+            font = ImageFont.truetype(self.font_path, size, layout_engine=ImageFont.Layout.BASIC)
+            self._fonts[size] = font
+        return font
+
+    def _text_width(self, text: str, size: int) -> float:
+        """按字符宽度累加估算文本宽度"""
+        widths = self._char_widths.setdefault(size, {})
+        font = self._font(size)
+        total = 0.0
+        for char in text:
+            width = widths.get(char)
+            if width is None:
+                width = widths[char] = font.getlength(char)
+            total += width
+        return total
+
+    def _wrap(self, text: str, size: int, width: float) -> List[str]:
+        """按字符换行（与CSS的 break-all 一致），保留原有的换行"""
+        widths = self._char_widths.setdefault(size, {})
+        lines = []
+        for paragraph in text.split("\n"):
+            line, line_width = "", 0.0
+            for char in paragraph:
+                char_width = widths.get(char)
+                if char_width is None:
+                    char_width = self._text_width(char, size)
+                if line and line_width + char_width > width:
+                    lines.append(line)
+                    line, line_width = char, char_width
+                else:
+                    line += char
+                    line_width += char_width
+            lines.append(line)
+        return lines
+
+    def _layout_event(self, event: Dict[str, Any], inner_width: int) -> Tuple[Dict[str, Any], int]:
+        """计算单个事件的排版，返回 (排版信息, 高度)"""
+        header_width = inner_width - self.HEADER_PADDING_RIGHT
+        badge_width = int(self._text_width(event["type"], self.BADGE_FONT_SIZE)) + 2 * self.BADGE_PADDING[1]
+        badge_height = self.BADGE_FONT_SIZE + 2 * self.BADGE_PADDING[0] + 8
+
+        # 仓库名放在标签右侧，放不下时换到下一行
+        repo_x = badge_width + self.HEADER_GAP
+        if self._text_width(event["repo_name"], self.REPO_FONT_SIZE) <= header_width - repo_x:
+            repo_lines = [event["repo_name"]]
+            repo_top = 0
+        else:
+            repo_lines = self._wrap(event["repo_name"], self.REPO_FONT_SIZE, header_width)
+            repo_x, repo_top = 0, badge_height + self.HEADER_GAP
+        repo_line_height = int(self.REPO_FONT_SIZE * 1.3)
+        header_height = max(badge_height, repo_top + repo_line_height * len(repo_lines), 80)
+
+        description_lines = self._wrap(
+            event["description"], self.DESCRIPTION_FONT_SIZE, inner_width - self.DESCRIPTION_PADDING_RIGHT)
+        description_line_height = int(self.DESCRIPTION_FONT_SIZE * self.DESCRIPTION_LINE_HEIGHT)
+
+        height = (2 * self.ITEM_PADDING[0] + header_height
+                  + 2 * self.DESCRIPTION_MARGIN + description_line_height * len(description_lines)
+                  + self.TIME_MARGIN_TOP + int(self.TIME_FONT_SIZE * 1.3))
+        return {
+            "badge": (badge_width, badge_height),
+            "repo": (repo_x, repo_top, repo_line_height, repo_lines),
+            "header_height": header_height,
+            "description": (description_line_height, description_lines),
+        }, height
+
+    def _user_info_height(self) -> int:
+        """用户资料区域的高度（含下边框和下外边距）"""
+        text_height = (int(self.USERNAME_FONT_SIZE * 1.3) + self.PROFILE_META_MARGIN
+                       + int(self.PROFILE_META_FONT_SIZE * 1.3))
+        return (2 * self.USER_INFO_PADDING + max(self.AVATAR_SIZE + 2 * self.AVATAR_BORDER, text_height)
+                + self.BORDER_WIDTH + self.USER_INFO_MARGIN)
+
+    def _draw_user_info(self, image, draw, text_draws: list, profile: Dict[str, Any], left: int, top: int) -> None:
+        """绘制头像（圆形、红色边框）、显示名称和关注者数，头像只从本地文件读取"""
+        avatar_outer = self.AVATAR_SIZE + 2 * self.AVATAR_BORDER
+        content_height = self._user_info_height() - 2 * self.USER_INFO_PADDING - self.BORDER_WIDTH \
+            - self.USER_INFO_MARGIN
+        text_x = left
+        if profile.get("avatar_path"):
+            avatar_top = top + self.USER_INFO_PADDING + (content_height - avatar_outer) // 2
+            draw.ellipse((left, avatar_top, left + avatar_outer - 1, avatar_top + avatar_outer - 1), fill=RED)
+            with Image.open(profile["avatar_path"]) as avatar:
+                avatar = avatar.convert("RGBA").resize((self.AVATAR_SIZE, self.AVATAR_SIZE))
+            mask = Image.new("L", avatar.size, 0)
+            ImageDraw.Draw(mask).ellipse((0, 0, self.AVATAR_SIZE - 1, self.AVATAR_SIZE - 1), fill=255)
+            image.paste(avatar, (left + self.AVATAR_BORDER, avatar_top + self.AVATAR_BORDER), mask)
+            text_x += avatar_outer + self.USER_INFO_GAP
+
+        name_height = int(self.USERNAME_FONT_SIZE * 1.3)
+        meta_height = int(self.PROFILE_META_FONT_SIZE * 1.3)
+        text_top = top + self.USER_INFO_PADDING + (
+            content_height - name_height - self.PROFILE_META_MARGIN - meta_height) // 2
+        text_draws.append(((text_x, text_top), profile["name"], self.USERNAME_FONT_SIZE, True))
+        text_draws.append(((text_x, text_top + name_height + self.PROFILE_META_MARGIN),
+                           f"@{profile['login']} · {profile['followers']} 位关注者", self.PROFILE_META_FONT_SIZE, False))
+        border_top = top + self._user_info_height() - self.USER_INFO_MARGIN - self.BORDER_WIDTH
+        draw.rectangle((left, border_top, left + self.CONTENT_WIDTH, border_top + self.BORDER_WIDTH - 1), fill=BORDER)
+
+    def _draw_shadowed_line(self, image, position: Tuple[int, int], line: str) -> None:
+        """绘制带多层彩色阴影的一行描述
+
+        文字只光栅化一次得到灰度蒙版，模糊后按各层阴影的颜色和偏移合成，最后用原蒙版画出文字。
+        """
+        margin = max(max(abs(dx), abs(dy)) for dx, dy, _ in DESCRIPTION_SHADOWS) + 3 * self.SHADOW_BLUR
+        size = self.DESCRIPTION_FONT_SIZE
+        mask = Image.new("L", (int(self._text_width(line, size)) + 2 * margin, int(size * 1.3) + 2 * margin), 0)
+        ImageDraw.Draw(mask).text((margin, margin), line, font=self._font(size), fill=255)
+        blurred = mask.filter(ImageFilter.GaussianBlur(self.SHADOW_BLUR))
+        x, y = int(position[0]) - margin, int(position[1]) - margin
+        shadow_alphas = {}
+        for dx, dy, color in DESCRIPTION_SHADOWS:
+            alpha = shadow_alphas.get(color[3])
+            if alpha is None:
+                alpha = shadow_alphas[color[3]] = blurred.point(lambda v, a=color[3]: v * a // 255)
+            layer = Image.new("RGBA", mask.size, color[:3] + (0,))
+            layer.putalpha(alpha)
+            self._composite(image, layer, (x + dx, y + dy))
+        image.paste(RED, (x, y), mask)
+
+    @staticmethod
+    def _composite(image, layer, position: Tuple[int, int]) -> None:
+        """把图层合成到指定位置，超出画布的部分裁掉"""
+        left, top = position
+        crop = (max(0, -left), max(0, -top),
+                min(layer.width, image.width - left), min(layer.height, image.height - top))
+        if crop[0] >= crop[2] or crop[1] >= crop[3]:
+            return
+        image.alpha_composite(layer, dest=(left + crop[0], top + crop[1]), source=crop)
+
+    def render(self, events: List[Dict[str, Any]], remaining_text: str, output_path: str,
+               profile: Optional[Dict[str, Any]] = None) -> str:
+        """绘制卡片并保存为JPEG
+
+        Args:
+            events: NotificationRenderer.process_event 返回的事件字典
+            remaining_text: 剩余动态提示，没有时为空字符串
+            output_path: 输出文件路径
+            profile: UserProfileCache.get_profile 返回的用户资料，为None时不绘制资料区域
+
+        Returns:
+            str: 输出文件路径
+        """
+        if not self.available:
+            raise RuntimeError("Pillow 未安装或找不到中文字体")
+
+        left = self.BODY_PADDING + self.CONTAINER_PADDING
+        inner_width = self.CONTENT_WIDTH - 2 * self.ITEM_PADDING[1]
+        layouts = [self._layout_event(event, inner_width) for event in events]
+        remaining_lines = self._wrap(remaining_text, self.REMAINING_FONT_SIZE, self.CONTENT_WIDTH) \
+            if remaining_text else []
+        remaining_line_height = int(self.REMAINING_FONT_SIZE * 1.3)
+        remaining_height = (2 * self.REMAINING_PADDING + self.BORDER_WIDTH
+                            + remaining_line_height * len(remaining_lines)) if remaining_lines else 0
+        user_info_height = self._user_info_height() if profile else 0
+        height = max(self.MIN_HEIGHT, 2 * (self.BODY_PADDING + self.CONTAINER_PADDING) + user_info_height
+                     + sum(item_height for _, item_height in layouts) + remaining_height)
+
+        image = Image.new("RGBA", (self.WIDTH, height), BACKGROUND)
+        overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(overlay)
+        text_draws = []
+        descriptions = []
+
+        y = self.BODY_PADDING + self.CONTAINER_PADDING
+        if profile:
+            self._draw_user_info(overlay, draw, text_draws, profile, left, y)
+            y += user_info_height
+        for event, (layout, item_height) in zip(events, layouts):
+            x = left + self.ITEM_PADDING[1]
+            top = y + self.ITEM_PADDING[0]
+
+            badge_width, badge_height = layout["badge"]
+            draw.rounded_rectangle((x, top, x + badge_width, top + badge_height),
+                                   radius=self.BADGE_RADIUS, fill=BADGE_BACKGROUND)
+            text_draws.append(((x + self.BADGE_PADDING[1], top + self.BADGE_PADDING[0]),
+                               event["type"], self.BADGE_FONT_SIZE, True))
+            repo_x, repo_top, repo_line_height, repo_lines = layout["repo"]
+            repo_offset = 0 if repo_top else (badge_height - repo_line_height) // 2
+            for i, line in enumerate(repo_lines):
+                text_draws.append(((x + repo_x, top + repo_top + repo_offset + i * repo_line_height),
+                                   line, self.REPO_FONT_SIZE, True))
+
+            line_y = top + layout["header_height"] + self.DESCRIPTION_MARGIN
+            description_line_height, description_lines = layout["description"]
+            text_offset = (description_line_height - self.DESCRIPTION_FONT_SIZE) // 2
+            for line in description_lines:
+                if line:
+                    descriptions.append(((x, line_y + text_offset), line))
+                line_y += description_line_height
+
+            text_draws.append(((x, line_y + self.DESCRIPTION_MARGIN + self.TIME_MARGIN_TOP),
+                               event["created_at"], self.TIME_FONT_SIZE, False))
+            y += item_height
+
+        if remaining_lines:
+            draw.rectangle((left, y, left + self.CONTENT_WIDTH, y + self.BORDER_WIDTH - 1), fill=BORDER)
+            line_y = y + self.BORDER_WIDTH + self.REMAINING_PADDING
+            for line in remaining_lines:
+                line_x = left + (self.CONTENT_WIDTH - self._text_width(line, self.REMAINING_FONT_SIZE)) / 2
+                text_draws.append(((line_x, line_y), line, self.REMAINING_FONT_SIZE, False))
+                line_y += remaining_line_height
+
+        image.alpha_composite(overlay)
+        for position, line in descriptions:
+            self._draw_shadowed_line(image, position, line)
+        text_draw = ImageDraw.Draw(image)
+        for position, text, size, bold in text_draws:
+            # 用描边模拟粗体，不依赖单独的粗体字体文件
+            text_draw.text(position, text, font=self._font(size), fill=RED,
+                           stroke_width=1 if bold else 0, stroke_fill=RED)
+
+        image.convert("RGB").save(output_path, "JPEG", quality=self.jpeg_quality, optimize=True)
+        return output_path
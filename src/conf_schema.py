@@ -0,0 +1,38 @@
+"""
+配置schema加载
+"""
+import json
+import os
+from typing import Any, Dict, Optional
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), '_conf_schema.json')
+
+# 进程内共享的schema缓存，按文件修改时间失效
+_schema_cache: Dict[str, Any] = {"mtime": None, "schema": None}
+
+
+def get_schema_mtime() -> Optional[float]:
+    """获取schema文件的修改时间，文件不存在时为None"""
+    try:
+        return os.stat(SCHEMA_PATH).st_mtime
+    except OSError:
+        return None
+
+
+def load_conf_schema() -> Dict[str, Any]:
+    """加载_conf_schema.json，文件未修改时直接返回缓存
+
+    Raises:
+        RuntimeError: schema文件无法读取或解析
+    """
+    mtime = get_schema_mtime()
+    if _schema_cache["schema"] is not None and _schema_cache["mtime"] == mtime:
+        return _schema_cache["schema"]
+    try:
+        with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    except Exception as e:
+        raise RuntimeError(f"加载schema失败：{e}，请检查_conf_schema.json配置文件！")
+    _schema_cache["mtime"] = mtime
+    _schema_cache["schema"] = schema
+    return schema
@@ -175,6 +175,14 @@ class ConfigManager:
         """
         return self.config.get("github_api_user_agent", "Yandere-Github-Stalker/1.0.0")
 
+    def get_github_api_base_url(self) -> str:
+        """获取GitHub API地址
+        
+        Returns:
+            str: API根地址，默认"https://api.github.com"（GitHub Enterprise 或本地基准测试时修改）
+        """
+        return self.config.get("github_api_base_url", "https://api.github.com") or "https://api.github.com"
+
     def get_github_token(self) -> str:
         """获取GitHub Token
         
@@ -182,3 +190,211 @@ class ConfigManager:
             str: GitHub Personal Access Token
         """
         return self.config.get("github_token", "")
+
+    def get_github_api_pool_size(self) -> int:
+        """获取GitHub API连接池大小
+        
+        Returns:
+            int: 最大并发连接数，默认10
+        """
+        return self.config.get("github_api_pool_size", 10)
+
+    def get_max_concurrent_requests(self) -> int:
+        """获取同时轮询的最大用户数
+        
+        Returns:
+            int: 并发上限，默认5
+        """
+        return max(1, self.config.get("max_concurrent_requests", 5))
+
+    def get_max_user_poll_interval(self) -> int:
+        """获取不活跃用户的最大轮询间隔（秒）
+        
+        Returns:
+            int: 最大轮询间隔，默认3600秒（1小时）
+        """
+        return self.config.get("max_user_poll_interval", 3600)
+
+    def get_seen_cache_size(self) -> int:
+        """获取每个用户的去重缓存容量
+        
+        Returns:
+            int: 每个用户在内存中缓存的事件ID数量，默认100
+        """
+        return self.config.get("seen_cache_size", 100)
+
+    def is_received_events_feed_enabled(self) -> bool:
+        """是否通过Token所属账号收到的动态覆盖其关注的用户
+        
+        Returns:
+            bool: 是否启用，默认False
+        """
+        return self.config.get("enable_received_events_feed", False)
+
+    def is_digest_notification_enabled(self) -> bool:
+        """是否把每个用户每轮的新动态合并为一条摘要通知
+        
+        Returns:
+            bool: 是否启用，默认False
+        """
+        return self.config.get("enable_digest_notification", False)
+
+    def get_digest_max_events(self) -> int:
+        """获取摘要通知最多展示的事件数量
+        
+        Returns:
+            int: 摘要中展示的事件数量，默认5，至少为1
+        """
+        return max(1, self.config.get("digest_max_events", 5))
+
+    def get_platform_send_rate(self) -> float:
+        """获取每个平台每秒最多发送的消息数
+        
+        Returns:
+            float: 每个平台每秒发送的消息数，默认1，0表示不限速
+        """
+        return float(self.config.get("platform_send_rate", 1))
+
+    def get_platform_send_burst(self) -> int:
+        """获取每个平台允许连续发送的消息数
+        
+        Returns:
+            int: 令牌桶容量，默认5
+        """
+        return self.config.get("platform_send_burst", 5)
+
+    def get_pipeline_queue_size(self) -> int:
+        """获取流水线每个阶段的队列容量
+        
+        Returns:
+            int: 队列容量，默认20，至少为1
+        """
+        return max(1, self.config.get("pipeline_queue_size", 20))
+
+    def get_render_workers(self) -> int:
+        """获取渲染通知的工作协程数
+        
+        Returns:
+            int: 同时渲染的通知数，默认1，至少为1
+        """
+        return max(1, self.config.get("render_workers", 1))
+
+    def get_send_workers(self) -> int:
+        """获取发送通知的工作协程数
+        
+        Returns:
+            int: 同时发送的通知数，默认2，至少为1
+        """
+        return max(1, self.config.get("send_workers", 2))
+
+    def get_render_cache_max_mb(self) -> int:
+        """获取渲染缓存的大小上限
+        
+        Returns:
+            int: 缓存图片的总大小上限（MB），默认50，0表示不缓存
+        """
+        return self.config.get("render_cache_max_mb", 50)
+
+    def get_render_cache_max_age_hours(self) -> int:
+        """获取渲染缓存的保留时间
+        
+        Returns:
+            int: 缓存图片的最长保留时间（小时），默认24，0表示不按时间淘汰
+        """
+        return self.config.get("render_cache_max_age_hours", 24)
+
+    def get_image_renderer(self) -> str:
+        """获取图片通知的渲染方式
+        
+        Returns:
+            str: "html"（AstrBot 的 html_render）或 "pillow"（本地直接绘制），默认"html"
+        """
+        return self.config.get("image_renderer", "html")
+
+    def get_card_font_path(self) -> str:
+        """获取 Pillow 绘制卡片使用的字体
+        
+        Returns:
+            str: 字体文件路径，为空时自动查找系统中文字体
+        """
+        return self.config.get("card_font_path", "")
+
+    def is_user_profile_enabled(self) -> bool:
+        """是否在图片通知中展示用户资料
+        
+        Returns:
+            bool: 是否展示头像、显示名称和关注者数，默认True
+        """
+        return self.config.get("show_user_profile", True)
+
+    def get_profile_cache_ttl_hours(self) -> int:
+        """获取用户资料缓存的有效期
+        
+        Returns:
+            int: 资料和头像的有效期（小时），过期后用条件请求重新验证，默认24，至少为1
+        """
+        return max(1, self.config.get("profile_cache_ttl_hours", 24))
+
+    def get_image_output_format(self) -> str:
+        """获取发送前图片重新编码的格式
+        
+        Returns:
+            str: "jpeg"、"webp" 或 "original"（不压缩），默认"original"
+        """
+        return self.config.get("image_output_format", "original")
+
+    def get_image_max_kb(self) -> int:
+        """获取发送图片的大小上限
+        
+        Returns:
+            int: 图片大小上限（KB），默认1024，0表示不限制
+        """
+        return max(0, self.config.get("image_max_kb", 1024))
+
+    def get_image_max_width(self) -> int:
+        """获取发送图片的宽度上限
+        
+        Returns:
+            int: 图片宽度上限（像素），超出时等比缩小，默认1280，0表示不限制
+        """
+        return max(0, self.config.get("image_max_width", 1280))
+
+    def get_outbox_max_attempts(self) -> int:
+        """获取发送失败的通知最多尝试的次数
+        
+        Returns:
+            int: 每个会话的最多发送次数（含首次），达到后进入死信，默认6，0或1表示不重试
+        """
+        return max(0, self.config.get("outbox_max_attempts", 6))
+
+    def get_outbox_retry_base_seconds(self) -> int:
+        """获取发件箱重试的基础间隔
+        
+        Returns:
+            int: 第一次重试前等待的秒数，之后每次翻倍（最多1小时），默认60，至少为1
+        """
+        return max(1, self.config.get("outbox_retry_base_seconds", 60))
+
+    def is_metrics_enabled(self) -> bool:
+        """是否收集耗时和计数指标
+        
+        Returns:
+            bool: 是否启用指标，默认True
+        """
+        return self.config.get("enable_metrics", True)
+
+    def get_metrics_prometheus_file(self) -> str:
+        """获取 Prometheus 指标文件路径
+        
+        Returns:
+            str: 每轮检查后写入的文本格式指标文件，为空时不写入
+        """
+        return self.config.get("metrics_prometheus_file", "")
+
+    def get_metrics_http_port(self) -> int:
+        """获取本地指标HTTP服务的端口
+        
+        Returns:
+            int: 在 127.0.0.1 上提供 /metrics 的端口，0表示不启动，默认0
+        """
+        return max(0, self.config.get("metrics_http_port", 0))
@@ -1,7 +1,7 @@
 """
 事件处理器
 """
-from typing import List
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from astrbot.api import logger
 from .pushed_event_id_manager import PushedEventIdManager
@@ -13,6 +13,10 @@ class EventProcessor:
         self.event_limit = event_limit
         self.pushed_event_ids_manager = pushed_event_ids_manager
         self.config_manager = config_manager
+        # 每个用户已知的最新事件时间，供轮询调度器判断活跃度
+        self.latest_event_times: Dict[str, datetime] = {}
+        # 本轮尚未写入数据库的标记：用户名 -> [(事件ID, 事件时间)]
+        self._pending_marks: Dict[str, List[Tuple[str, Optional[str]]]] = {}
         logger.debug(f"Yandere Github Stalker: 事件处理器初始化，事件限制：{event_limit}")
 
     async def process_events(self, events: List[GitHubEventData], username: str) -> List[GitHubEventData]:
@@ -27,25 +31,17 @@ class EventProcessor:
         if not events:
             return []
 
-        # 获取最后一次推送的事件时间
-        last_pushed_time = await self.pushed_event_ids_manager.get_last_pushed_time(username)
-        if last_pushed_time:
-            logger.debug(f"Yandere Github Stalker: 用户 {username} 上次推送时间：{last_pushed_time}")
-        else:
-            logger.debug(f"Yandere Github Stalker: 用户 {username} 没有找到上次推送时间记录")
+        # 至多一次数据库往返：取出这批事件中已推送的ID，以及该用户的高水位事件ID
+        pushed_ids, watermark = await self.pushed_event_ids_manager.get_dedup_snapshot(
+            [event.id for event in events], username)
+        logger.debug(f"Yandere Github Stalker: 用户 {username} 的高水位事件ID：{watermark}")
 
         earliest_event = events[-1]  # events 按时间倒序排列
         latest_event = events[0]
         logger.debug(
             f"Yandere Github Stalker: 最早事件时间：{earliest_event.created_at}，最新事件时间：{latest_event.created_at}")
-
-        try:
-            # 获取当前已推送的事件数量
-            pushed_count = await self.pushed_event_ids_manager.get_pushed_event_count(username)
-            logger.debug(f"Yandere Github Stalker: 用户 {username} 当前已推送事件数：{pushed_count}")
-        except Exception as e:
-            logger.warning(f"Yandere Github Stalker: 获取已推送事件数量失败: {str(e)}，继续处理")
-            pushed_count = 0
+        if latest_event.created_datetime is not None:
+            self.latest_event_times[username] = latest_event.created_datetime
 
         # 获取事件限制数量
         event_limit = self.config_manager.get_notification_event_limit()
@@ -55,25 +51,14 @@ class EventProcessor:
         for event in events:
             event_id = event.id
             event_type = event.type
-            event_time = event.created_at
 
             try:
-                # 将事件时间转换为datetime对象以进行比较
-                event_datetime = datetime.strptime(event_time, "%Y-%m-%dT%H:%M:%SZ")
-
-                # 如果有上次推送时间，且当前事件时间早于或等于上次推送时间，则跳过
-                if last_pushed_time and event_datetime <= last_pushed_time:
-                    continue
-
-                logger.debug(
-                    f"Yandere Github Stalker: 检查事件 {event_id}，类型：{event_type}，时间：{event_time}")
+                # GitHub 事件ID单调递增，动态按时间倒序排列：到达高水位即进入已处理区域，后面的事件都不用再看
+                if watermark is not None and event_id.isdigit() and int(event_id) <= watermark:
+                    break
 
                 # 检查事件是否已经推送过
-                is_pushed = await self.pushed_event_ids_manager.is_event_pushed(event_id, username)
-                logger.debug(
-                    f"Yandere Github Stalker: 检查事件ID {event_id} 是否存在: {is_pushed}，当前总数：{pushed_count}")
-
-                if not is_pushed:
+                if event_id not in pushed_ids:
                     logger.debug(
                         f"Yandere Github Stalker: 发现新事件 {event_id}，类型：{event_type}")
                     new_events.append(event)
@@ -91,8 +76,16 @@ class EventProcessor:
             f"Yandere Github Stalker: 发现 {len(new_events)} 条新事件，类型：{[e.type for e in new_events]} ")
         return new_events[:event_limit] if event_limit > 0 else new_events
 
+    async def get_watermark(self, username: str) -> Optional[int]:
+        """获取用户的高水位事件ID，用于决定获取动态时翻到哪一页为止"""
+        return await self.pushed_event_ids_manager.get_dedup_watermark(username)
+
+    def get_latest_event_time(self, username: str) -> Optional[datetime]:
+        """获取用户已知的最新事件时间（UTC），未知时返回None"""
+        return self.latest_event_times.get(username)
+
     async def mark_event_as_pushed(self, event_id: str, username: str, event_time: str = None) -> bool:
-        """将事件标记为已推送
+        """将事件标记为已推送（先记入待写队列，由 flush_marks 批量写入数据库）
         Args:
             event_id: 事件ID
             username: GitHub用户名
@@ -100,12 +93,9 @@ class EventProcessor:
         Returns:
             bool: 标记是否成功
         """
-        success = await self.pushed_event_ids_manager.add_pushed_event_id(event_id, username, event_time)
-        if success:
-            logger.debug(f"Yandere Github Stalker: 已将事件 {event_id} (用户: {username}) 标记为已推送")
-        else:
-            logger.warning(f"Yandere Github Stalker: 事件 {event_id} (用户: {username}) 标记失败，但继续处理其他事件")
-        return success
+        self._queue_mark(event_id, username, event_time)
+        logger.debug(f"Yandere Github Stalker: 已将事件 {event_id} (用户: {username}) 标记为已推送")
+        return True
 
     async def mark_event_as_ignored(self, event_id: str, username: str, event_time: str = None) -> bool:
         """将事件标记为已忽略（例如因为模板缺失）
@@ -116,9 +106,38 @@ class EventProcessor:
         Returns:
             bool: 标记是否成功
         """
-        success = await self.pushed_event_ids_manager.add_pushed_event_id(event_id, username, event_time)
-        if success:
-            logger.debug(f"Yandere Github Stalker: 已将事件 {event_id} (用户: {username}) 标记为已忽略")
-        else:
-            logger.warning(f"Yandere Github Stalker: 事件 {event_id} (用户: {username}) 忽略标记失败，但继续处理其他事件")
+        self._queue_mark(event_id, username, event_time)
+        logger.debug(f"Yandere Github Stalker: 已将事件 {event_id} (用户: {username}) 标记为已忽略")
+        return True
+
+    def _queue_mark(self, event_id: str, username: str, event_time: str = None) -> None:
+        """记入待写队列，并立即更新去重缓存，保证写入前不会重复推送"""
+        self._pending_marks.setdefault(username, []).append((event_id, event_time))
+        self.pushed_event_ids_manager.remember_event_id(event_id, username)
+
+    def has_pending_marks(self) -> bool:
+        """是否还有未写入数据库的标记"""
+        return any(self._pending_marks.values())
+
+    async def flush_marks(self, username: str = None) -> bool:
+        """把待写的标记批量写入数据库，每个用户一个事务；写入失败的标记保留到下次重试
+        Args:
+            username: 只写入该用户的标记，None 表示写入全部
+        Returns:
+            bool: 是否全部写入成功
+        """
+        usernames = [username] if username is not None else list(self._pending_marks)
+        success = True
+        for user in usernames:
+            marks = self._pending_marks.pop(user, None)
+            if not marks:
+                continue
+            if await self.pushed_event_ids_manager.add_pushed_event_ids(user, marks):
+                logger.debug(f"Yandere Github Stalker: 已写入用户 {user} 的 {len(marks)} 个事件标记")
+            else:
+                # 写入失败，放回队列等待下次重试（期间缓存仍会阻止重复推送）
+                self._pending_marks.setdefault(user, [])[:0] = marks
+                logger.warning(
+                    f"Yandere Github Stalker: 用户 {user} 的 {len(marks)} 个事件标记写入失败，将在下次重试")
+                success = False
         return success
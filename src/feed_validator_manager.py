@@ -0,0 +1,103 @@
+"""
+条件请求校验值管理器 - 持久化 GitHub 接口的 ETag / Last-Modified
+"""
+import asyncio
+from typing import Dict, Optional, Tuple
+from astrbot.api import logger
+from astrbot.api.star import Context
+from sqlalchemy import text
+
+
+class FeedValidatorManager:
+    """条件请求校验值管理器类 - 使用 AstrBot 数据库存储，重启后不会触发全量重新下载"""
+
+    def __init__(self, context: Context):
+        """
+        初始化校验值管理器
+
+        Args:
+            context: AstrBot上下文
+        """
+        self.context = context
+        self.db = self.context.get_db()
+        self.table_name = "github_feed_validators"
+        self._table_ensured = False
+        self._table_lock = asyncio.Lock()
+        logger.debug("Yandere Github Stalker: 初始化条件请求校验值管理器，使用数据库存储")
+
+    async def _ensure_table_once(self) -> None:
+        """确保表只被初始化一次（延迟初始化模式），并发的首次调用等待同一次初始化"""
+        if self._table_ensured:
+            return
+        async with self._table_lock:
+            if not self._table_ensured:
+                await self._ensure_table()
+                self._table_ensured = True
+
+    async def _ensure_table(self) -> None:
+        """确保数据库中有校验值表"""
+        try:
+            async with self.db.get_db() as session:
+                async with session.begin():
+                    create_table_sql = text(f"""
+                        CREATE TABLE IF NOT EXISTS {self.table_name} (
+                            url TEXT PRIMARY KEY,
+                            etag TEXT,
+                            last_modified TEXT,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        );
+                    """)
+                    await session.execute(create_table_sql)
+                    logger.debug("Yandere Github Stalker: 校验值表检查/创建完成")
+        except Exception as e:
+            logger.error(f"创建校验值表失败: {e}")
+            raise
+
+    async def load_all(self) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """加载所有已保存的校验值
+
+        Returns:
+            Dict[str, Tuple[Optional[str], Optional[str]]]: URL 到 (ETag, Last-Modified) 的映射
+        """
+        try:
+            await self._ensure_table_once()
+
+            async with self.db.get_db() as session:
+                query_sql = text(f"SELECT url, etag, last_modified FROM {self.table_name}")
+                result = await session.execute(query_sql)
+                validators = {row[0]: (row[1], row[2]) for row in result.fetchall()}
+                logger.debug(f"Yandere Github Stalker: 已加载 {len(validators)} 条条件请求校验值")
+                return validators
+        except Exception as e:
+            logger.error(f"加载校验值失败: {e}")
+            return {}
+
+    async def save(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> bool:
+        """保存（覆盖）某个 URL 的校验值
+
+        Args:
+            url: 请求的 URL
+            etag: 响应头中的 ETag
+            last_modified: 响应头中的 Last-Modified
+        Returns:
+            bool: 是否保存成功
+        """
+        try:
+            await self._ensure_table_once()
+
+            async with self.db.get_db() as session:
+                async with session.begin():
+                    upsert_sql = text(f"""
+                        INSERT OR REPLACE INTO {self.table_name} (url, etag, last_modified, updated_at)
+                        VALUES (:url, :etag, :last_modified, datetime('now'))
+                    """)
+                    await session.execute(
+                        upsert_sql, {"url": url, "etag": etag, "last_modified": last_modified})
+            return True
+        except Exception as e:
+            logger.error(f"保存校验值失败: {e}")
+            return False
+
+    def close(self):
+        """关闭管理器，释放资源"""
+        self.db = None
@@ -1,80 +1,455 @@
 """
 GitHub API related functionality
 """
+import re
+import time
 import aiohttp
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Set, Any, AsyncIterator
 from astrbot.api import logger
 from .config_manager import ConfigManager
+from .feed_validator_manager import FeedValidatorManager
 from .github_event_data import GitHubEventData
+from .json_decoder import decode_json, get_backend_name
+from .metrics import metrics
+from .rate_limit_scheduler import RateLimitScheduler
+
+
+# 指标的接口标签：把URL路径中的用户名替换为占位符
+_USER_SEGMENT = re.compile(r"^/users/[^/]+")
+
+
+class GitHubAPIError(Exception):
+    """GitHub API 请求失败"""
+
+    def __init__(self, status: int):
+        super().__init__(f"GitHub API返回状态码 {status}")
+        self.status = status
 
 
 class GitHubAPI:
-    def __init__(self, config_manager: ConfigManager):
+    # DNS 缓存时间（秒）与空闲连接保活时间（秒）
+    DNS_CACHE_TTL = 300
+    KEEPALIVE_TIMEOUT = 60
+    # 关注列表缓存时间（秒）与收到的动态最多翻页数（GitHub 最多提供300条）
+    FOLLOWING_CACHE_TTL = 3600
+    RECEIVED_EVENTS_MAX_PAGES = 3
+    # 有高水位且不限制事件数量时的每页大小，以及用户动态最多能翻到的事件数（GitHub 最多提供300条）
+    USER_EVENTS_PAGE_SIZE = 10
+    USER_EVENTS_MAX_EVENTS = 300
+    # 收到的动态的校验值暂存在这个名字下（GitHub 用户名不含 @，不会与用户冲突）
+    RECEIVED_FEED_OWNER = "@received_events"
+
+    def __init__(self, config_manager: ConfigManager, validator_manager: Optional[FeedValidatorManager] = None):
         self.config_manager = config_manager
+        self.validator_manager = validator_manager
         self.token = self.config_manager.get_github_token().strip()
         self.timeout = self.config_manager.get_github_api_timeout()
         self.user_agent = self.config_manager.get_github_api_user_agent()
+        self.pool_size = self.config_manager.get_github_api_pool_size()
+        self.base_url = self.config_manager.get_github_api_base_url().rstrip("/")
+        self.rate_limiter = RateLimitScheduler(self.config_manager)
 
         self.headers = {
             'User-Agent': self.user_agent,
             'Accept': 'application/vnd.github.v3+json'
         }
+        # Token 只随 API 请求发送，不放在共享会话的默认请求头里，头像等其他主机的请求不会带上它
+        self.auth_headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
         if self.token:
-            self.headers['Authorization'] = f'Bearer {self.token}'
             logger.debug("Yandere Github Stalker: GitHub API已配置Token")
         else:
             logger.warning("Yandere Github Stalker: 未配置GitHub Token，API访问可能受限")
 
-    async def get_user_events(self, username: str) -> Optional[List[GitHubEventData]]:
-        """获取用户的GitHub活动"""
+        # 共享的长连接会话，在 start() 或首次请求时创建，在 close() 时释放
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.connection_stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "not_modified": 0
+        }
+
+        # URL -> (ETag, Last-Modified)，首次使用时从数据库加载
+        self._validators: Optional[Dict[str, Tuple[Optional[str], Optional[str]]]] = None
+        # 用户名 -> (URL, (ETag, Last-Modified))：已获取但尚未处理完的用户动态的校验值，
+        # 该用户的事件标记写入数据库后才保存，处理失败时丢弃，下次请求仍使用旧的校验值
+        self._pending_validators: Dict[str, Tuple[str, Tuple[Optional[str], Optional[str]]]] = {}
+
+        # 收到的动态（received_events）相关的缓存
+        self._authenticated_login: Optional[str] = None
+        self._following: Optional[Set[str]] = None
+        self._following_fetched_at = 0.0
+        self._received_top_id: Optional[int] = None
+        # 已获取但尚未处理完的收到的动态中最新的事件ID，与校验值一起保存或丢弃
+        self._pending_received_top_id: Optional[int] = None
+
+    async def start(self) -> None:
+        """创建共享连接池"""
+        await self._get_session()
+
+    async def close(self) -> None:
+        """关闭共享连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.debug(
+                f"Yandere Github Stalker: GitHub API连接池已关闭，连接统计：{self.connection_stats}")
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话，不存在或已关闭时重新创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                use_dns_cache=True,
+                ttl_dns_cache=self.DNS_CACHE_TTL,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT
+            )
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_create_end)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=connector,
+                trace_configs=[trace_config]
+            )
+            logger.debug(
+                f"Yandere Github Stalker: GitHub API连接池已创建，连接池大小：{self.pool_size}，"
+                f"JSON解码后端：{get_backend_name()}")
+        return self._session
+
+    async def _on_connection_create_end(self, session, trace_config_ctx, params) -> None:
+        """新建连接（DNS + TCP + TLS 握手）完成"""
+        self.connection_stats["new_connections"] += 1
+
+    async def _on_connection_reuseconn(self, session, trace_config_ctx, params) -> None:
+        """复用了连接池中的空闲连接"""
+        self.connection_stats["reused_connections"] += 1
+
+    def _endpoint_label(self, url: str) -> str:
+        """指标使用的接口标签，如 /users/{user}/events"""
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        return _USER_SEGMENT.sub("/users/{user}", path.split("?", 1)[0])
+
+    def get_connection_stats(self) -> Dict[str, int]:
+        """获取连接复用统计"""
+        return dict(self.connection_stats)
+
+    async def _get_conditional_headers(self, url: str) -> Dict[str, str]:
+        """根据已保存的校验值构造条件请求头"""
+        if self._validators is None:
+            self._validators = await self.validator_manager.load_all() if self.validator_manager else {}
+
+        etag, last_modified = self._validators.get(url, (None, None))
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    async def _store_validators(self, url: str, validators: Tuple[Optional[str], Optional[str]]) -> None:
+        """保存校验值，未变化时不写数据库"""
+        if validators == (None, None) or self._validators is None:
+            return
+        if self._validators.get(url) == validators:
+            return
+        self._validators[url] = validators
+        if self.validator_manager:
+            await self.validator_manager.save(url, *validators)
+
+    async def commit_user_validators(self, username: str) -> None:
+        """用户本次获取的动态已处理完（事件标记已写入数据库），保存暂存的校验值"""
+        pending = self._pending_validators.pop(username, None)
+        if pending:
+            await self._store_validators(*pending)
+
+    def discard_user_validators(self, username: Optional[str] = None) -> None:
+        """丢弃暂存的校验值，下次仍用旧的校验值请求，从而重新获取未处理完的动态
+
+        Args:
+            username: 只丢弃该用户的校验值，None 表示丢弃全部
+        """
+        if username is None:
+            self._pending_validators.clear()
+            self._pending_received_top_id = None
+        else:
+            self._pending_validators.pop(username, None)
+
+    async def commit_received_feed(self) -> None:
+        """收到的动态分发出的事件都已处理完，保存暂存的校验值和最新事件ID"""
+        await self.commit_user_validators(self.RECEIVED_FEED_OWNER)
+        if self._pending_received_top_id is not None:
+            self._received_top_id = self._pending_received_top_id
+            self._pending_received_top_id = None
+
+    def discard_received_feed(self) -> None:
+        """丢弃收到的动态暂存的校验值和最新事件ID，下次重新获取同样的动态"""
+        self.discard_user_validators(self.RECEIVED_FEED_OWNER)
+        self._pending_received_top_id = None
+
+    async def _get_json_page(self, url: str, conditional: bool = False,
+                             validator_owner: Optional[str] = None) -> Tuple[int, Optional[Any], Optional[str]]:
+        """发送一次GET请求
+
+        Args:
+            url: 完整的请求URL（包含查询参数）
+            conditional: 是否发送条件请求
+            validator_owner: 不立即保存响应的校验值，而是暂存在该用户名下，
+                由 commit_user_validators / discard_user_validators 决定是否保存
+        Returns:
+            Tuple[int, Optional[Any], Optional[str]]: (状态码, JSON数据, 下一页URL)；
+            未发送请求（速率限制退避中）时状态码为0，非200时JSON数据为None
+        """
+        if self.rate_limiter.is_blocked():
+            logger.debug(f"Yandere Github Stalker: 速率限制退避中，跳过请求 {url}")
+            return 0, None, None
+
+        headers = await self._get_conditional_headers(url) if conditional else None
+        response, body = await self._get(url, headers)
+        if body is None:
+            return response.status, None, None
+
+        data = await decode_json(body)
+        if conditional:
+            validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            if validator_owner is not None:
+                self._pending_validators[validator_owner] = (url, validators)
+            else:
+                await self._store_validators(url, validators)
+        next_link = response.links.get('next')
+        next_url = str(next_link['url']) if next_link else None
+        return 200, data, next_url
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None,
+                   api: bool = True, endpoint: Optional[str] = None) -> Tuple[aiohttp.ClientResponse, Optional[bytes]]:
+        """通过共享连接池发送一次GET请求，记录请求数和指标
+
+        Args:
+            url: 完整的请求URL
+            headers: 额外的请求头
+            api: 是否为 GitHub API 请求：带上Token，并根据响应头更新速率限制
+            endpoint: 指标的接口标签，默认根据URL生成
+        Returns:
+            Tuple[aiohttp.ClientResponse, Optional[bytes]]: (响应, 200时的响应体)；响应体读取后连接已归还，
+            响应只用于读取状态码、响应头和分页链接
+        """
+        request_headers = dict(self.auth_headers) if api else {}
+        request_headers.update(headers or {})
+        endpoint = endpoint or self._endpoint_label(url)
+        session = await self._get_session()
+        self.connection_stats["requests"] += 1
+        with metrics.timer("github_api_request_seconds", endpoint=endpoint):
+            async with session.get(url, headers=request_headers) as response:
+                metrics.inc("github_api_requests_total", endpoint=endpoint, status=response.status)
+                if api:
+                    self.rate_limiter.update_from_response(response.status, response.headers)
+                if response.status == 304:
+                    self.connection_stats["not_modified"] += 1
+                    return response, None
+                if response.status != 200:
+                    response_text = await response.text()
+                    logger.warning(
+                        f"Yandere Github Stalker: GitHub返回状态码 {response.status}，URL：{url}，响应：{response_text}")
+                    return response, None
+                return response, await response.read()
+
+    async def get_authenticated_login(self) -> Optional[str]:
+        """获取Token所属账号的用户名（结果会被缓存），未配置Token时返回None"""
+        if not self.token:
+            return None
+        if self._authenticated_login is None:
+            try:
+                status, data, _ = await self._get_json_page(f"{self.base_url}/user")
+                if status == 200 and data:
+                    self._authenticated_login = data.get("login")
+                    logger.debug(f"Yandere Github Stalker: Token所属账号：{self._authenticated_login}")
+            except Exception as e:
+                logger.error(f"Yandere Github Stalker: 获取Token所属账号失败: {e}")
+        return self._authenticated_login
+
+    async def get_following(self) -> Optional[Set[str]]:
+        """获取Token所属账号关注的用户（小写用户名集合），结果按 FOLLOWING_CACHE_TTL 缓存"""
+        now = time.monotonic()
+        if self._following is not None and now - self._following_fetched_at < self.FOLLOWING_CACHE_TTL:
+            return self._following
+        try:
+            following = set()
+            url = f"{self.base_url}/user/following?per_page=100"
+            while url:
+                status, data, url = await self._get_json_page(url)
+                if status != 200:
+                    return self._following
+                following.update(user.get("login", "").lower() for user in data)
+            self._following = following
+            self._following_fetched_at = now
+            logger.debug(f"Yandere Github Stalker: Token所属账号关注了 {len(following)} 个用户")
+        except Exception as e:
+            logger.error(f"Yandere Github Stalker: 获取关注列表失败: {e}")
+        return self._following
+
+    async def get_received_events(self, login: str) -> Optional[List[GitHubEventData]]:
+        """获取账号收到的动态（关注的用户的公开动态），一次请求覆盖所有关注的用户
+
+        第一页使用条件请求；只有当一整页都比上次看到的最新事件更新时才继续翻页。
+        校验值和最新事件ID先暂存，分发出的事件都处理完后由 commit_received_feed 保存，
+        否则由 discard_received_feed 丢弃，下次重新获取。
+
+        Args:
+            login: Token所属账号的用户名
+        Returns:
+            Optional[List[GitHubEventData]]: 新的动态列表（按时间倒序），没有变化时为空列表，失败时为None
+        """
+        self.discard_received_feed()
+        try:
+            url = f"{self.base_url}/users/{login}/received_events?per_page=100"
+            stop_at_id = self._received_top_id
+            events: List[GitHubEventData] = []
+            for page in range(self.RECEIVED_EVENTS_MAX_PAGES):
+                status, data, next_url = await self._get_json_page(
+                    url, conditional=(page == 0), validator_owner=self.RECEIVED_FEED_OWNER)
+                if status == 304:
+                    logger.debug("Yandere Github Stalker: 收到的动态没有变化（304）")
+                    return events
+                if status != 200:
+                    # 后面的页失败时不能保存第一页的校验值，否则没取到的动态会被 304 跳过
+                    self.discard_received_feed()
+                    return None
+
+                page_events = [GitHubEventData.from_dict(event) for event in data]
+                events.extend(page_events)
+                # 本页已经包含上次看过的事件，或者没有下一页了，停止翻页
+                if not next_url or not page_events or stop_at_id is None or \
+                        any(e.id.isdigit() and int(e.id) <= stop_at_id for e in page_events):
+                    break
+                url = next_url
+
+            numeric_ids = [int(e.id) for e in events if e.id.isdigit()]
+            if numeric_ids:
+                self._pending_received_top_id = max(numeric_ids + [stop_at_id or 0])
+            logger.debug(f"Yandere Github Stalker: 获取到 {len(events)} 条收到的动态")
+            return events
+        except Exception as e:
+            self.discard_received_feed()
+            logger.error(f"Yandere Github Stalker: 获取收到的动态失败: {e}", exc_info=True)
+            return None
+
+    async def iter_user_event_pages(self, username: str, per_page: int,
+                                    conditional: bool = True) -> AsyncIterator[List[GitHubEventData]]:
+        """按页异步迭代用户的GitHub活动（按时间倒序），调用方可随时停止迭代以避免多余的请求
+
+        Args:
+            username: GitHub用户名
+            per_page: 每页事件数
+            conditional: 第一页是否发送条件请求；动态未变化（304）时不产生任何页。
+                第一页的校验值暂存在该用户名下，处理完后需调用 commit_user_validators 保存
+        Raises:
+            GitHubAPIError: 第一页请求失败
+        """
+        url = f"{self.base_url}/users/{username}/events?per_page={per_page}"
+        for page in range(max(self.USER_EVENTS_MAX_EVENTS // per_page, 1)):
+            status, data, next_url = await self._get_json_page(
+                url, conditional=conditional and page == 0, validator_owner=username)
+            if status == 304:
+                logger.debug(
+                    f"Yandere Github Stalker: 用户 {username} 的活动没有变化（304）")
+                return
+            if status != 200:
+                if page == 0:
+                    raise GitHubAPIError(status)
+                return
+
+            yield [GitHubEventData.from_dict(event) for event in data]
+            if not next_url:
+                return
+            url = next_url
+
+    async def get_user_events(self, username: str, conditional: bool = True, watermark: Optional[int] = None,
+                              max_new_events: int = 0) -> Optional[List[GitHubEventData]]:
+        """获取用户的GitHub活动
+
+        每页大小根据 notification_event_limit 调整；只有当一整页都比高水位更新时才继续翻页，
+        遇到第一页已知事件即停止，突发大量动态时也不会漏掉第一页之后的事件。
+
+        Args:
+            username: GitHub用户名
+            conditional: 是否发送条件请求；动态未变化（304）时返回空列表，
+                校验值在处理完后由 commit_user_validators 保存
+            watermark: 该用户的高水位事件ID，None 表示只获取第一页
+            max_new_events: 新事件数量达到该值后停止翻页，0表示不限制
+        """
         try:
-            url = f"https://api.github.com/users/{username}/events"
+            if max_new_events > 0:
+                per_page = min(max_new_events, 100)
+            else:
+                per_page = self.USER_EVENTS_PAGE_SIZE if watermark is not None else 30
             logger.debug(
-                f"Yandere Github Stalker: 正在获取用户 {username} 的活动，URL: {url}")
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
-                    if response.status == 200:
-                        events_data = await response.json()
-                        events = [GitHubEventData.from_dict(
-                            event) for event in events_data]
-                        logger.debug(
-                            f"Yandere Github Stalker: 成功获取用户 {username} 的活动，共 {len(events)} 条")
-                        if events:
-                            logger.debug(
-                                f"Yandere Github Stalker: 最新5条事件类型：{[e.type for e in events[:5]]}")
-                        return events
-                    elif response.status == 404:
-                        logger.warning(
-                            f"Yandere Github Stalker: 用户 {username} 不存在")
-                        return None
-                    else:
-                        response_text = await response.text()
-                        logger.warning(
-                            f"Yandere Github Stalker: GitHub API返回状态码 {response.status}，响应：{response_text}")
-                        return None
+                f"Yandere Github Stalker: 正在获取用户 {username} 的活动，每页 {per_page} 条")
+
+            events: List[GitHubEventData] = []
+            new_count = 0
+            async for page in self.iter_user_event_pages(username, per_page, conditional):
+                events.extend(page)
+                page_new = sum(
+                    1 for event in page
+                    if watermark is not None and (not event.id.isdigit() or int(event.id) > watermark))
+                new_count += page_new
+                if watermark is None or page_new < len(page):
+                    break
+                if max_new_events > 0 and new_count >= max_new_events:
+                    break
+
+            logger.debug(
+                f"Yandere Github Stalker: 成功获取用户 {username} 的活动，共 {len(events)} 条")
+            if events:
+                logger.debug(
+                    f"Yandere Github Stalker: 最新5条事件类型：{[e.type for e in events[:5]]}")
+            return events
+        except GitHubAPIError as e:
+            if e.status == 404:
+                logger.warning(
+                    f"Yandere Github Stalker: 用户 {username} 不存在")
+            return None
         except Exception as e:
             logger.error(f"Yandere Github Stalker: 获取用户 {username} 活动失败: {e}", exc_info=True)
             return None
 
-    async def get_user_info(self, username: str) -> Optional[dict]:
-        """获取用户信息"""
+    async def get_user_profile(self, username: str,
+                               etag: Optional[str] = None) -> Tuple[int, Optional[dict], Optional[str]]:
+        """用条件请求获取用户资料（304 不消耗API配额）
+
+        Args:
+            username: GitHub用户名
+            etag: 上次响应的ETag，为None时发送普通请求
+        Returns:
+            Tuple[int, Optional[dict], Optional[str]]: (状态码, 用户资料, 新的ETag)；
+            未发送请求（速率限制退避中）或请求出错时状态码为0，非200时用户资料为None
+        """
+        if self.rate_limiter.is_blocked():
+            logger.debug(f"Yandere Github Stalker: 速率限制退避中，跳过获取用户 {username} 的资料")
+            return 0, None, None
+        try:
+            headers = {'If-None-Match': etag} if etag else None
+            response, body = await self._get(f"{self.base_url}/users/{username}", headers)
+            if response.status == 304:
+                return 304, None, etag
+            if body is None:
+                return response.status, None, None
+            return 200, await decode_json(body), response.headers.get('ETag')
+        except Exception as e:
+            logger.error(f"Yandere Github Stalker: 获取用户 {username} 的资料失败: {e}")
+            return 0, None, None
+
+    async def download_avatar(self, avatar_url: str, size: int) -> Optional[bytes]:
+        """下载指定尺寸的头像（由GitHub缩放），失败时返回None
+
+        头像不在 API 主机上，复用共享连接池但不带Token。
+        """
+        separator = "&" if "?" in avatar_url else "?"
         try:
-            url = f"https://api.github.com/users/{username}"
-            logger.debug(f"Yandere Github Stalker: 正在获取用户 {username} 的信息")
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
-                    if response.status == 200:
-                        user_info = await response.json()
-                        logger.debug(
-                            f"Yandere Github Stalker: 成功获取用户 {username} 的信息")
-                        return user_info
-                    else:
-                        response_text = await response.text()
-                        logger.warning(
-                            f"Yandere Github Stalker: 获取用户信息失败，状态码: {response.status}，响应：{response_text}")
-                        return None
+            _, body = await self._get(f"{avatar_url}{separator}s={size}", api=False, endpoint="avatar")
+            return body
         except Exception as e:
-            logger.error(f"Yandere Github Stalker: 获取用户信息失败: {e}")
+            logger.error(f"Yandere Github Stalker: 下载头像失败: {e}")
             return None
@@ -2,31 +2,74 @@
 GitHub 事件数据类型定义
 """
 from typing import Optional, Any, Dict
-from dataclasses import dataclass
+from datetime import datetime
 
 
-@dataclass
 class GitHubEventData:
-    """GitHub 事件数据类"""
-    id: str
-    type: str
-    actor: Dict[str, Any]
-    repo: Dict[str, Any]
-    payload: Dict[str, Any]
-    public: bool
-    created_at: str
-    org: Optional[Dict[str, Any]] = None
+    """GitHub 事件数据类
+
+    使用 __slots__，创建时只额外提取仓库名；actor/repo/payload/org 直接引用 API 返回的子字典，
+    不做拷贝。事件内容本身仍完整保留，节省的只是每个对象的属性字典。解析后的时间会缓存在对象上。
+    """
+    __slots__ = ("id", "type", "actor", "repo", "payload", "public", "created_at", "org",
+                 "repo_name", "_created_datetime")
+
+    def __init__(self, id: str, type: str, actor: Optional[Dict[str, Any]] = None,
+                 repo: Optional[Dict[str, Any]] = None, payload: Optional[Dict[str, Any]] = None,
+                 public: bool = True, created_at: str = "", org: Optional[Dict[str, Any]] = None):
+        self.id = str(id)
+        self.type = type
+        self.actor = actor or {}
+        self.repo = repo or {}
+        self.payload = payload or {}
+        self.public = public
+        self.created_at = created_at
+        self.org = org
+        self.repo_name = self.repo.get("name", "")
+        self._created_datetime = None
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'GitHubEventData':
         """从字典创建事件数据对象"""
         return cls(
-            id=str(data.get("id")),
+            id=data.get("id"),
             type=data.get("type", ""),
-            actor=data.get("actor", {}),
-            repo=data.get("repo", {}),
-            payload=data.get("payload", {}),
+            actor=data.get("actor"),
+            repo=data.get("repo"),
+            payload=data.get("payload"),
             public=data.get("public", True),
             created_at=data.get("created_at", ""),
             org=data.get("org")
         )
+
+    @property
+    def created_datetime(self) -> Optional[datetime]:
+        """事件时间（UTC，不带时区），解析一次后缓存，格式不正确时为None"""
+        if self._created_datetime is None and self.created_at:
+            try:
+                self._created_datetime = datetime.strptime(self.created_at, "%Y-%m-%dT%H:%M:%SZ")
+            except ValueError:
+                return None
+        return self._created_datetime
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换回 API 格式的字典"""
+        return {
+            "id": self.id,
+            "type": self.type,
+            "actor": self.actor,
+            "repo": self.repo,
+            "payload": self.payload,
+            "public": self.public,
+            "created_at": self.created_at,
+            "org": self.org
+        }
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GitHubEventData):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return (f"GitHubEventData(id={self.id!r}, type={self.type!r}, "
+                f"repo={self.repo_name!r}, created_at={self.created_at!r})")
@@ -0,0 +1,110 @@
+"""
+发送前的图片压缩
+"""
+import os
+from typing import Optional
+from astrbot.api import logger
+from .config_manager import ConfigManager
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 是可选依赖，未安装时原样发送渲染结果
+    Image = None
+
+
+class ImageCompressor:
+    """把渲染好的图片重新编码为 JPEG/WebP，并按配置的像素和字节上限缩小
+
+    先把宽度缩到上限以内，再逐步降低质量；最低质量仍然超出字节上限时继续按比例缩小，
+    直到满足上限或达到最小宽度。已经满足要求的图片不会重新编码。
+    """
+
+    FORMATS = {"jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+    QUALITY_STEPS = (90, 80, 70, 60, 50)
+    SCALE_STEP = 0.8
+    MIN_WIDTH = 480
+
+    def __init__(self, config_manager: ConfigManager):
+        self.config_manager = config_manager
+        self._missing_logged = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.config_manager.get_image_output_format() in self.FORMATS
+
+    def get_signature(self) -> str:
+        """当前的压缩配置，用作渲染缓存键的一部分，配置变化后不会复用旧的压缩结果"""
+        if not self.enabled:
+            return "original"
+        return (f"{self.config_manager.get_image_output_format()}:"
+                f"{self.config_manager.get_image_max_kb()}:{self.config_manager.get_image_max_width()}")
+
+    def _encode(self, image, pil_format: str, quality: int, output_path: str) -> int:
+        image.save(output_path, pil_format, quality=quality, optimize=True)
+        return os.path.getsize(output_path)
+
+    def compress(self, image_path: str) -> str:
+        """压缩图片，成功时删除原文件
+
+        Args:
+            image_path: 渲染得到的临时图片路径
+        Returns:
+            str: 压缩后的图片路径；未启用、未安装 Pillow 或无需压缩时为原路径
+        """
+        if not self.enabled:
+            return image_path
+        if Image is None:
+            if not self._missing_logged:
+                logger.warning("Yandere Github Stalker: 未安装 Pillow，图片将不经压缩直接发送")
+                self._missing_logged = True
+            return image_path
+
+        pil_format, ext = self.FORMATS[self.config_manager.get_image_output_format()]
+        max_bytes = self.config_manager.get_image_max_kb() * 1024
+        max_width = self.config_manager.get_image_max_width()
+        original_size = os.path.getsize(image_path)
+
+        with Image.open(image_path) as source:
+            source_format = source.format
+            image = source.convert("RGB")
+        if (source_format == pil_format and (not max_width or image.width <= max_width)
+                and (not max_bytes or original_size <= max_bytes)):
+            logger.debug(f"Yandere Github Stalker: 图片已满足大小要求（{original_size / 1024:.0f}KB），无需压缩")
+            return image_path
+
+        output_path = os.path.splitext(image_path)[0] + ".compressed" + ext
+        if max_width and image.width > max_width:
+            image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+        try:
+            while True:
+                for quality in self.QUALITY_STEPS:
+                    size = self._encode(image, pil_format, quality, output_path)
+                    if not max_bytes or size <= max_bytes:
+                        break
+                if not max_bytes or size <= max_bytes or image.width <= self.MIN_WIDTH:
+                    break
+                width = max(self.MIN_WIDTH, int(image.width * self.SCALE_STEP))
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+
+        if max_bytes and size > max_bytes:
+            logger.warning(
+                f"Yandere Github Stalker: 图片压缩到最小尺寸后仍有 {size / 1024:.0f}KB，超过上限 {max_bytes // 1024}KB")
+        logger.debug(
+            f"Yandere Github Stalker: 图片已压缩为{pil_format}：{original_size / 1024:.0f}KB → {size / 1024:.0f}KB，"
+            f"宽度 {image.width}px，质量 {quality}")
+        os.remove(image_path)
+        return output_path
+
+    def try_compress(self, image_path: Optional[str]) -> Optional[str]:
+        """压缩图片，失败时记录日志并返回原路径，不影响发送"""
+        if not image_path:
+            return image_path
+        try:
+            return self.compress(image_path)
+        except Exception as e:
+            logger.warning(f"Yandere Github Stalker: 图片压缩失败，发送原图: {e}")
+            return image_path
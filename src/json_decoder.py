@@ -0,0 +1,38 @@
+"""
+GitHub 响应的 JSON 解码
+"""
+import asyncio
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，未安装时使用标准库
+    orjson = None
+
+# 超过该字节数的响应在工作线程中解码，避免阻塞与其他插件共享的事件循环
+LARGE_RESPONSE_BYTES = 256 * 1024
+
+
+def get_backend_name() -> str:
+    """当前使用的解码后端"""
+    return "orjson" if orjson is not None else "json"
+
+
+def loads(raw: bytes) -> Any:
+    """同步解码原始字节"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+async def decode_json(raw: bytes, large_threshold: int = LARGE_RESPONSE_BYTES) -> Any:
+    """解码原始响应字节，较大的响应放到工作线程中解码
+
+    Args:
+        raw: 响应体
+        large_threshold: 超过该字节数时在工作线程中解码
+    """
+    if len(raw) >= large_threshold:
+        return await asyncio.to_thread(loads, raw)
+    return loads(raw)
@@ -0,0 +1,270 @@
+"""
+进程内指标：计数器和延迟直方图
+"""
+import asyncio
+import bisect
+import functools
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from aiohttp import web
+from astrbot.api import logger
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    "github_api_requests_total": "GitHub API 请求数（按接口和状态码）",
+    "github_api_request_seconds": "GitHub API 请求耗时",
+    "db_query_seconds": "事件ID数据库操作耗时",
+    "template_format_seconds": "病娇模板格式化耗时",
+    "render_seconds": "通知图片渲染耗时（按渲染方式）",
+    "send_total": "发送到会话的消息数（按平台和结果）",
+    "send_seconds": "context.send_message 耗时（按平台）",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶估算分位数（取所在桶的上限）"""
+        target = q * self.count
+        total = 0
+        for i, count in enumerate(self.buckets):
+            total += count
+            if total >= target and count:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return 0.0
+
+
+class _Timer:
+    """计时上下文，退出时把耗时记入直方图"""
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: Dict[str, Any]):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+class _NoopTimer:
+    """未启用指标时使用的空计时上下文"""
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopTimer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class MetricsRegistry:
+    """计数器和延迟直方图的注册表
+
+    未启用时 inc/observe 直接返回，timer 返回共享的空上下文，不读取时钟也不分配对象。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self.started_at = time.time()
+
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器加 value"""
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = self._label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """记录一次耗时"""
+        if not self.enabled:
+            return
+        series = self._histograms.setdefault(name, {})
+        key = self._label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = _Histogram()
+        histogram.observe(seconds)
+
+    def timer(self, name: str, **labels):
+        """计时上下文：with metrics.timer("render_seconds", backend="html"): ..."""
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, name, labels)
+
+    def timed(self, name: str, **labels):
+        """异步方法的计时装饰器"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def reset(self) -> None:
+        """清空所有指标"""
+        self._counters.clear()
+        self._histograms.clear()
+        self.started_at = time.time()
+
+    @staticmethod
+    def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        items = list(key) + ([extra] if extra else [])
+        if not items:
+            return ""
+        escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                   for k, v in items)
+        return "{" + ",".join(escaped) + "}"
+
+    def render_prometheus(self, prefix: str = "yandere_") -> str:
+        """按 Prometheus 文本格式输出所有指标"""
+        lines: List[str] = []
+        for name, series in sorted(self._counters.items()):
+            full_name = prefix + name
+            lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {full_name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full_name}{self._format_labels(key)} {value:g}")
+        for name, series in sorted(self._histograms.items()):
+            full_name = prefix + name
+            lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for key, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), histogram.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{full_name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+                lines.append(f"{full_name}_sum{self._format_labels(key)} {histogram.sum:.6f}")
+                lines.append(f"{full_name}_count{self._format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self) -> List[str]:
+        """生成给聊天命令看的摘要：每个直方图的次数、平均和P95，以及计数器"""
+        lines = []
+        for name, series in sorted(self._histograms.items()):
+            for key, histogram in sorted(series.items()):
+                labels = ",".join(f"{k}={v}" for k, v in key)
+                avg_ms = histogram.sum / histogram.count * 1000 if histogram.count else 0.0
+                p95 = histogram.quantile(0.95)
+                p95_text = f"≤{p95 * 1000:.0f}ms" if p95 != float("inf") else f">{LATENCY_BUCKETS[-1]:.0f}s"
+                lines.append(f"{name}{f'[{labels}]' if labels else ''}：{histogram.count}次，"
+                             f"平均{avg_ms:.1f}ms，P95 {p95_text}")
+        for name, series in sorted(self._counters.items()):
+            for key, value in sorted(series.items()):
+                labels = ",".join(f"{k}={v}" for k, v in key)
+                lines.append(f"{name}{f'[{labels}]' if labels else ''}：{value:g}")
+        return lines
+
+    async def write_prometheus_file(self, path: str) -> bool:
+        """写入 Prometheus 文本文件（供 node_exporter textfile collector 采集）
+
+        文本在事件循环中生成（指标只在事件循环中修改），文件在线程中写入，不阻塞事件循环。
+        """
+        try:
+            await asyncio.to_thread(self._write_text_file, path, self.render_prometheus())
+            return True
+        except Exception as e:
+            logger.warning(f"Yandere Github Stalker: 写入指标文件失败: {e}")
+            return False
+
+    @staticmethod
+    def _write_text_file(path: str, text: str) -> None:
+        """先写临时文件再替换，采集时不会读到写了一半的文件"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+
+class MetricsServer:
+    """在本地端口提供 /metrics（Prometheus 文本格式）"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1"):
+        self.registry = registry
+        self.host = host
+        self.port = 0
+        # 上次启动失败的端口：配置的端口没有变化时不再重试，避免每轮都报错
+        self.failed_port = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._runner is not None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    async def start(self, port: int) -> None:
+        """启动HTTP服务，端口变化时重启；端口绑定失败时抛出异常，之后只在端口变化时重试"""
+        if self._runner is not None and self.port == port:
+            return
+        if port == self.failed_port:
+            return
+        await self.stop()
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, port).start()
+        except Exception:
+            await runner.cleanup()
+            self.failed_port = port
+            raise
+        self._runner = runner
+        self.port = port
+        self.failed_port = 0
+        logger.info(f"Yandere Github Stalker: 指标服务已启动：http://{self.host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        """停止HTTP服务；之后重新启用时会再次尝试上次失败的端口"""
+        self.failed_port = 0
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.debug("Yandere Github Stalker: 指标服务已停止")
+
+
+# 插件内共享的指标注册表
+metrics = MetricsRegistry()
@@ -0,0 +1,337 @@
+"""
+获取 → 去重 → 渲染 → 发送 流水线
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from astrbot.api import logger
+from .config_manager import ConfigManager
+from .event_processor import EventProcessor
+from .github_api import GitHubAPI
+from .github_event_data import GitHubEventData
+from .notification_sender import NotificationSender, RenderedNotification
+from .outbox_drainer import OutboxDrainer
+from .user_profile_cache import UserProfileCache
+
+
+@dataclass
+class FeedBatch:
+    """一次收到的动态分发出的用户任务：还没处理完的任务数，以及是否有任务被跳过或出错"""
+    remaining: int
+    failed: bool = False
+
+
+@dataclass
+class FetchJob:
+    username: str
+    target_sessions: List[str]
+    # 已经从收到的动态中取得的事件，为None时单独请求该用户的动态
+    events: Optional[List[GitHubEventData]]
+    # 获取和去重完成后给出"是否有新事件"，因速率限制没有请求时为None
+    result: asyncio.Future
+    # 事件来自收到的动态时所属的批次
+    feed: Optional[FeedBatch] = None
+
+
+@dataclass
+class RenderJob:
+    username: str
+    target_sessions: List[str]
+    new_events: List[GitHubEventData]
+    feed: Optional[FeedBatch] = None
+
+
+@dataclass
+class SendJob:
+    username: str
+    target_sessions: List[str]
+    # (通知覆盖的事件, 渲染好的通知)，渲染失败时通知为None
+    deliveries: List[Tuple[List[GitHubEventData], Optional[RenderedNotification]]]
+    feed: Optional[FeedBatch] = None
+
+
+class StageStats:
+    """单个阶段的统计：处理的任务数、处理耗时，以及因下游队列已满而等待的时间"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.jobs = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    def to_dict(self, queue: Optional[asyncio.Queue]) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_size": queue.qsize() if queue else 0,
+            "queue_capacity": queue.maxsize if queue else 0,
+            "jobs": self.jobs,
+            "errors": self.errors,
+            "busy_seconds": self.busy_seconds,
+            "avg_seconds": self.busy_seconds / self.jobs if self.jobs else 0.0,
+            "blocked_seconds": self.blocked_seconds
+        }
+
+
+class NotificationPipeline:
+    """由有界队列连接的三个阶段，每个阶段有独立的工作协程：
+
+    - fetch：请求用户动态并去重，有新事件时按需刷新用户资料（工作协程数即最大并发请求数）
+    - render：生成文本或渲染图片
+    - send：发送到目标会话，失败的会话放入发件箱稍后重试，标记事件并写入数据库
+
+    下游处理不过来时队列会填满，上游的 put 随之等待，最终让 submit 变慢，从而拖慢轮询，
+    而不是在内存里堆积待发送的事件。同一用户的上一批通知还在处理时不会再次提交该用户，
+    避免尚未标记的事件被重复推送。
+    """
+
+    STAGES = ("fetch", "render", "send")
+
+    def __init__(self, github_api: GitHubAPI, event_processor: EventProcessor,
+                 notification_sender: NotificationSender, config_manager: ConfigManager,
+                 profile_cache: Optional[UserProfileCache] = None,
+                 outbox: Optional[OutboxDrainer] = None):
+        self.github_api = github_api
+        self.event_processor = event_processor
+        self.notification_sender = notification_sender
+        self.config_manager = config_manager
+        self.profile_cache = profile_cache
+        self.outbox = outbox
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._busy_users: Set[str] = set()
+        # 正在处理的收到的动态批次，处理完之前不再获取新的收到的动态
+        self._feed_batch: Optional[FeedBatch] = None
+        self.stats: Dict[str, StageStats] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        """创建队列和各阶段的工作协程"""
+        if self._workers:
+            return
+        queue_size = self.config_manager.get_pipeline_queue_size()
+        worker_counts = {
+            "fetch": self.config_manager.get_max_concurrent_requests(),
+            "render": self.config_manager.get_render_workers(),
+            "send": self.config_manager.get_send_workers()
+        }
+        handlers = {
+            "fetch": self._handle_fetch,
+            "render": self._handle_render,
+            "send": self._handle_send
+        }
+        for stage in self.STAGES:
+            self._queues[stage] = asyncio.Queue(maxsize=queue_size)
+            self.stats[stage] = StageStats(worker_counts[stage])
+            for _ in range(worker_counts[stage]):
+                self._workers.append(asyncio.create_task(self._worker(stage, handlers[stage])))
+        logger.debug(f"Yandere Github Stalker: 流水线已启动，队列容量 {queue_size}，工作协程 {worker_counts}")
+
+    async def stop(self) -> None:
+        """停止所有工作协程，丢弃队列中和正在处理的任务
+
+        这些用户（以及收到的动态）本次获取的校验值不会保存，下次请求仍发送旧的校验值并重新下载动态，
+        其中没有被标记、且仍在高水位之上的事件会再次处理；已发送的通知的标记照常写入。
+        """
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.github_api.discard_user_validators()
+        self._feed_batch = None
+        for queue in self._queues.values():
+            while not queue.empty():
+                job = queue.get_nowait()
+                if isinstance(job, FetchJob) and not job.result.done():
+                    job.result.cancel()
+                elif isinstance(job, SendJob):
+                    for _, rendered in job.deliveries:
+                        if rendered:
+                            self.notification_sender.release(rendered)
+        self._queues.clear()
+        self._busy_users.clear()
+        logger.debug("Yandere Github Stalker: 流水线已停止")
+
+    async def submit(self, username: str, target_sessions: List[str],
+                     events: Optional[List[GitHubEventData]] = None,
+                     feed: Optional[FeedBatch] = None) -> Optional[asyncio.Future]:
+        """提交一个用户，队列已满时等待（背压）
+
+        Args:
+            events: 已经从收到的动态中取得的事件，为None时单独请求该用户的动态
+            feed: 事件所属的收到的动态批次
+
+        Returns:
+            Optional[asyncio.Future]: 获取和去重完成后给出"是否有新事件"（因速率限制没有请求时为None）；
+            该用户上一批通知仍在处理时为None
+        """
+        if username in self._busy_users:
+            logger.debug(f"Yandere Github Stalker: 用户 {username} 的上一批通知仍在处理，本轮跳过")
+            return None
+        self._busy_users.add(username)
+        result = asyncio.get_running_loop().create_future()
+        await self._queues["fetch"].put(FetchJob(username, target_sessions, events, result, feed))
+        return result
+
+    def is_feed_busy(self) -> bool:
+        """上一次收到的动态是否还有用户没处理完"""
+        return self._feed_batch is not None
+
+    async def submit_feed(self, routed_events: Dict[str, List[GitHubEventData]],
+                          target_sessions: List[str]) -> None:
+        """提交收到的动态分发给各用户的事件
+
+        所有用户的事件标记都写入数据库后才保存收到的动态的校验值和最新事件ID；
+        有用户因上一批通知仍在处理而被跳过、或处理出错时丢弃它们，下次重新获取同样的动态。
+
+        Args:
+            routed_events: 用户名到其动态（按时间倒序）的映射
+        """
+        if not routed_events:
+            await self.github_api.commit_received_feed()
+            return
+        batch = FeedBatch(len(routed_events))
+        self._feed_batch = batch
+        for username, events in routed_events.items():
+            if await self.submit(username, target_sessions, events, batch) is None:
+                await self._finish_feed_job(batch, False)
+
+    async def drain(self) -> None:
+        """等待已提交的任务全部处理完；上游阶段清空时已把任务交给下游，因此按阶段顺序等待即可"""
+        for stage in self.STAGES:
+            await self._queues[stage].join()
+
+    async def _worker(self, stage: str, handler) -> None:
+        """从阶段队列取任务处理，单个任务出错不影响后续任务"""
+        queue = self._queues[stage]
+        stats = self.stats[stage]
+        while True:
+            job = await queue.get()
+            started = time.monotonic()
+            blocked = 0.0
+            try:
+                blocked = await handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.errors += 1
+                # 没有处理完的动态不能被 304 跳过：下次仍用旧的校验值请求
+                await self._finish(job, False)
+                logger.error(f"Yandere Github Stalker: 流水线 {stage} 阶段处理用户 {job.username} 时出错: {e}")
+            finally:
+                # 处理耗时不含等待下游队列的时间
+                stats.jobs += 1
+                stats.busy_seconds += time.monotonic() - started - blocked
+                stats.blocked_seconds += blocked
+                queue.task_done()
+
+    async def _finish(self, job: Any, success: bool) -> None:
+        """用户的这批事件处理完：成功（标记已写入数据库）时保存本次获取的校验值，否则丢弃"""
+        self._busy_users.discard(job.username)
+        if success:
+            await self.github_api.commit_user_validators(job.username)
+        else:
+            self.github_api.discard_user_validators(job.username)
+        if job.feed is not None:
+            await self._finish_feed_job(job.feed, success)
+
+    async def _finish_feed_job(self, batch: FeedBatch, success: bool) -> None:
+        """收到的动态批次中的一个任务结束；最后一个任务结束时保存或丢弃该动态的校验值"""
+        if not success:
+            batch.failed = True
+        batch.remaining -= 1
+        if batch.remaining > 0:
+            return
+        if batch is not self._feed_batch:
+            # 流水线已停止，暂存的校验值已经丢弃
+            return
+        self._feed_batch = None
+        if batch.failed:
+            self.github_api.discard_received_feed()
+        else:
+            await self.github_api.commit_received_feed()
+
+    async def _put(self, stage: str, job: Any) -> float:
+        """放入下游队列，返回因队列已满而等待的秒数"""
+        started = time.monotonic()
+        await self._queues[stage].put(job)
+        return time.monotonic() - started
+
+    async def _fetch_new_events(self, username: str,
+                                events: Optional[List[GitHubEventData]]) -> Optional[List[GitHubEventData]]:
+        """获取并去重单个用户的事件，触发速率限制没有请求时返回None"""
+        if events is None:
+            if self.github_api.rate_limiter.is_blocked():
+                logger.debug(f"Yandere Github Stalker: 触发速率限制，用户 {username} 推迟到下一轮检查")
+                return None
+
+            # 获取用户事件（条件请求，无变化时返回空列表），翻页到高水位或事件限制为止
+            watermark = await self.event_processor.get_watermark(username)
+            events = await self.github_api.get_user_events(
+                username, watermark=watermark,
+                max_new_events=self.config_manager.get_notification_event_limit())
+        if not events:
+            return []
+
+        # 处理事件
+        return await self.event_processor.process_events(events, username)
+
+    async def _handle_fetch(self, job: FetchJob) -> float:
+        try:
+            new_events = await self._fetch_new_events(job.username, job.events)
+        except Exception:
+            if not job.result.done():
+                job.result.set_result(False)
+            raise
+        if not job.result.done():
+            job.result.set_result(None if new_events is None else bool(new_events))
+        if not new_events:
+            await self._finish(job, True)
+            return 0.0
+        # 渲染阶段只读取本地缓存的资料，需要的网络请求在这里完成
+        if self.profile_cache and self.config_manager.is_image_notification_enabled() \
+                and self.config_manager.is_user_profile_enabled():
+            await self.profile_cache.refresh(job.username)
+        return await self._put("render", RenderJob(job.username, job.target_sessions, new_events, job.feed))
+
+    async def _handle_render(self, job: RenderJob) -> float:
+        as_image = self.config_manager.is_image_notification_enabled()
+        if self.config_manager.is_digest_notification_enabled():
+            deliveries = await self.notification_sender.render_digest(
+                job.username, job.new_events, self.config_manager.get_digest_max_events(), as_image)
+        else:
+            deliveries = [([event], await self.notification_sender.render_event(job.username, event, as_image))
+                          for event in job.new_events]
+        return await self._put("send", SendJob(job.username, job.target_sessions, deliveries, job.feed))
+
+    async def _handle_send(self, job: SendJob) -> float:
+        for covered_events, rendered in job.deliveries:
+            delivered = False
+            if rendered:
+                try:
+                    results = await self.notification_sender.deliver(
+                        rendered, job.target_sessions, release=False)
+                    # 失败的会话放入发件箱，由后台按退避重试，不需要重新渲染
+                    queued = await self.outbox.enqueue(job.username, rendered, results) \
+                        if self.outbox and not all(results.values()) else False
+                    delivered = self.notification_sender.is_delivered(results) or queued
+                finally:
+                    self.notification_sender.release(rendered)
+            for event in covered_events:
+                if delivered:
+                    await self.event_processor.mark_event_as_pushed(event.id, job.username, event.created_at)
+                else:
+                    # 如果发送失败且无法重试，也标记为已处理，避免重复推送
+                    await self.event_processor.mark_event_as_ignored(event.id, job.username, event.created_at)
+        # 本批的标记在一个事务中批量写入数据库，写入后才保存本次获取的校验值
+        await self._finish(job, await self.event_processor.flush_marks(job.username))
+        return 0.0
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各阶段的队列深度和耗时统计"""
+        return {stage: self.stats[stage].to_dict(self._queues.get(stage))
+                for stage in self.STAGES if stage in self.stats}
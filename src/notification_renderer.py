@@ -1,21 +1,27 @@
 """
 Notification rendering functionality
 """
-from typing import Dict, Any
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import os
-import json
+import tempfile
+from astrbot.api import logger
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from .card_renderer import PillowCardRenderer
+from .template_cache import TemplateCache
+from .user_profile_cache import UserProfileCache
 from .yandere_templates import YandereTemplates
 from .config_manager import ConfigManager
 from .github_event_data import GitHubEventData
+from .metrics import metrics
 
 
 class NotificationRenderer:
-    def __init__(self, config_manager: ConfigManager):
+    def __init__(self, config_manager: ConfigManager, profile_cache: Optional[UserProfileCache] = None):
         """初始化渲染器"""
         self.config_manager = config_manager
-        self.yandere_templates = YandereTemplates(self.config_manager.get_custom_templates())
+        self.profile_cache = profile_cache
+        self.template_cache = TemplateCache(self.config_manager)
         self.event_limit = self.config_manager.get_notification_event_limit()
 
         # 设置Jinja2环境
@@ -27,11 +33,41 @@ class NotificationRenderer:
             trim_blocks=True,
             lstrip_blocks=True
         )
+        # Pillow 卡片渲染器，按配置的字体路径延迟创建
+        self._card_renderer: Optional[PillowCardRenderer] = None
+        self._card_font_config: Optional[str] = None
+        self._card_fallback_logged = False
+
+    @property
+    def yandere_templates(self) -> YandereTemplates:
+        """当前生效的事件模板"""
+        return self.template_cache.yandere_templates
+
+    def refresh_templates(self) -> bool:
+        """配置或schema有变化时重新加载模板，返回是否重新加载"""
+        return self.template_cache.refresh()
 
     def get_event_description(self, event: GitHubEventData) -> str:
         """根据事件类型生成描述"""
         return self.yandere_templates.format_event_message(event)
 
+    def process_event(self, event: GitHubEventData) -> Dict[str, Any]:
+        """把事件转换为HTML模板使用的字典"""
+        created_datetime = event.created_datetime
+        created_at = created_datetime.strftime("%Y-%m-%d %H:%M:%S") if created_datetime else event.created_at
+        return {
+            'type': event.type,
+            'repo_name': event.repo_name,
+            'description': self.get_event_description(event),
+            'created_at': created_at
+        }
+
+    def get_profile(self, username: str) -> Optional[Dict[str, Any]]:
+        """获取卡片上展示的用户资料（只读本地缓存），未启用或没有缓存时为None"""
+        if self.profile_cache is None or not self.config_manager.is_user_profile_enabled():
+            return None
+        return self.profile_cache.get_profile(username)
+
     def render_html(self, username: str, event: GitHubEventData) -> str:
         """
         渲染HTML内容
@@ -40,37 +76,111 @@ class NotificationRenderer:
         :return: 渲染后的HTML字符串
         """
         template = self.jinja_env.get_template('notification.html')
-        # 处理事件数据
-        created_at = datetime.strptime(
-            event.created_at,
-            "%Y-%m-%dT%H:%M:%SZ"
-        ).strftime("%Y-%m-%d %H:%M:%S")
-        processed_event = {
-            'type': event.type,
-            'repo_name': event.repo['name'],
-            'description': self.get_event_description(event),
-            'created_at': created_at
-        }
         # 渲染模板
         return template.render(
             username=username,
-            events=[processed_event]  # 保持模板兼容性
+            profile=self.get_profile(username),
+            events=[self.process_event(event)]  # 保持模板兼容性
         )
 
     def create_text_notification(self, username: str, event: GitHubEventData) -> str:
         """创建文本通知内容（单个事件）"""
-        yandere = self.yandere_templates
-        # 从schema加载默认模板
-        schema_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '_conf_schema.json')
-        try:
-            with open(schema_path, 'r', encoding='utf-8') as f:
-                schema = json.load(f)
-            # 使用配置中的通知模板
-            notification_template = schema.get('notification_template', {}).get('default', "啊啊啊！{username}君又有新的动态了呢！♥\n\n")
-        except Exception:
-            # 如果无法读取schema，使用默认模板
-            notification_template = "啊啊啊！{username}君又有新的动态了呢！♥\n\n"
+        message = self.template_cache.notification_template.format(username=username)
+        message += f"{self.yandere_templates.format_event_message(event)}\n\n"
+        return message
+
+    def prepare_digest(self, username: str, events: List[GitHubEventData],
+                       max_events: int) -> Tuple[List[GitHubEventData], List[GitHubEventData], List[Dict[str, Any]], int]:
+        """
+        准备摘要通知的内容：格式化前 max_events 个事件，其余的只计数
+        :param username: 用户名
+        :param events: 用户本轮的新事件（按时间倒序）
+        :param max_events: 摘要中最多展示的事件数量
+        :return: (摘要覆盖的事件, 无法格式化的事件, 展示的事件字典, 未展示的事件数量)；
+                 前两项合起来就是全部输入事件
+        """
+        covered_events = []
+        failed_events = []
+        processed_events = []
+        for event in events[:max_events]:
+            try:
+                processed_events.append(self.process_event(event))
+                covered_events.append(event)
+            except Exception as e:
+                failed_events.append(event)
+                logger.warning(
+                    f"Yandere Github Stalker: 用户 {username} 的事件 {event.id} 无法格式化，不加入摘要: {e}")
+        remaining_events = events[max_events:]
+        covered_events.extend(remaining_events)
+        return covered_events, failed_events, processed_events, len(remaining_events)
+
+    def _format_remaining(self, username: str, remaining: int) -> str:
+        """生成"还有N个动态"的提示，没有剩余时为空字符串"""
+        if remaining <= 0:
+            return ""
+        return self.template_cache.remaining_template.format(count=remaining, username=username)
+
+    def render_digest_html(self, username: str, processed_events: List[Dict[str, Any]], remaining: int) -> str:
+        """
+        渲染摘要HTML：一张图片包含用户本轮的所有动态
+        :param processed_events: prepare_digest 返回的事件字典
+        :param remaining: 未展示的事件数量
+        """
+        template = self.jinja_env.get_template('notification.html')
+        return template.render(
+            username=username,
+            profile=self.get_profile(username),
+            events=processed_events,
+            remaining_text=self._format_remaining(username, remaining)
+        )
 
-        message = notification_template.format(username=username)
-        message += f"{yandere.format_event_message(event)}\n\n"
+    def create_text_digest(self, username: str, processed_events: List[Dict[str, Any]], remaining: int) -> str:
+        """创建摘要文本：通知开头、每个动态一段，最后是剩余动态提示"""
+        message = self.template_cache.notification_template.format(username=username)
+        message += "\n\n".join(event['description'] for event in processed_events)
+        remaining_text = self._format_remaining(username, remaining)
+        if remaining_text:
+            message += f"\n\n{remaining_text}"
         return message
+
+    def _get_card_renderer(self) -> PillowCardRenderer:
+        """获取 Pillow 卡片渲染器，字体配置变化时重建"""
+        font_path = self.config_manager.get_card_font_path()
+        if self._card_renderer is None or self._card_font_config != font_path:
+            self._card_renderer = PillowCardRenderer(font_path)
+            self._card_font_config = font_path
+            self._card_fallback_logged = False
+        return self._card_renderer
+
+    def get_image_backend(self) -> str:
+        """
+        获取当前使用的图片渲染后端
+        :return: "pillow" 或 "html"；配置为 pillow 但 Pillow 未安装或找不到字体时回退到 "html"
+        """
+        if self.config_manager.get_image_renderer() != "pillow":
+            return "html"
+        if self._get_card_renderer().available:
+            return "pillow"
+        if not self._card_fallback_logged:
+            logger.warning("Yandere Github Stalker: Pillow 未安装或找不到中文字体（可配置 card_font_path），"
+                           "图片通知改用 html_render")
+            self._card_fallback_logged = True
+        return "html"
+
+    async def render_card(self, username: str, processed_events: List[Dict[str, Any]], remaining: int) -> str:
+        """
+        用 Pillow 绘制与HTML模板相同布局的卡片（在工作线程中绘制）
+        :param processed_events: process_event 返回的事件字典
+        :param remaining: 未展示的事件数量
+        :return: 临时图片路径
+        """
+        fd, image_path = tempfile.mkstemp(prefix="yandere_card_", suffix=".jpg")
+        os.close(fd)
+        try:
+            with metrics.timer("render_seconds", backend="pillow"):
+                return await asyncio.to_thread(
+                    self._get_card_renderer().render, processed_events,
+                    self._format_remaining(username, remaining), image_path, self.get_profile(username))
+        except Exception:
+            os.remove(image_path)
+            raise
@@ -1,22 +1,55 @@
 """
 通知发送器
 """
+import asyncio
 import os
-from typing import List
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 from astrbot.api import logger
 from astrbot.core.message.message_event_result import MessageChain
 from astrbot.core.message.components import Image, Plain
 from .notification_renderer import NotificationRenderer
+from .platform_rate_limiter import PlatformRateLimiter
+from .render_cache import RenderCache
+from .image_compressor import ImageCompressor
+from .metrics import metrics
 from .github_event_data import GitHubEventData
 
 
+@dataclass
+class RenderedNotification:
+    """渲染好、等待发送的通知"""
+    message_chain: MessageChain
+    # 文本通知的内容，发送失败时保存到发件箱
+    text: Optional[str] = None
+    # 图片通知的图片文件
+    image_path: Optional[str] = None
+    # 图片来自渲染缓存时的缓存键，发送后取消固定；为None时图片是临时文件，发送后删除
+    cache_key: Optional[str] = None
+
+
 class NotificationSender:
-    def __init__(self, notification_renderer: NotificationRenderer, context, html_render):
+    def __init__(self, notification_renderer: NotificationRenderer, context, html_render,
+                 rate_limiter: Optional[PlatformRateLimiter] = None,
+                 render_cache: Optional[RenderCache] = None,
+                 image_compressor: Optional[ImageCompressor] = None):
         self.notification_renderer = notification_renderer
         self.context = context
         self.html_render = html_render
+        self.rate_limiter = rate_limiter
+        self.render_cache = render_cache
+        self.image_compressor = image_compressor
         logger.debug("Yandere Github Stalker: 通知发送器初始化完成")
 
+    @staticmethod
+    def is_delivered(results: Dict[str, bool]) -> bool:
+        """是否至少送达了一个会话"""
+        return any(results.values())
+
+    def get_retryable_sessions(self, results: Dict[str, bool]) -> List[str]:
+        """发送失败、值得重试的会话（会话ID格式不合法的重试也不会成功）"""
+        return [session for session, ok in results.items() if not ok and len(session.split(":")) == 3]
+
     def _validate_session(self, session: str) -> bool:
         """
         验证会话ID格式是否正确
@@ -33,105 +66,217 @@ class NotificationSender:
                 f"Yandere Github Stalker: 会话ID格式验证失败: {session}, 错误: {e}")
             return False
 
-    async def _send_notification(self, message_chain: MessageChain, target_sessions: List[str]) -> bool:
+    async def send_to_session(self, session: str, message_chain: MessageChain) -> bool:
+        """按平台限速后发送到单个会话"""
+        if not self._validate_session(session):
+            logger.warning(
+                f"Yandere Github Stalker: 跳过无效会话ID: {session}")
+            return False
+        platform = session.split(":", 1)[0]
+        try:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire(session)
+            logger.debug(f"Yandere Github Stalker: 正在发送通知到会话: {session}")
+            with metrics.timer("send_seconds", platform=platform):
+                await self.context.send_message(session, message_chain)
+            metrics.inc("send_total", platform=platform, result="ok")
+            logger.debug(f"Yandere Github Stalker: 成功发送通知到会话: {session}")
+            return True
+        except Exception as e:
+            metrics.inc("send_total", platform=platform, result="error")
+            logger.error(
+                f"Yandere Github Stalker: 发送通知到会话 {session} 失败: {e}")
+            return False
+
+    async def _send_notification(self, message_chain: MessageChain, target_sessions: List[str]) -> Dict[str, bool]:
         """
-        发送通知到目标会话
-        :return: 是否全部发送成功
+        并发发送通知到目标会话，同一平台的发送受限速器约束
+        :return: 每个会话是否发送成功
         """
-        success = True
         logger.debug(
             f"Yandere Github Stalker: 准备发送通知到 {len(target_sessions)} 个会话")
 
-        for session in target_sessions:
-            try:
-                if not self._validate_session(session):
-                    logger.warning(
-                        f"Yandere Github Stalker: 跳过无效会话ID: {session}")
-                    continue
-
-                logger.debug(f"Yandere Github Stalker: 正在发送通知到会话: {session}")
-                await self.context.send_message(session, message_chain)
-                logger.debug(f"Yandere Github Stalker: 成功发送通知到会话: {session}")
-            except Exception as e:
-                logger.error(
-                    f"Yandere Github Stalker: 发送通知到会话 {session} 失败: {e}")
-                success = False
+        sessions = list(dict.fromkeys(target_sessions))
+        sent = await asyncio.gather(*(
+            self.send_to_session(session, message_chain) for session in sessions
+        ))
+        results = dict(zip(sessions, sent))
 
         logger.debug(
-            f"Yandere Github Stalker: 通知发送{'成功' if success else '失败'}")
-        return success
-
-    async def send_image_notification(self, username: str, event: GitHubEventData, target_sessions: List[str]) -> bool:
-        """
-        发送图片通知
-        :return: 是否发送成功
-        """
-        try:
-            event_id = event.id
-            event_type = event.type
-            logger.debug(
-                f"Yandere Github Stalker: 准备为用户 {username} 的事件 {event_id}（类型：{event_type}）生成图片通知")
-
-            html_content = self.notification_renderer.render_html(
-                username, event)
-            logger.debug(f"Yandere Github Stalker: 已生成HTML内容，准备渲染图片")
+            f"Yandere Github Stalker: 通知发送完成，成功 {sum(sent)}/{len(sessions)} 个会话")
+        return results
 
+    async def _render_to_file(self, html_content: str) -> Optional[str]:
+        """调用 html_render 把HTML渲染为图片文件，失败时返回None"""
+        with metrics.timer("render_seconds", backend="html"):
             image_path = await self.html_render(
                 tmpl=html_content,
                 data={},
                 return_url=False
             )
-            if not image_path:
-                logger.error("Yandere Github Stalker: 图片渲染失败，未获得图片路径")
-                return False
-
-            logger.debug(f"Yandere Github Stalker: 图片已渲染，路径：{image_path}")
-            img = Image.fromFileSystem(image_path)
-            if not img:
-                logger.error(
-                    f"Yandere Github Stalker: 无法从路径 {image_path} 加载图片")
-                return False
-
-            logger.debug("Yandere Github Stalker: 图片加载成功，准备发送通知")
-            success = await self._send_notification(MessageChain([img]), target_sessions)
-
-            # 清理临时文件
-            if os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                    logger.debug(
-                        f"Yandere Github Stalker: 已清理临时图片文件: {image_path}")
-                except Exception as e:
-                    logger.warning(f"Yandere Github Stalker: 删除图片文件失败: {e}")
-
-            return success
+        if not image_path:
+            logger.error("Yandere Github Stalker: 图片渲染失败，未获得图片路径")
+            return None
+        logger.debug(f"Yandere Github Stalker: 图片已渲染，路径：{image_path}")
+        return image_path
+
+    async def _render_image(self, username: str, processed_events: List[Dict[str, Any]],
+                            remaining: int) -> Optional[RenderedNotification]:
+        """
+        把事件渲染为图片，按配置使用 Pillow 或 html_render，再按配置压缩；
+        启用渲染缓存时相同的内容直接复用已渲染（已压缩）的图片。
+        Pillow 绘制失败时改用 html_render，结果按实际使用的 html 渲染方式缓存
+        :return: 渲染好的图片通知，失败时为None
+        """
+        html_content = self.notification_renderer.render_digest_html(username, processed_events, remaining)
+        backend = self.notification_renderer.get_image_backend()
+        compression = self.image_compressor.get_signature() if self.image_compressor else "original"
+
+        async def render(image_backend: str) -> Optional[str]:
+            if image_backend == "pillow":
+                image_path = await self.notification_renderer.render_card(username, processed_events, remaining)
+            else:
+                image_path = await self._render_to_file(html_content)
+            if image_path and self.image_compressor:
+                image_path = await asyncio.to_thread(self.image_compressor.try_compress, image_path)
+            return image_path
+
+        async def render_cached(image_backend: str) -> Tuple[Optional[str], Optional[str]]:
+            if self.render_cache and self.render_cache.enabled:
+                return await self.render_cache.get_or_render(
+                    f"{image_backend}\n{compression}\n{html_content}", lambda: render(image_backend))
+            return None, await render(image_backend)
+
+        try:
+            cache_key, image_path = await render_cached(backend)
         except Exception as e:
-            logger.error(f"Yandere Github Stalker: 发送图片通知失败: {e}")
-            return False
+            if backend != "pillow":
+                raise
+            logger.warning(f"Yandere Github Stalker: Pillow 绘制卡片失败，改用 html_render: {e}")
+            cache_key, image_path = await render_cached("html")
+        if not image_path:
+            return None
+
+        rendered = RenderedNotification(MessageChain([]), image_path=image_path, cache_key=cache_key)
+        img = Image.fromFileSystem(image_path)
+        if not img:
+            logger.error(
+                f"Yandere Github Stalker: 无法从路径 {image_path} 加载图片")
+            self.release(rendered)
+            return None
+        rendered.message_chain = MessageChain([img])
+        return rendered
+
+    def release(self, rendered: RenderedNotification) -> None:
+        """通知不再需要图片文件：缓存中的图片取消固定，临时图片直接删除"""
+        if rendered.cache_key:
+            self.render_cache.unpin(rendered.cache_key)
+        else:
+            self.remove_image(rendered.image_path)
+
+    @staticmethod
+    def remove_image(image_path: Optional[str]) -> None:
+        """清理临时图片文件"""
+        if image_path and os.path.exists(image_path):
+            try:
+                os.remove(image_path)
+                logger.debug(
+                    f"Yandere Github Stalker: 已清理临时图片文件: {image_path}")
+            except Exception as e:
+                logger.warning(f"Yandere Github Stalker: 删除图片文件失败: {e}")
 
-    async def send_text_notification(self, username: str, event: GitHubEventData, target_sessions: List[str]) -> bool:
+    async def render_event(self, username: str, event: GitHubEventData,
+                           as_image: bool) -> Optional[RenderedNotification]:
         """
-        发送文本通知
-        :return: 是否发送成功
+        渲染单个事件的通知
+        :param as_image: 是否渲染为图片
+        :return: 渲染好的通知，失败时为None
         """
         try:
-            event_id = event.id
-            event_type = event.type
             logger.debug(
-                f"Yandere Github Stalker: 准备为用户 {username} 的事件 {event_id}（类型：{event_type}）生成文本通知")
+                f"Yandere Github Stalker: 准备为用户 {username} 的事件 {event.id}（类型：{event.type}）"
+                f"生成{'图片' if as_image else '文本'}通知")
+            if as_image:
+                processed_event = self.notification_renderer.process_event(event)
+                return await self._render_image(username, [processed_event], 0)
+            text = self.notification_renderer.create_text_notification(username, event)
+            return RenderedNotification(MessageChain([Plain(text)]), text=text)
+        except Exception as e:
+            logger.error(f"Yandere Github Stalker: 生成事件 {event.id} 的通知失败: {e}")
+            return None
 
-            text = self.notification_renderer.create_text_notification(
-                username, event)
-            logger.debug("Yandere Github Stalker: 文本通知生成成功，准备发送")
+    async def render_digest(self, username: str, events: List[GitHubEventData], max_events: int,
+                            as_image: bool) -> List[Tuple[List[GitHubEventData], Optional[RenderedNotification]]]:
+        """
+        把用户本轮的所有新事件渲染为一条通知（一次渲染）
+        :param max_events: 摘要中最多展示的事件数量，其余的用剩余动态提示概括
+        :param as_image: 是否渲染为图片
+        :return: [(事件, 渲染好的通知)]，每个输入事件恰好出现一次；无法格式化的事件单独成组、通知为None，
+                 渲染失败时所有事件的通知都为None，由调用方标记为已忽略
+        """
+        try:
+            covered_events, failed_events, processed_events, remaining = \
+                self.notification_renderer.prepare_digest(username, events, max_events)
+            if not processed_events:
+                logger.warning(f"Yandere Github Stalker: 用户 {username} 没有可展示的事件，跳过摘要通知")
+                return [(events, None)]
+            logger.debug(
+                f"Yandere Github Stalker: 准备为用户 {username} 生成摘要通知，"
+                f"展示 {len(processed_events)} 个事件，剩余 {remaining} 个")
 
-            success = await self._send_notification(MessageChain([Plain(text)]), target_sessions)
-            if success:
-                logger.debug(
-                    f"Yandere Github Stalker: 文本通知发送成功，事件ID：{event_id}")
+            if as_image:
+                rendered = await self._render_image(username, processed_events, remaining)
             else:
-                logger.warning(
-                    f"Yandere Github Stalker: 文本通知发送失败，事件ID：{event_id}")
-            return success
+                text = self.notification_renderer.create_text_digest(
+                    username, processed_events, remaining)
+                rendered = RenderedNotification(MessageChain([Plain(text)]), text=text)
+            deliveries = [(covered_events, rendered)]
+            if failed_events:
+                deliveries.append((failed_events, None))
+            return deliveries
         except Exception as e:
-            logger.error(f"Yandere Github Stalker: 发送文本通知失败: {e}")
-            return False
+            logger.error(f"Yandere Github Stalker: 生成摘要通知失败: {e}")
+            return [(events, None)]
+
+    async def deliver(self, rendered: RenderedNotification, target_sessions: List[str],
+                      release: bool = True) -> Dict[str, bool]:
+        """
+        发送渲染好的通知
+        :param release: 发送后是否释放图片文件；为False时由调用方在用完后调用 release
+        :return: 每个会话是否发送成功
+        """
+        try:
+            return await self._send_notification(rendered.message_chain, target_sessions)
+        finally:
+            if release:
+                self.release(rendered)
+
+    async def send_image_notification(self, username: str, event: GitHubEventData,
+                                      target_sessions: List[str]) -> Dict[str, bool]:
+        """
+        发送图片通知
+        :return: 每个会话是否发送成功，渲染失败时为空字典
+        """
+        rendered = await self.render_event(username, event, as_image=True)
+        return await self.deliver(rendered, target_sessions) if rendered else {}
+
+    async def send_text_notification(self, username: str, event: GitHubEventData,
+                                     target_sessions: List[str]) -> Dict[str, bool]:
+        """
+        发送文本通知
+        :return: 每个会话是否发送成功，生成失败时为空字典
+        """
+        rendered = await self.render_event(username, event, as_image=False)
+        return await self.deliver(rendered, target_sessions) if rendered else {}
+
+    async def send_digest_notification(self, username: str, events: List[GitHubEventData],
+                                       target_sessions: List[str], max_events: int,
+                                       as_image: bool) -> Tuple[List[GitHubEventData], Dict[str, bool]]:
+        """
+        把用户本轮的所有新事件合并为一条通知发送
+        :return: (摘要覆盖的事件, 每个会话是否发送成功)
+        """
+        covered_events, rendered = (await self.render_digest(username, events, max_events, as_image))[0]
+        if not rendered:
+            return [], {}
+        return covered_events, await self.deliver(rendered, target_sessions)
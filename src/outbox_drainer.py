@@ -0,0 +1,153 @@
+"""
+发件箱重试：按指数退避重新发送失败的通知
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+from astrbot.api import logger
+from astrbot.core.message.message_event_result import MessageChain
+from astrbot.core.message.components import Image, Plain
+from .config_manager import ConfigManager
+from .notification_sender import NotificationSender, RenderedNotification
+from .outbox_manager import OutboxManager
+
+
+class OutboxDrainer:
+    """把发送失败的会话放入发件箱，并在后台按指数退避重试
+
+    通知只渲染一次：重试时直接发送发件箱里保存的文本或图片，只重试失败的会话。
+    某个会话的尝试次数达到上限后进入死信，不再重试。
+    """
+
+    # 检查到期重试的间隔（秒）、每次最多处理的投递数，以及单次退避的上限（秒）
+    DRAIN_INTERVAL = 15
+    BATCH_SIZE = 50
+    MAX_RETRY_DELAY = 3600
+
+    def __init__(self, outbox_manager: OutboxManager, notification_sender: NotificationSender,
+                 config_manager: ConfigManager):
+        self.outbox_manager = outbox_manager
+        self.notification_sender = notification_sender
+        self.config_manager = config_manager
+        self._task: Optional[asyncio.Task] = None
+        self.retried = 0
+        self.recovered = 0
+        self.dead_lettered = 0
+
+    @property
+    def enabled(self) -> bool:
+        """最多尝试次数包含首次发送，至少为2才会重试"""
+        return self.config_manager.get_outbox_max_attempts() > 1
+
+    def get_retry_delay(self, attempts: int) -> float:
+        """第 attempts 次尝试失败后的等待时间：基础间隔 × 2^(attempts-1)，不超过上限"""
+        base = self.config_manager.get_outbox_retry_base_seconds()
+        return min(base * 2 ** max(attempts - 1, 0), self.MAX_RETRY_DELAY)
+
+    async def enqueue(self, username: str, rendered: RenderedNotification, results: Dict[str, bool]) -> bool:
+        """
+        把首次发送失败的会话放入发件箱，会话ID格式不合法的不重试
+        :param results: 首次发送的结果
+        :return: 是否有会话放入了发件箱
+        """
+        failed_sessions = self.notification_sender.get_retryable_sessions(results)
+        if not failed_sessions or not self.enabled:
+            return False
+        return await self.outbox_manager.enqueue(
+            username, rendered.text, rendered.image_path, failed_sessions,
+            attempts=1, next_attempt_at=time.time() + self.get_retry_delay(1))
+
+    def start(self) -> None:
+        """启动后台重试任务，上次未完成的重试会继续"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain_loop())
+
+    async def stop(self) -> None:
+        """停止后台重试任务，未完成的重试保留在数据库中"""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _drain_loop(self) -> None:
+        while True:
+            try:
+                if self.enabled:
+                    await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Yandere Github Stalker: 发件箱重试出错: {e}")
+            await asyncio.sleep(self.DRAIN_INTERVAL)
+
+    def _build_message_chain(self, item: Dict[str, Any]) -> Optional[MessageChain]:
+        if item["message_text"] is not None:
+            return MessageChain([Plain(item["message_text"])])
+        if item["image_path"] and os.path.exists(item["image_path"]):
+            img = Image.fromFileSystem(item["image_path"])
+            if img:
+                return MessageChain([img])
+        return None
+
+    async def drain_once(self) -> int:
+        """
+        重试一批到期的投递
+        :return: 处理的投递数量
+        """
+        due = await self.outbox_manager.get_due(time.time(), self.BATCH_SIZE)
+        if not due:
+            return 0
+        max_attempts = self.config_manager.get_outbox_max_attempts()
+        chains: Dict[int, Optional[MessageChain]] = {}
+        for item in due:
+            if item["outbox_id"] not in chains:
+                chains[item["outbox_id"]] = self._build_message_chain(item)
+
+        async def retry(item: Dict[str, Any]) -> Dict[str, Any]:
+            chain = chains[item["outbox_id"]]
+            attempts = item["attempts"] + 1
+            if chain is None:
+                error = "通知内容已丢失"
+                delivered = False
+                attempts = max_attempts
+            else:
+                delivered = await self.notification_sender.send_to_session(item["session"], chain)
+                error = None if delivered else "发送失败"
+            attempt = {"outbox_id": item["outbox_id"], "session": item["session"], "delivered": delivered}
+            if not delivered:
+                dead = attempts >= max_attempts
+                attempt.update({
+                    "state": "dead" if dead else "pending",
+                    "attempts": attempts,
+                    "next_attempt_at": time.time() + self.get_retry_delay(attempts),
+                    "last_error": error
+                })
+                if dead:
+                    logger.warning(
+                        f"Yandere Github Stalker: 用户 {item['username']} 的通知发送到会话 {item['session']} "
+                        f"失败 {attempts} 次，已放入死信")
+            return attempt
+
+        attempts = await asyncio.gather(*(retry(item) for item in due))
+        await self.outbox_manager.record_attempts(list(attempts))
+
+        recovered = sum(1 for a in attempts if a["delivered"])
+        dead = sum(1 for a in attempts if not a["delivered"] and a["state"] == "dead")
+        self.retried += len(attempts)
+        self.recovered += recovered
+        self.dead_lettered += dead
+        logger.debug(
+            f"Yandere Github Stalker: 发件箱重试了 {len(attempts)} 个投递，成功 {recovered} 个，进入死信 {dead} 个")
+        return len(attempts)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """获取发件箱统计"""
+        counts = await self.outbox_manager.get_counts()
+        return {
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "dead_lettered": self.dead_lettered
+        }
@@ -0,0 +1,281 @@
+"""
+通知发件箱管理器 - 持久化发送失败、等待重试的通知
+"""
+import asyncio
+import os
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional
+from astrbot.api import logger
+from astrbot.api.star import Context
+from sqlalchemy import text
+
+
+class OutboxManager:
+    """通知发件箱管理器类 - 使用 AstrBot 数据库存储，重启后未完成的重试会继续
+
+    每条通知只保存一次（文本内容或图片文件的副本），每个发送失败的会话单独记录投递状态：
+    pending 等待重试，dead 超过重试次数。发送成功的会话记录直接删除。
+    """
+
+    def __init__(self, context: Context, storage_dir: str):
+        """
+        初始化发件箱管理器
+
+        Args:
+            context: AstrBot上下文
+            storage_dir: 保存待重试图片副本的目录
+        """
+        self.context = context
+        self.db = self.context.get_db()
+        self.storage_dir = storage_dir
+        self.table_name = "github_notification_outbox"
+        self.delivery_table_name = "github_notification_outbox_deliveries"
+        self._table_ensured = False
+        self._table_lock = asyncio.Lock()
+        os.makedirs(storage_dir, exist_ok=True)
+        logger.debug("Yandere Github Stalker: 初始化通知发件箱管理器，使用数据库存储")
+
+    async def _ensure_table_once(self) -> None:
+        """确保表只被初始化一次（延迟初始化模式），并发的首次调用等待同一次初始化"""
+        if self._table_ensured:
+            return
+        async with self._table_lock:
+            if not self._table_ensured:
+                await self._ensure_table()
+                self._table_ensured = True
+
+    async def _ensure_table(self) -> None:
+        """确保数据库中有发件箱表和投递状态表"""
+        try:
+            async with self.db.get_db() as session:
+                async with session.begin():
+                    await session.execute(text(f"""
+                        CREATE TABLE IF NOT EXISTS {self.table_name} (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            username TEXT,
+                            message_text TEXT,
+                            image_path TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        );
+                    """))
+                    await session.execute(text(f"""
+                        CREATE TABLE IF NOT EXISTS {self.delivery_table_name} (
+                            outbox_id INTEGER,
+                            session TEXT,
+                            state TEXT DEFAULT 'pending',
+                            attempts INTEGER DEFAULT 0,
+                            next_attempt_at REAL,
+                            last_error TEXT,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (outbox_id, session)
+                        );
+                    """))
+                    await session.execute(text(f"""
+                        CREATE INDEX IF NOT EXISTS idx_{self.delivery_table_name}_due
+                        ON {self.delivery_table_name} (state, next_attempt_at);
+                    """))
+                    logger.debug("Yandere Github Stalker: 发件箱表检查/创建完成")
+        except Exception as e:
+            logger.error(f"创建发件箱表失败: {e}")
+            raise
+
+    def _store_image(self, image_path: str) -> str:
+        """把图片复制到发件箱目录；渲染缓存和临时文件在发送后可能被删除"""
+        stored_path = os.path.join(self.storage_dir, uuid.uuid4().hex + os.path.splitext(image_path)[1])
+        shutil.copyfile(image_path, stored_path)
+        return stored_path
+
+    @staticmethod
+    def _remove_image(image_path: Optional[str]) -> None:
+        if image_path and os.path.exists(image_path):
+            try:
+                os.remove(image_path)
+            except OSError as e:
+                logger.warning(f"Yandere Github Stalker: 删除发件箱图片失败: {e}")
+
+    async def _remove_images(self, image_paths: List[Optional[str]]) -> None:
+        """在线程中删除图片副本，不阻塞事件循环"""
+        for image_path in image_paths:
+            if image_path:
+                await asyncio.to_thread(self._remove_image, image_path)
+
+    async def enqueue(self, username: str, message_text: Optional[str], image_path: Optional[str],
+                      sessions: List[str], attempts: int, next_attempt_at: float) -> bool:
+        """
+        保存一条发送失败的通知
+
+        Args:
+            username: GitHub用户名
+            message_text: 文本通知的内容，图片通知为None
+            image_path: 图片通知的图片文件，会复制一份到发件箱目录
+            sessions: 发送失败、需要重试的会话
+            attempts: 已经尝试的次数
+            next_attempt_at: 下次重试的时间（time.time()）
+        Returns:
+            bool: 是否保存成功
+        """
+        stored_path = None
+        try:
+            await self._ensure_table_once()
+            if image_path:
+                stored_path = await asyncio.to_thread(self._store_image, image_path)
+
+            async with self.db.get_db() as session:
+                async with session.begin():
+                    result = await session.execute(text(f"""
+                        INSERT INTO {self.table_name} (username, message_text, image_path)
+                        VALUES (:username, :message_text, :image_path)
+                    """), {"username": username, "message_text": message_text, "image_path": stored_path})
+                    outbox_id = result.lastrowid
+                    await session.execute(text(f"""
+                        INSERT INTO {self.delivery_table_name} (outbox_id, session, attempts, next_attempt_at)
+                        VALUES (:outbox_id, :session, :attempts, :next_attempt_at)
+                    """), [
+                        {"outbox_id": outbox_id, "session": target, "attempts": attempts,
+                         "next_attempt_at": next_attempt_at}
+                        for target in sessions
+                    ])
+            logger.debug(f"Yandere Github Stalker: 用户 {username} 的通知已放入发件箱，{len(sessions)} 个会话等待重试")
+            return True
+        except Exception as e:
+            await self._remove_images([stored_path])
+            logger.error(f"保存发件箱通知失败: {e}")
+            return False
+
+    async def get_due(self, now: float, limit: int) -> List[Dict[str, Any]]:
+        """
+        获取到期需要重试的投递
+
+        Returns:
+            List[Dict[str, Any]]: outbox_id、username、message_text、image_path、session、attempts
+        """
+        try:
+            await self._ensure_table_once()
+
+            async with self.db.get_db() as session:
+                result = await session.execute(text(f"""
+                    SELECT d.outbox_id, o.username, o.message_text, o.image_path, d.session, d.attempts
+                    FROM {self.delivery_table_name} d
+                    JOIN {self.table_name} o ON o.id = d.outbox_id
+                    WHERE d.state = 'pending' AND d.next_attempt_at <= :now
+                    ORDER BY d.next_attempt_at
+                    LIMIT :limit
+                """), {"now": now, "limit": limit})
+                columns = ("outbox_id", "username", "message_text", "image_path", "session", "attempts")
+                return [dict(zip(columns, row)) for row in result.fetchall()]
+        except Exception as e:
+            logger.error(f"获取待重试通知失败: {e}")
+            return []
+
+    async def record_attempts(self, attempts: List[Dict[str, Any]]) -> bool:
+        """
+        在一个事务中记录一批重试结果：成功的投递删除，失败的更新状态；
+        之后清理没有待重试投递的通知的图片，所有投递都成功的通知整条删除
+
+        Args:
+            attempts: outbox_id、session、delivered，失败时还有 state、attempts、next_attempt_at、last_error
+        """
+        if not attempts:
+            return True
+        try:
+            await self._ensure_table_once()
+
+            delivered = [a for a in attempts if a["delivered"]]
+            failed = [a for a in attempts if not a["delivered"]]
+            outbox_ids = list({a["outbox_id"] for a in attempts})
+            async with self.db.get_db() as session:
+                async with session.begin():
+                    if delivered:
+                        await session.execute(text(f"""
+                            DELETE FROM {self.delivery_table_name}
+                            WHERE outbox_id = :outbox_id AND session = :session
+                        """), [{"outbox_id": a["outbox_id"], "session": a["session"]} for a in delivered])
+                    if failed:
+                        await session.execute(text(f"""
+                            UPDATE {self.delivery_table_name}
+                            SET state = :state, attempts = :attempts, next_attempt_at = :next_attempt_at,
+                                last_error = :last_error, updated_at = datetime('now')
+                            WHERE outbox_id = :outbox_id AND session = :session
+                        """), [{key: a[key] for key in ("outbox_id", "session", "state", "attempts",
+                                                         "next_attempt_at", "last_error")} for a in failed])
+
+                    # 找出不再有待重试投递的通知
+                    finished = []
+                    for outbox_id in outbox_ids:
+                        result = await session.execute(text(f"""
+                            SELECT o.image_path,
+                                   SUM(CASE WHEN d.state = 'pending' THEN 1 ELSE 0 END),
+                                   COUNT(d.session)
+                            FROM {self.table_name} o
+                            LEFT JOIN {self.delivery_table_name} d ON d.outbox_id = o.id
+                            WHERE o.id = :outbox_id
+                            GROUP BY o.id
+                        """), {"outbox_id": outbox_id})
+                        row = result.fetchone()
+                        if row and not row[1]:
+                            finished.append((outbox_id, row[0], row[2]))
+                    for outbox_id, _, remaining in finished:
+                        if remaining:
+                            # 只剩进入死信的投递，保留文本记录以便排查
+                            await session.execute(text(f"""
+                                UPDATE {self.table_name} SET image_path = NULL WHERE id = :outbox_id
+                            """), {"outbox_id": outbox_id})
+                        else:
+                            await session.execute(text(f"""
+                                DELETE FROM {self.table_name} WHERE id = :outbox_id
+                            """), {"outbox_id": outbox_id})
+
+            await self._remove_images([image_path for _, image_path, _ in finished])
+            return True
+        except Exception as e:
+            logger.error(f"记录发件箱重试结果失败: {e}")
+            return False
+
+    async def get_counts(self) -> Dict[str, int]:
+        """获取等待重试和进入死信的投递数量"""
+        try:
+            await self._ensure_table_once()
+
+            async with self.db.get_db() as session:
+                result = await session.execute(text(f"""
+                    SELECT state, COUNT(*) FROM {self.delivery_table_name} GROUP BY state
+                """))
+                counts = {"pending": 0, "dead": 0}
+                counts.update({row[0]: row[1] for row in result.fetchall()})
+                return counts
+        except Exception as e:
+            logger.error(f"获取发件箱统计失败: {e}")
+            return {"pending": 0, "dead": 0}
+
+    async def cleanup_dead(self, days: int = 30) -> bool:
+        """清理指定天数之前进入死信的投递，以及不再有任何投递的通知"""
+        try:
+            await self._ensure_table_once()
+
+            async with self.db.get_db() as session:
+                async with session.begin():
+                    result = await session.execute(text(f"""
+                        DELETE FROM {self.delivery_table_name}
+                        WHERE state = 'dead' AND updated_at < datetime('now', '-' || :days || ' days')
+                    """), {"days": days})
+                    deleted_count = result.rowcount
+                    orphans = await session.execute(text(f"""
+                        SELECT id, image_path FROM {self.table_name}
+                        WHERE id NOT IN (SELECT outbox_id FROM {self.delivery_table_name})
+                    """))
+                    orphan_rows = orphans.fetchall()
+                    await session.execute(text(f"""
+                        DELETE FROM {self.table_name}
+                        WHERE id NOT IN (SELECT outbox_id FROM {self.delivery_table_name})
+                    """))
+            await self._remove_images([image_path for _, image_path in orphan_rows])
+            logger.info(f"Yandere Github Stalker: 已清理 {deleted_count} 个{days}天前进入死信的通知投递")
+            return True
+        except Exception as e:
+            logger.error(f"清理发件箱死信失败: {e}")
+            return False
+
+    def close(self):
+        """关闭管理器，释放资源"""
+        self.db = None
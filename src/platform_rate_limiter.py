@@ -0,0 +1,89 @@
+"""
+按平台限速的消息发送器令牌桶
+"""
+import asyncio
+import time
+from typing import Dict, Any
+from astrbot.api import logger
+from .config_manager import ConfigManager
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 burst 个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        # 令牌不足时排队等待，保证先到先得
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> float:
+        """取一个令牌，不足时等待
+
+        Returns:
+            float: 等待的秒数
+        """
+        async with self._lock:
+            waited = 0.0
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= 1
+            return waited
+
+
+class PlatformRateLimiter:
+    """按会话ID的平台前缀（unified_msg_origin 的第一段，如 aiocqhttp、telegram）分别限速
+
+    不同平台的发送互不影响，同一平台的发送速率不超过配置的速率和突发量。
+    """
+
+    def __init__(self, config_manager: ConfigManager):
+        self.config_manager = config_manager
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+    @staticmethod
+    def get_platform(session: str) -> str:
+        """获取会话ID的平台前缀"""
+        return session.split(":", 1)[0]
+
+    def _get_bucket(self, platform: str, rate: float, burst: int) -> TokenBucket:
+        """获取平台的令牌桶，配置变化时重建"""
+        bucket = self.buckets.get(platform)
+        if bucket is None or bucket.rate != rate or bucket.capacity != max(1, burst):
+            bucket = TokenBucket(rate, burst)
+            self.buckets[platform] = bucket
+        return bucket
+
+    async def acquire(self, session: str) -> None:
+        """发送到会话前调用，超出平台速率时等待"""
+        rate = self.config_manager.get_platform_send_rate()
+        if rate <= 0:
+            return
+        platform = self.get_platform(session)
+        bucket = self._get_bucket(platform, rate, self.config_manager.get_platform_send_burst())
+        waited = await bucket.acquire()
+        if waited > 0:
+            self.throttled += 1
+            self.throttled_seconds += waited
+            logger.debug(f"Yandere Github Stalker: 平台 {platform} 发送限速，会话 {session} 等待了 {waited:.2f} 秒")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限速统计"""
+        return {
+            "platforms": len(self.buckets),
+            "throttled": self.throttled,
+            "throttled_seconds": self.throttled_seconds
+        }
@@ -1,34 +1,44 @@
 """
 事件ID管理器 - AstrBot v4.x 兼容版本
 """
-from typing import Set, Optional
+import asyncio
+from typing import Set, Optional, List, Tuple
 from datetime import datetime
 from astrbot.api import logger
 from astrbot.api.star import Context
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
+from .seen_event_cache import SeenEventCache
+from .metrics import metrics
 
 
 class PushedEventIdManager:
     """事件ID管理器类 - 适配 AstrBot v4.x 异步数据库"""
 
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, seen_cache_size: int = 100):
         """
         初始化事件ID管理器
 
         Args:
             context: AstrBot上下文
+            seen_cache_size: 每个用户在内存中缓存的最近检查过的事件ID数量
         """
         self.context = context
         self.db = self.context.get_db()
         self.table_name = "github_pushed_event_ids"
+        self.watermark_table_name = "github_event_watermarks"
         self._table_ensured = False
+        self._table_lock = asyncio.Lock()
+        self.seen_cache = SeenEventCache(seen_cache_size)
         logger.debug(f"Yandere Github Stalker: 初始化事件ID管理器，使用数据库存储")
 
     async def _ensure_table_once(self) -> None:
-        """确保表只被初始化一次（延迟初始化模式）"""
-        if not self._table_ensured:
-            await self._ensure_table()
-            self._table_ensured = True
+        """确保表只被初始化一次（延迟初始化模式），并发的首次调用等待同一次初始化"""
+        if self._table_ensured:
+            return
+        async with self._table_lock:
+            if not self._table_ensured:
+                await self._ensure_table()
+                self._table_ensured = True
 
     async def _ensure_table(self) -> None:
         """确保数据库中有事件ID表，并在需要时升级表结构"""
@@ -103,11 +113,36 @@ class PushedEventIdManager:
                     """)
                     await session.execute(index_sql)
 
+                    # 每个用户一行的高水位表：GitHub 事件ID单调递增，记录已标记过的最大ID
+                    check_table_sql = text("""
+                        SELECT name FROM sqlite_master 
+                        WHERE type='table' AND name=:table_name;
+                    """)
+                    result = await session.execute(check_table_sql, {"table_name": self.watermark_table_name})
+                    if result.fetchone() is None:
+                        await session.execute(text(f"""
+                            CREATE TABLE {self.watermark_table_name} (
+                                username TEXT PRIMARY KEY,
+                                last_event_id INTEGER,
+                                last_created_at TIMESTAMP
+                            );
+                        """))
+                        # 从已有的事件记录回填高水位
+                        await session.execute(text(f"""
+                            INSERT OR IGNORE INTO {self.watermark_table_name} (username, last_event_id, last_created_at)
+                            SELECT username, MAX(CAST(event_id AS INTEGER)), MAX(pushed_at)
+                            FROM {self.table_name}
+                            WHERE event_id GLOB '[0-9]*'
+                            GROUP BY username;
+                        """))
+                        logger.info("Yandere Github Stalker: 高水位表创建成功")
+
                     logger.info("Yandere Github Stalker: 事件ID表和索引检查/更新完成")
         except Exception as e:
             logger.error(f"创建或升级事件ID表失败: {e}")
             raise
 
+    @metrics.timed("db_query_seconds", operation="add")
     async def add_pushed_event_id(self, event_id: str, username: str, pushed_at: str = None) -> bool:
         """添加事件ID
         Args:
@@ -122,20 +157,13 @@ class PushedEventIdManager:
             
             async with self.db.get_db() as session:
                 async with session.begin():
-                    if pushed_at is None:
-                        insert_sql = text(f"""
-                            INSERT OR IGNORE INTO {self.table_name} (event_id, username, pushed_at)
-                            VALUES (:event_id, :username, datetime('now'))
-                        """)
-                        params = {"event_id": event_id, "username": username}
-                    else:
-                        # 格式转换：2024-01-01T12:00:00Z -> 2024-01-01 12:00:00
-                        pushed_at_sqlite = pushed_at.replace("T", " ").replace("Z", "")
-                        insert_sql = text(f"""
-                            INSERT OR IGNORE INTO {self.table_name} (event_id, username, pushed_at)
-                            VALUES (:event_id, :username, :pushed_at)
-                        """)
-                        params = {"event_id": event_id, "username": username, "pushed_at": pushed_at_sqlite}
+                    # 格式转换：2024-01-01T12:00:00Z -> 2024-01-01 12:00:00
+                    insert_sql = text(f"""
+                        INSERT OR IGNORE INTO {self.table_name} (event_id, username, pushed_at)
+                        VALUES (:event_id, :username, :pushed_at)
+                    """)
+                    params = {"event_id": event_id, "username": username,
+                              "pushed_at": self._to_sqlite_time(pushed_at)}
 
                     result = await session.execute(insert_sql, params)
                     success = result.rowcount > 0
@@ -145,12 +173,81 @@ class PushedEventIdManager:
                     else:
                         logger.debug(
                             f"Yandere Github Stalker: 事件ID {event_id} (用户: {username}) 已存在，跳过添加")
+                    await self._update_watermark(session, username, [params])
 
+            # 写穿缓存
+            self.remember_event_id(event_id, username)
             return True
         except Exception as e:
             logger.error(f"添加事件ID失败: {e}")
             return False
 
+    @staticmethod
+    def _to_sqlite_time(pushed_at: Optional[str]) -> str:
+        """将事件时间转换为SQLite时间格式：2024-01-01T12:00:00Z -> 2024-01-01 12:00:00，None 则用当前UTC时间"""
+        if pushed_at is None:
+            return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        return pushed_at.replace("T", " ").replace("Z", "")
+
+    def remember_event_id(self, event_id: str, username: str) -> None:
+        """只更新内存缓存，把尚未写入数据库的事件视为已推送，避免在批量写入前重复推送"""
+        self.seen_cache.add(username, event_id)
+
+    async def _update_watermark(self, session, username: str, params: List[dict]) -> None:
+        """在当前事务中推进用户的高水位"""
+        numeric = [p for p in params if p["event_id"].isdigit()]
+        if not numeric:
+            return
+        newest = max(numeric, key=lambda p: int(p["event_id"]))
+        upsert_sql = text(f"""
+            INSERT INTO {self.watermark_table_name} (username, last_event_id, last_created_at)
+            VALUES (:username, :last_event_id, :last_created_at)
+            ON CONFLICT(username) DO UPDATE SET
+                last_event_id = MAX(COALESCE(last_event_id, 0), excluded.last_event_id),
+                last_created_at = MAX(COALESCE(last_created_at, ''), excluded.last_created_at)
+        """)
+        await session.execute(upsert_sql, {
+            "username": username,
+            "last_event_id": int(newest["event_id"]),
+            "last_created_at": max(p["pushed_at"] for p in numeric)
+        })
+
+    @metrics.timed("db_query_seconds", operation="add_batch")
+    async def add_pushed_event_ids(self, username: str, events: List[Tuple[str, Optional[str]]]) -> bool:
+        """在一个事务中批量添加事件ID
+        Args:
+            username: GitHub用户名
+            events: (事件ID, 事件发生时间) 列表，时间为 None 则用当前时间
+        Returns:
+            bool: 是否成功添加
+        """
+        if not events:
+            return True
+        try:
+            await self._ensure_table_once()
+
+            params = [
+                {"event_id": event_id, "username": username, "pushed_at": self._to_sqlite_time(pushed_at)}
+                for event_id, pushed_at in events
+            ]
+            async with self.db.get_db() as session:
+                async with session.begin():
+                    insert_sql = text(f"""
+                        INSERT OR IGNORE INTO {self.table_name} (event_id, username, pushed_at)
+                        VALUES (:event_id, :username, :pushed_at)
+                    """)
+                    await session.execute(insert_sql, params)
+                    await self._update_watermark(session, username, params)
+
+            for event_id, _ in events:
+                self.remember_event_id(event_id, username)
+            logger.debug(f"Yandere Github Stalker: 已批量写入用户 {username} 的 {len(events)} 个事件ID")
+            return True
+        except Exception as e:
+            logger.error(f"批量添加事件ID失败: {e}")
+            return False
+
+    @metrics.timed("db_query_seconds", operation="is_pushed")
     async def is_event_pushed(self, event_id: str, username: str) -> bool:
         """检查事件ID是否存在
         
@@ -174,6 +271,114 @@ class PushedEventIdManager:
             logger.error(f"检查事件ID是否存在失败: {e}")
             return False
 
+    async def get_dedup_snapshot(self, event_ids: List[str], username: str) -> Tuple[Set[str], Optional[int]]:
+        """获取去重所需的全部信息，优先使用内存缓存，只为缓存未命中且高于水位的事件ID查询数据库
+
+        Args:
+            event_ids: 待检查的事件ID列表
+            username: GitHub用户名
+        Returns:
+            Tuple[Set[str], Optional[int]]: (其中已推送过的事件ID集合, 该用户的高水位事件ID)
+        """
+        if not self.seen_cache.is_warm(username):
+            # 冷启动：一次查询同时取回已推送ID和高水位，并用结果预热缓存
+            pushed_ids, watermark = await self._query_dedup_snapshot(event_ids, username, with_watermark=True)
+            self.seen_cache.warm(username, event_ids, pushed_ids, watermark)
+            return pushed_ids, watermark
+
+        watermark = self.seen_cache.get_watermark(username)
+        pushed_ids, unknown_ids = self.seen_cache.lookup(username, event_ids)
+        # 水位以下的事件无论是否推送过都会被跳过，不需要查询
+        unknown_ids = [
+            event_id for event_id in unknown_ids
+            if watermark is None or not event_id.isdigit() or int(event_id) > watermark
+        ]
+        if unknown_ids:
+            found_ids, _ = await self._query_dedup_snapshot(unknown_ids, username, with_watermark=False)
+            self.seen_cache.record(username, unknown_ids, found_ids)
+            pushed_ids |= found_ids
+        return pushed_ids, watermark
+
+    async def get_dedup_watermark(self, username: str) -> Optional[int]:
+        """获取用户的高水位事件ID，优先使用缓存；未缓存时查询一次数据库并预热缓存
+
+        查询失败时抛出异常且不预热缓存，下次仍查询数据库，而不是在没有高水位的情况下去重。
+        """
+        if not self.seen_cache.is_warm(username):
+            watermark, _ = await self.get_watermark(username)
+            self.seen_cache.warm(username, [], set(), watermark)
+        return self.seen_cache.get_watermark(username)
+
+    @metrics.timed("db_query_seconds", operation="dedup_snapshot")
+    async def _query_dedup_snapshot(self, event_ids: List[str], username: str,
+                                    with_watermark: bool) -> Tuple[Set[str], Optional[int]]:
+        """一次数据库往返查询已推送的事件ID，可同时取回高水位事件ID"""
+        try:
+            await self._ensure_table_once()
+
+            async with self.db.get_db() as session:
+                query = f"""
+                    SELECT event_id, NULL AS last_event_id
+                    FROM {self.table_name}
+                    WHERE username = :username AND event_id IN :event_ids
+                """
+                if with_watermark:
+                    query += f"""
+                    UNION ALL
+                    SELECT NULL, last_event_id
+                    FROM {self.watermark_table_name}
+                    WHERE username = :username
+                """
+                query_sql = text(query).bindparams(bindparam("event_ids", expanding=True))
+                result = await session.execute(
+                    query_sql, {"username": username, "event_ids": list(event_ids)})
+
+                pushed_ids = set()
+                watermark = None
+                for event_id, last_event_id in result.fetchall():
+                    if event_id is not None:
+                        pushed_ids.add(event_id)
+                    elif last_event_id is not None:
+                        watermark = int(last_event_id)
+
+                logger.debug(
+                    f"Yandere Github Stalker: 用户 {username} 的 {len(event_ids)} 个事件中已推送 {len(pushed_ids)} 个，"
+                    f"高水位事件ID：{watermark}")
+                return pushed_ids, watermark
+        except Exception as e:
+            logger.error(f"批量检查事件ID失败: {e}")
+            raise
+
+    @metrics.timed("db_query_seconds", operation="get_watermark")
+    async def get_watermark(self, username: str) -> Tuple[Optional[int], Optional[str]]:
+        """获取用户的高水位
+
+        Args:
+            username: GitHub用户名
+        Returns:
+            Tuple[Optional[int], Optional[str]]: (最新事件ID, 最新事件时间)，没有记录时均为 None
+        Raises:
+            Exception: 查询失败
+        """
+        try:
+            await self._ensure_table_once()
+
+            async with self.db.get_db() as session:
+                query_sql = text(f"""
+                    SELECT last_event_id, last_created_at
+                    FROM {self.watermark_table_name}
+                    WHERE username = :username
+                """)
+                result = await session.execute(query_sql, {"username": username})
+                row = result.fetchone()
+                if row:
+                    return row[0], row[1]
+                return None, None
+        except Exception as e:
+            logger.error(f"获取高水位失败: {e}")
+            raise
+
+    @metrics.timed("db_query_seconds", operation="count")
     async def get_pushed_event_count(self, username: str = None) -> int:
         """获取已推送事件的数量
         
@@ -233,6 +438,7 @@ class PushedEventIdManager:
             logger.error(f"获取最后推送时间失败: {e}")
             return None
 
+    @metrics.timed("db_query_seconds", operation="cleanup")
     async def cleanup_old_events(self, days: int = 30) -> bool:
         """清理指定天数之前的旧事件ID，并回收所有未来时间的事件ID"""
         try:
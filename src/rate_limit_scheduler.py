@@ -0,0 +1,113 @@
+"""
+速率限制感知的调度器
+"""
+import time
+from typing import Optional, Dict, Any
+from astrbot.api import logger
+from .config_manager import ConfigManager
+
+
+class RateLimitScheduler:
+    """根据 GitHub 返回的 X-RateLimit-* / Retry-After / X-Poll-Interval 响应头计算轮询周期"""
+
+    # 为手动命令（如 /yandere add）预留的请求配额
+    RESERVED_REQUESTS = 10
+    # 没有 Retry-After 的二级速率限制的初始退避时间与上限（秒）
+    BACKOFF_BASE = 60
+    BACKOFF_MAX = 900
+
+    def __init__(self, config_manager: ConfigManager):
+        self.config_manager = config_manager
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.poll_interval = 0
+        self.blocked_until = 0.0
+        self._consecutive_limited = 0
+
+    @staticmethod
+    def _parse_int(value: Optional[str]) -> Optional[int]:
+        try:
+            return int(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def update_from_response(self, status: int, headers) -> None:
+        """根据一次响应更新配额状态
+
+        Args:
+            status: HTTP 状态码
+            headers: 响应头
+        """
+        now = time.time()
+        limit = self._parse_int(headers.get('X-RateLimit-Limit'))
+        remaining = self._parse_int(headers.get('X-RateLimit-Remaining'))
+        reset_at = self._parse_int(headers.get('X-RateLimit-Reset'))
+        poll_interval = self._parse_int(headers.get('X-Poll-Interval'))
+        retry_after = self._parse_int(headers.get('Retry-After'))
+
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.remaining = remaining
+        if reset_at is not None:
+            self.reset_at = float(reset_at)
+        if poll_interval is not None:
+            self.poll_interval = poll_interval
+
+        if status in (403, 429) and (status == 429 or retry_after is not None or remaining == 0):
+            if retry_after is not None:
+                wait = retry_after
+            elif remaining == 0 and self.reset_at:
+                wait = max(self.reset_at - now, 0) + 1
+            else:
+                wait = min(self.BACKOFF_BASE * (2 ** self._consecutive_limited), self.BACKOFF_MAX)
+            self._consecutive_limited += 1
+            self.blocked_until = max(self.blocked_until, now + wait)
+            logger.warning(
+                f"Yandere Github Stalker: 触发GitHub API速率限制（状态码 {status}），暂停请求 {int(wait)} 秒")
+        elif 200 <= status < 400:
+            self._consecutive_limited = 0
+
+    def get_block_remaining(self) -> float:
+        """获取距离解除速率限制的剩余秒数，未被限制时为0"""
+        return max(self.blocked_until - time.time(), 0.0)
+
+    def is_blocked(self) -> bool:
+        """当前是否处于速率限制退避期"""
+        return self.get_block_remaining() > 0
+
+    def get_cycle_interval(self, requests_per_cycle: int) -> float:
+        """计算下一轮检查前需要等待的时间
+
+        把重置前剩余的配额平均分配给每一轮检查；配额充足时使用配置的检查间隔，
+        同时不低于 GitHub 要求的 X-Poll-Interval。
+
+        Args:
+            requests_per_cycle: 每轮检查预计发出的请求数（通常为监控用户数）
+        Returns:
+            float: 等待秒数
+        """
+        interval = float(max(self.config_manager.get_check_interval(), self.poll_interval))
+
+        if self.remaining is not None and self.reset_at is not None:
+            time_to_reset = max(self.reset_at - time.time(), 0.0)
+            usable = self.remaining - self.RESERVED_REQUESTS
+            if usable <= 0:
+                interval = max(interval, time_to_reset)
+            else:
+                cycles = usable / max(requests_per_cycle, 1)
+                interval = max(interval, time_to_reset / cycles)
+
+        return max(interval, self.get_block_remaining())
+
+    def get_status(self, requests_per_cycle: int) -> Dict[str, Any]:
+        """获取当前配额状态，用于 /yandere status 展示"""
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_at": self.reset_at,
+            "poll_interval": self.poll_interval,
+            "blocked_for": self.get_block_remaining(),
+            "cycle_interval": self.get_cycle_interval(requests_per_cycle)
+        }
@@ -0,0 +1,59 @@
+"""
+收到的动态（received_events）分发器
+"""
+from typing import Dict, List, Optional
+from astrbot.api import logger
+from .config_manager import ConfigManager
+from .github_api import GitHubAPI
+from .github_event_data import GitHubEventData
+
+
+class ReceivedFeedRouter:
+    """用一次请求获取 Token 所属账号关注的所有用户的动态，再分发给对应的监控用户"""
+
+    def __init__(self, github_api: GitHubAPI, config_manager: ConfigManager):
+        self.github_api = github_api
+        self.config_manager = config_manager
+
+    async def get_covered_users(self, monitored_users: List[str]) -> List[str]:
+        """获取可以由收到的动态覆盖的监控用户（即 Token 所属账号关注的用户）
+
+        Args:
+            monitored_users: 监控用户列表
+        Returns:
+            List[str]: 被覆盖的用户，未启用或无法获取关注列表时为空列表
+        """
+        if not self.config_manager.is_received_events_feed_enabled():
+            return []
+        login = await self.github_api.get_authenticated_login()
+        if not login:
+            return []
+        following = await self.github_api.get_following()
+        if not following:
+            return []
+        return [username for username in monitored_users if username.lower() in following]
+
+    async def fetch_routed_events(self, covered_users: List[str]) -> Optional[Dict[str, List[GitHubEventData]]]:
+        """获取收到的动态并按监控用户分组
+
+        Args:
+            covered_users: 被覆盖的监控用户
+        Returns:
+            Optional[Dict[str, List[GitHubEventData]]]: 用户名到其动态（按时间倒序）的映射，获取失败时为None
+        """
+        login = await self.github_api.get_authenticated_login()
+        if not login:
+            return None
+        events = await self.github_api.get_received_events(login)
+        if events is None:
+            return None
+
+        usernames = {username.lower(): username for username in covered_users}
+        routed: Dict[str, List[GitHubEventData]] = {}
+        for event in events:
+            username = usernames.get(event.actor.get("login", "").lower())
+            if username:
+                routed.setdefault(username, []).append(event)
+        logger.debug(
+            f"Yandere Github Stalker: 收到的 {len(events)} 条动态分发给了 {len(routed)} 个监控用户")
+        return routed
@@ -0,0 +1,192 @@
+"""
+按内容寻址的通知图片缓存
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from astrbot.api import logger
+
+
+class RenderCache:
+    """以渲染后HTML的哈希为键，把渲染好的图片保存在磁盘上
+
+    相同的HTML（同一事件、同一模板版本）只渲染一次：命中时直接复用文件，
+    同时进行的相同渲染会等待第一个完成。缓存按总大小和存活时间做LRU淘汰，
+    等待发送的图片会被固定，不会在发送前被淘汰。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, max_age_seconds: float):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        # 键 -> (文件路径, 文件大小, 写入时间)，按最近使用排序
+        self._entries: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._pinned: Dict[str, int] = {}
+        self._rendering: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_entries()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def get_key(html_content: str) -> str:
+        """计算HTML内容的缓存键"""
+        return hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+
+    def _load_entries(self) -> None:
+        """启动时从缓存目录恢复索引，按修改时间排序作为LRU顺序"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            key = os.path.splitext(name)[0]
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isfile(path) and len(key) == 64:
+                files.append((stat.st_mtime, key, path, stat.st_size))
+        for mtime, key, path, size in sorted(files):
+            self._entries[key] = (path, size, mtime)
+            self._total_bytes += size
+        self._evict()
+        logger.debug(f"Yandere Github Stalker: 渲染缓存已加载 {len(self._entries)} 个文件")
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.max_age_seconds > 0 and now - created_at > self.max_age_seconds
+
+    def _remove(self, key: str) -> None:
+        path, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Yandere Github Stalker: 删除缓存图片失败: {e}")
+
+    def _evict(self) -> None:
+        """淘汰过期文件，再按LRU淘汰直到总大小不超过上限；固定中的文件跳过"""
+        now = time.time()
+        for key, (_, _, created_at) in list(self._entries.items()):
+            if key not in self._pinned and self._is_expired(created_at, now):
+                self._remove(key)
+                self.evictions += 1
+        for key in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if key not in self._pinned:
+                self._remove(key)
+                self.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """查找缓存的图片，命中时更新LRU顺序
+
+        固定中的文件即使已过期也直接返回：它正在被发送，重新渲染会覆盖同一个文件；
+        过期淘汰在取消固定后进行。
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        path, _, created_at = entry
+        if not os.path.exists(path):
+            self._entries.pop(key)
+            self._total_bytes -= entry[1]
+            return None
+        if key not in self._pinned and self._is_expired(created_at, time.time()):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return path
+
+    def put(self, key: str, image_path: str) -> str:
+        """把渲染好的图片移入缓存目录
+
+        Returns:
+            str: 缓存中的图片路径
+        """
+        ext = os.path.splitext(image_path)[1]
+        cached_path = os.path.join(self.cache_dir, key + ext)
+        shutil.move(image_path, cached_path)
+        if key in self._entries:
+            self._total_bytes -= self._entries.pop(key)[1]
+        size = os.path.getsize(cached_path)
+        self._entries[key] = (cached_path, size, time.time())
+        self._total_bytes += size
+        self._evict()
+        return cached_path
+
+    def pin(self, key: str) -> None:
+        """固定文件，发送完成前不会被淘汰"""
+        self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin(self, key: str) -> None:
+        """取消固定"""
+        count = self._pinned.get(key, 0) - 1
+        if count > 0:
+            self._pinned[key] = count
+        else:
+            self._pinned.pop(key, None)
+            self._evict()
+
+    async def get_or_render(self, html_content: str,
+                            render: Callable[[], Awaitable[Optional[str]]]) -> Tuple[Optional[str], Optional[str]]:
+        """返回HTML对应的图片，未命中时调用 render 渲染并缓存；返回的文件已被固定
+
+        Args:
+            render: 渲染函数，返回临时图片路径，失败时返回None
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (缓存键, 图片路径)，渲染失败时均为None
+        """
+        key = self.get_key(html_content)
+        path = self.get(key)
+        if path is None and key in self._rendering:
+            # 相同的HTML正在渲染，等待结果
+            path = await asyncio.shield(self._rendering[key])
+            if path is not None:
+                self.hits += 1
+                self.pin(key)
+                return key, path
+        elif path is not None:
+            self.hits += 1
+            self.pin(key)
+            return key, path
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._rendering[key] = future
+        # 先固定，避免刚放入的文件在超出大小上限时被立即淘汰
+        self.pin(key)
+        path = None
+        try:
+            image_path = await render()
+            if image_path:
+                path = self.put(key, image_path)
+        finally:
+            future.set_result(path)
+            self._rendering.pop(key, None)
+            if path is None:
+                self.unpin(key)
+        if path is None:
+            return None, None
+        return key, path
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,90 @@
+"""
+已检查事件ID的内存缓存
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple, Any
+
+
+class SeenEventCache:
+    """按用户划分的有界 LRU 缓存
+
+    记录最近检查过的 (username, event_id) 是否已推送，以及每个用户的高水位事件ID。
+    插件是事件表唯一的写入者，写入时同步更新缓存，因此命中的结果（包括"未推送"）在被淘汰前一直有效。
+    """
+
+    def __init__(self, capacity_per_user: int = 100):
+        self.capacity_per_user = max(1, capacity_per_user)
+        self._entries: Dict[str, "OrderedDict[str, bool]"] = {}
+        self._watermarks: Dict[str, Optional[int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def is_warm(self, username: str) -> bool:
+        """该用户是否已从数据库加载过"""
+        return username in self._entries
+
+    def warm(self, username: str, checked_ids: List[str], pushed_ids: Set[str],
+             watermark: Optional[int]) -> None:
+        """用一次数据库查询的结果初始化用户的缓存"""
+        self._entries[username] = OrderedDict()
+        self._watermarks[username] = watermark
+        for event_id in checked_ids:
+            self._put(username, event_id, event_id in pushed_ids)
+
+    def lookup(self, username: str, event_ids: List[str]) -> Tuple[Set[str], List[str]]:
+        """查询缓存
+
+        Returns:
+            Tuple[Set[str], List[str]]: (命中且已推送的事件ID, 未命中需要查数据库的事件ID)
+        """
+        entries = self._entries.get(username)
+        pushed, unknown = set(), []
+        for event_id in event_ids:
+            if entries is not None and event_id in entries:
+                self.hits += 1
+                entries.move_to_end(event_id)
+                if entries[event_id]:
+                    pushed.add(event_id)
+            else:
+                self.misses += 1
+                unknown.append(event_id)
+        return pushed, unknown
+
+    def record(self, username: str, checked_ids: List[str], pushed_ids: Set[str]) -> None:
+        """记录一批从数据库查到的检查结果"""
+        if username not in self._entries:
+            return
+        for event_id in checked_ids:
+            self._put(username, event_id, event_id in pushed_ids)
+
+    def add(self, username: str, event_id: str) -> None:
+        """写穿：事件被标记为已推送"""
+        if username not in self._entries:
+            return
+        self._put(username, event_id, True)
+        if event_id.isdigit():
+            watermark = self._watermarks.get(username)
+            if watermark is None or int(event_id) > watermark:
+                self._watermarks[username] = int(event_id)
+
+    def get_watermark(self, username: str) -> Optional[int]:
+        """获取缓存的高水位事件ID"""
+        return self._watermarks.get(username)
+
+    def _put(self, username: str, event_id: str, pushed: bool) -> None:
+        entries = self._entries[username]
+        entries[event_id] = pushed
+        entries.move_to_end(event_id)
+        while len(entries) > self.capacity_per_user:
+            entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "users": len(self._entries),
+            "entries": sum(len(entries) for entries in self._entries.values())
+        }
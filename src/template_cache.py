@@ -0,0 +1,68 @@
+"""
+配置schema与通知模板缓存
+"""
+import json
+from typing import Optional
+from astrbot.api import logger
+from .conf_schema import get_schema_mtime, load_conf_schema
+from .config_manager import ConfigManager
+from .yandere_templates import YandereTemplates
+
+
+class TemplateCache:
+    """通知模板缓存
+
+    schema 和生效的模板（默认模板合并用户配置）只在加载时构建一次，通知时只读内存。
+    refresh() 检查 schema 文件修改时间和模板相关配置的指纹，有变化才重建并递增 version，
+    由监控循环每轮调用一次。
+    """
+
+    def __init__(self, config_manager: ConfigManager):
+        self.config_manager = config_manager
+        self.version = 0
+        self._schema_mtime: Optional[float] = None
+        self._fingerprint: Optional[str] = None
+        self.notification_template = ""
+        self.remaining_template = ""
+        self.yandere_templates: Optional[YandereTemplates] = None
+        self._build(get_schema_mtime(), self._get_fingerprint())
+
+    def _get_fingerprint(self) -> str:
+        """模板相关配置的指纹"""
+        return json.dumps({
+            "notification_template": self.config_manager.get_notification_template(),
+            "remaining_template": self.config_manager.get_notification_remaining_template(),
+            "custom_templates": self.config_manager.get_custom_templates()
+        }, sort_keys=True, ensure_ascii=False, default=str)
+
+    def _build(self, schema_mtime: Optional[float], fingerprint: str) -> None:
+        """重建模板，失败时抛出异常，保留旧模板"""
+        schema = load_conf_schema()
+        yandere_templates = YandereTemplates(self.config_manager.get_custom_templates(), schema)
+        self.yandere_templates = yandere_templates
+        self.notification_template = self.config_manager.get_notification_template()
+        self.remaining_template = self.config_manager.get_notification_remaining_template()
+        self._schema_mtime = schema_mtime
+        self._fingerprint = fingerprint
+        self.version += 1
+
+    def refresh(self) -> bool:
+        """配置或schema文件有变化时重建模板
+
+        Returns:
+            bool: 是否重建了模板
+        """
+        schema_mtime = get_schema_mtime()
+        fingerprint = self._get_fingerprint()
+        if schema_mtime == self._schema_mtime and fingerprint == self._fingerprint:
+            return False
+        try:
+            self._build(schema_mtime, fingerprint)
+        except Exception as e:
+            # 记录本次的指纹，同样的错误配置不在每轮重复报错
+            self._schema_mtime = schema_mtime
+            self._fingerprint = fingerprint
+            logger.error(f"Yandere Github Stalker: 重新加载通知模板失败，继续使用旧模板：{e}")
+            return False
+        logger.info(f"Yandere Github Stalker: 通知模板已重新加载（版本 {self.version}）")
+        return True
@@ -0,0 +1,104 @@
+"""
+按用户活跃度自适应的轮询调度器
+"""
+import heapq
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from astrbot.api import logger
+from .config_manager import ConfigManager
+
+
+class UserPollScheduler:
+    """为每个用户维护一个到期时间的优先队列
+
+    最近有动态的用户按基础间隔轮询；最新动态越久远，轮询间隔按指数增长，直到上限。
+    """
+
+    # 最新动态在这个时间窗口（秒）内的用户视为活跃用户
+    ACTIVE_WINDOW = 3600
+
+    def __init__(self, config_manager: ConfigManager):
+        self.config_manager = config_manager
+        self._heap: List[Tuple[float, str]] = []
+        self._due_at: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+        self._idle_polls: Dict[str, int] = {}
+
+    def sync_users(self, usernames: List[str]) -> None:
+        """与配置中的监控列表同步：新用户立即到期，已移除的用户不再调度"""
+        current = set(usernames)
+        for username in usernames:
+            if username not in self._due_at:
+                self._schedule(username, time.monotonic())
+        for username in list(self._due_at):
+            if username not in current:
+                del self._due_at[username]
+                self._intervals.pop(username, None)
+                self._idle_polls.pop(username, None)
+
+    def _schedule(self, username: str, due_at: float) -> None:
+        self._due_at[username] = due_at
+        heapq.heappush(self._heap, (due_at, username))
+
+    def pop_due(self) -> List[str]:
+        """取出所有已到期的用户"""
+        now = time.monotonic()
+        due_users = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, username = heapq.heappop(self._heap)
+            # 跳过已被重新调度或移除的过期条目
+            if self._due_at.get(username) != due_at:
+                continue
+            del self._due_at[username]
+            due_users.append(username)
+        return due_users
+
+    def get_next_due_in(self) -> Optional[float]:
+        """距离下一个用户到期的秒数，没有待调度用户时返回None"""
+        while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - time.monotonic(), 0.0)
+
+    def reschedule(self, username: str, base_interval: float, had_new_events: Optional[bool],
+                   latest_event_time: Optional[datetime]) -> float:
+        """根据本次轮询结果重新调度用户
+
+        Args:
+            username: GitHub用户名
+            base_interval: 活跃用户使用的基础间隔（秒）
+            had_new_events: 本次是否发现了新事件；None 表示本次没有请求（如触发速率限制），
+                不改变连续无新事件的次数
+            latest_event_time: 该用户已知的最新事件时间（UTC）
+        Returns:
+            float: 新的轮询间隔（秒）
+        """
+        if had_new_events:
+            self._idle_polls[username] = 0
+        elif had_new_events is not None:
+            self._idle_polls[username] = self._idle_polls.get(username, 0) + 1
+
+        if latest_event_time is not None:
+            # 最新动态每久远一倍的活跃窗口，间隔翻一倍
+            age = (datetime.now(timezone.utc) - latest_event_time.replace(tzinfo=timezone.utc)).total_seconds()
+            exponent = int(math.log2(age / self.ACTIVE_WINDOW)) + 1 if age > self.ACTIVE_WINDOW else 0
+        else:
+            # 没有时间信息（例如重启后一直是 304）时，按连续无新事件的次数退避
+            exponent = self._idle_polls.get(username, 0)
+
+        max_interval = max(self.config_manager.get_max_user_poll_interval(), base_interval)
+        interval = min(base_interval * (2 ** min(exponent, 32)), max_interval)
+        self._intervals[username] = interval
+        self._schedule(username, time.monotonic() + interval)
+        logger.debug(
+            f"Yandere Github Stalker: 用户 {username} 的下次检查间隔为 {interval:.0f} 秒")
+        return interval
+
+    def get_user_schedule(self, username: str) -> Optional[Tuple[float, float]]:
+        """获取用户当前的 (轮询间隔, 距下次检查秒数)，用于状态展示"""
+        if username not in self._due_at or username not in self._intervals:
+            return None
+        return self._intervals[username], max(self._due_at[username] - time.monotonic(), 0.0)
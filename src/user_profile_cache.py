@@ -0,0 +1,224 @@
+"""
+用户资料和头像的本地缓存
+"""
+import asyncio
+import base64
+import io
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from astrbot.api import logger
+from .github_api import GitHubAPI
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 是可选依赖，未安装时直接保存GitHub缩放后的头像
+    Image = None
+
+
+class UserProfileCache:
+    """缓存通知卡片上展示的用户资料（头像、显示名称、关注者数）
+
+    资料在 ttl 内直接使用，过期后用ETag条件请求重新验证（未变化时返回304，不消耗配额），
+    因此每个用户大约每个 ttl 只发送一次请求。头像缩放到卡片尺寸后保存在本地，
+    其 data URI 保存在内存中，渲染时直接嵌入，不读写磁盘，也不会请求任何外部图片。
+    文件读写和头像缩放都在线程中进行，不阻塞事件循环。
+    """
+
+    # 与 notification.html 中 .avatar 的尺寸一致
+    AVATAR_SIZE = 240
+    # 请求失败后的重试间隔（秒），避免每轮都重新请求
+    FAILURE_RETRY_SECONDS = 3600
+    AVATAR_MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".gif": "image/gif",
+                         ".webp": "image/webp"}
+
+    def __init__(self, github_api: GitHubAPI, cache_dir: str, ttl_seconds: float):
+        self.github_api = github_api
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.index_path = os.path.join(cache_dir, "profiles.json")
+        # 小写用户名 -> 资料记录
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        # 小写用户名 -> 头像 data URI
+        self._avatar_uris: Dict[str, str] = {}
+        self._save_lock = asyncio.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.avatar_downloads = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """启动时从磁盘恢复资料索引"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._profiles = json.load(f)
+            logger.debug(f"Yandere Github Stalker: 已加载 {len(self._profiles)} 个用户资料缓存")
+        except Exception as e:
+            logger.warning(f"Yandere Github Stalker: 读取用户资料缓存失败，将重新获取: {e}")
+            self._profiles = {}
+
+    def _write_index(self, profiles: Dict[str, Dict[str, Any]]) -> None:
+        """先写临时文件再替换，避免中途退出时损坏索引"""
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(profiles, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+
+    async def _save_index(self) -> None:
+        """在线程中保存索引的快照，同一时间只有一次写入"""
+        profiles = {key: dict(profile) for key, profile in self._profiles.items()}
+        try:
+            async with self._save_lock:
+                await asyncio.to_thread(self._write_index, profiles)
+        except Exception as e:
+            logger.warning(f"Yandere Github Stalker: 保存用户资料缓存失败: {e}")
+
+    def is_fresh(self, username: str) -> bool:
+        """缓存的资料是否仍在有效期内"""
+        profile = self._profiles.get(username.lower())
+        return profile is not None and time.time() < profile.get("expires_at", 0)
+
+    async def refresh(self, username: str) -> None:
+        """资料过期时重新验证，头像变化时重新下载；在获取阶段调用，不在渲染时调用"""
+        key = username.lower()
+        cached = self._profiles.get(key)
+        if cached and key not in self._avatar_uris:
+            await self._load_avatar_uri(key, cached)
+        if self.is_fresh(username):
+            return
+        # 本地头像丢失时发送普通请求，重新取得头像地址
+        etag = cached.get("etag") if cached and key in self._avatar_uris else None
+
+        self.requests += 1
+        status, data, new_etag = await self.github_api.get_user_profile(username, etag)
+        now = time.time()
+        if status == 304 and cached:
+            self.not_modified += 1
+            cached["expires_at"] = now + self.ttl_seconds
+            logger.debug(f"Yandere Github Stalker: 用户 {username} 的资料没有变化（304）")
+        elif status == 200 and data:
+            profile = {
+                "login": data.get("login") or username,
+                "name": data.get("name") or data.get("login") or username,
+                "followers": data.get("followers", 0),
+                "avatar_url": data.get("avatar_url", ""),
+                "avatar_file": cached.get("avatar_file", "") if cached else "",
+                "etag": new_etag,
+                "expires_at": now + self.ttl_seconds
+            }
+            if not cached or cached.get("avatar_url") != profile["avatar_url"] or key not in self._avatar_uris:
+                profile["avatar_file"] = await self._download_avatar(key, profile["avatar_url"])
+            self._profiles[key] = profile
+            logger.debug(f"Yandere Github Stalker: 已更新用户 {username} 的资料")
+        elif cached:
+            # 请求失败时继续使用旧资料，稍后重试
+            cached["expires_at"] = now + min(self.ttl_seconds, self.FAILURE_RETRY_SECONDS)
+        else:
+            return
+        await self._save_index()
+
+    @staticmethod
+    def _detect_extension(data: bytes) -> str:
+        """按文件头判断图片格式，返回扩展名"""
+        if data.startswith(b"\xff\xd8\xff"):
+            return ".jpg"
+        if data.startswith(b"GIF8"):
+            return ".gif"
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return ".webp"
+        return ".png"
+
+    def _process_avatar(self, data: bytes) -> Tuple[bytes, str]:
+        """把头像缩放到卡片尺寸并转为JPEG，返回 (图片数据, 扩展名)；无法处理时保留原图"""
+        if Image is not None:
+            try:
+                with Image.open(io.BytesIO(data)) as avatar:
+                    avatar = avatar.convert("RGB")
+                    if avatar.size != (self.AVATAR_SIZE, self.AVATAR_SIZE):
+                        avatar = avatar.resize((self.AVATAR_SIZE, self.AVATAR_SIZE), Image.LANCZOS)
+                    output = io.BytesIO()
+                    avatar.save(output, "JPEG", quality=90)
+                    return output.getvalue(), ".jpg"
+            except Exception as e:
+                logger.warning(f"Yandere Github Stalker: 缩放头像失败，保存原图: {e}")
+        # 未安装 Pillow 或处理失败时直接保存GitHub按 s 参数缩放后的图片
+        return data, self._detect_extension(data)
+
+    def _make_avatar_uri(self, filename: str, data: bytes) -> str:
+        mime_type = self.AVATAR_MIME_TYPES.get(os.path.splitext(filename)[1].lower(), "image/png")
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    @staticmethod
+    def _write_file(path: str, data: bytes) -> None:
+        with open(path, "wb") as f:
+            f.write(data)
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def _download_avatar(self, key: str, avatar_url: str) -> str:
+        """下载头像并缩放到卡片尺寸，返回缓存目录中的文件名，失败时为空字符串"""
+        self._avatar_uris.pop(key, None)
+        if not avatar_url:
+            return ""
+        data = await self.github_api.download_avatar(avatar_url, self.AVATAR_SIZE)
+        if not data:
+            return ""
+        self.avatar_downloads += 1
+        data, ext = await asyncio.to_thread(self._process_avatar, data)
+        filename = key + ext
+        try:
+            await asyncio.to_thread(self._write_file, os.path.join(self.cache_dir, filename), data)
+        except OSError as e:
+            logger.warning(f"Yandere Github Stalker: 保存头像失败: {e}")
+            return ""
+        self._avatar_uris[key] = self._make_avatar_uri(filename, data)
+        return filename
+
+    async def _load_avatar_uri(self, key: str, profile: Dict[str, Any]) -> None:
+        """从本地文件读取已缓存的头像（例如重启后），放入内存"""
+        filename = profile.get("avatar_file")
+        if not filename:
+            return
+        try:
+            data = await asyncio.to_thread(self._read_file, os.path.join(self.cache_dir, filename))
+        except OSError:
+            # 头像文件丢失，refresh 会重新下载
+            return
+        self._avatar_uris[key] = self._make_avatar_uri(filename, data)
+
+    def get_profile(self, username: str) -> Optional[Dict[str, Any]]:
+        """获取渲染使用的资料，只读取内存中的缓存，不访问网络和磁盘
+
+        Returns:
+            Optional[Dict[str, Any]]: login、name、followers、avatar（data URI，没有头像时为空字符串）
+            和 avatar_path（本地头像路径，没有时为None）；没有缓存时为None
+        """
+        key = username.lower()
+        profile = self._profiles.get(key)
+        if profile is None:
+            return None
+        avatar = self._avatar_uris.get(key, "")
+        avatar_path = os.path.join(self.cache_dir, profile["avatar_file"]) if avatar else None
+        return {
+            "login": profile["login"],
+            "name": profile["name"],
+            "followers": profile["followers"],
+            "avatar": avatar,
+            "avatar_path": avatar_path
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        return {
+            "profiles": len(self._profiles),
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "avatar_downloads": self.avatar_downloads
+        }
@@ -1,32 +1,101 @@
 """
 病娇风格的GitHub事件语言模板
 """
-import json
-import os
-from typing import Dict, Any, Optional
-from dataclasses import dataclass
+from string import Formatter
+from typing import Dict, Any, Optional, Callable, Tuple
+from astrbot.api import logger
+from .conf_schema import load_conf_schema
 from .github_event_data import GitHubEventData
+from .metrics import metrics
+
+# PR审查状态到描述的映射
+REVIEW_STATE_MAPPING = {
+    "approved": "同意了",
+    "changes_requested": "要求修改",
+    "commented": "评论了",
+    "dismissed": "忽略了",
+    "pending": "正在审查"
+}
 
 
 class YandereTemplates:
-    def __init__(self, custom_templates: Dict[str, Any] = None):
+    # 按 payload.action 选择模板的事件类型
+    ACTION_EVENT_TYPES = {"IssuesEvent", "PullRequestEvent"}
+    # 存放在其他事件类型下的模板：(所在事件类型, 键) -> (实际事件类型, 动作)
+    ALIASED_TEMPLATES = {
+        ("PullRequestEvent", "review"): ("PullRequestReviewEvent", None),
+        ("PullRequestReviewEvent", "review"): ("PullRequestReviewEvent", None)
+    }
+    # 所有事件通用的模板变量
+    COMMON_FIELDS: Dict[str, Callable[[GitHubEventData], Any]] = {
+        "username": lambda e: e.actor.get("login", ""),
+        "repo": lambda e: e.repo_name
+    }
+    # 各事件类型额外可用的模板变量
+    EVENT_FIELDS: Dict[str, Dict[str, Callable[[GitHubEventData], Any]]] = {
+        "PushEvent": {
+            "commit_count": lambda e: len(e.payload.get("commits", []))
+        },
+        "CreateEvent": {
+            "ref_type": lambda e: e.payload.get("ref_type", ""),
+            "ref": lambda e: e.payload.get("ref", "")
+        },
+        "DeleteEvent": {
+            "ref_type": lambda e: e.payload.get("ref_type", ""),
+            "ref": lambda e: e.payload.get("ref", "")
+        },
+        "IssuesEvent": {
+            "title": lambda e: (e.payload.get("issue") or {}).get("title", ""),
+            "action": lambda e: e.payload.get("action", ""),
+            "label": lambda e: (e.payload.get("label") or {}).get("name", ""),
+            "assignee": lambda e: (e.payload.get("assignee") or {}).get("login", "某人"),
+            "milestone": lambda e: (e.payload.get("milestone") or {}).get("title", "")
+        },
+        "PullRequestEvent": {
+            "title": lambda e: (e.payload.get("pull_request") or {}).get("title", ""),
+            "action": lambda e: e.payload.get("action", "")
+        },
+        "PullRequestReviewEvent": {
+            "title": lambda e: (e.payload.get("pull_request") or {}).get("title", ""),
+            "state": lambda e: REVIEW_STATE_MAPPING.get(
+                (e.payload.get("review") or {}).get("state", "").lower(),
+                (e.payload.get("review") or {}).get("state", "").lower())
+        },
+        "IssueCommentEvent": {
+            "issue_title": lambda e: (e.payload.get("issue") or {}).get("title", ""),
+            "comment": lambda e: (e.payload.get("comment") or {}).get("body", "")
+        },
+        "CommitCommentEvent": {
+            "commit_id": lambda e: (e.payload.get("comment") or {}).get("commit_id", "")[:7],
+            "comment": lambda e: (e.payload.get("comment") or {}).get("body", "")
+        },
+        "MemberEvent": {
+            "target": lambda e: (e.payload.get("member") or {}).get("login", "某个人")
+        }
+    }
+
+    def __init__(self, custom_templates: Dict[str, Any] = None, schema: Optional[Dict[str, Any]] = None):
         """
-        初始化模板
-        :param custom_templates: 用户自定义的模板，会覆盖默认模板
+        初始化模板，并在加载时把每个 (事件类型, 动作) 编译为格式化函数
+        :param custom_templates: 用户自定义的模板，会覆盖默认模板；无效的自定义模板会被拒绝并保留默认模板
+        :param schema: 已加载的配置schema，不传时从共享的schema缓存读取
         """
-        self.templates = self._load_default_templates()
+        self.templates = self._load_default_templates(schema)
+        try:
+            self._formatters = self._compile_templates()
+        except ValueError as e:
+            raise RuntimeError(f"{e}，请检查_conf_schema.json配置文件！")
         if custom_templates:
             self._merge_templates(custom_templates)
+            self._formatters = self._compile_templates()
 
-    def _load_default_templates(self) -> Dict[str, Any]:
+    def _load_default_templates(self, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         从配置schema加载默认模板
         """
-        schema_path = os.path.join(os.path.dirname(
-            os.path.dirname(__file__)), '_conf_schema.json')
         try:
-            with open(schema_path, 'r', encoding='utf-8') as f:
-                schema = json.load(f)
+            if schema is None:
+                schema = load_conf_schema()
             # 从schema中提取所有事件的默认模板
             templates = {}
             for key, value in schema.items():
@@ -78,17 +147,38 @@ class YandereTemplates:
 
     def _merge_templates(self, custom_templates: Dict[str, Any]):
         """
-        合并自定义模板
+        合并自定义模板，逐个校验，无效的自定义模板会被拒绝
         :param custom_templates: 用户自定义的模板
         """
         for event_type, templates in custom_templates.items():
-            if event_type in self.templates:
-                if isinstance(self.templates[event_type], dict):
-                    self.templates[event_type].update(templates)
-                else:
-                    self.templates[event_type] = templates
-            else:
-                self.templates[event_type] = templates
+            if not isinstance(templates, dict):
+                templates = {"template": templates}
+            valid_templates = {}
+            for key, template in templates.items():
+                if key == "enabled":
+                    continue
+                try:
+                    self._validate_template(event_type, key, template)
+                    valid_templates[key] = template
+                except ValueError as e:
+                    logger.error(f"Yandere Github Stalker: 自定义模板无效，已使用默认模板：{e}")
+            if isinstance(self.templates.get(event_type), dict):
+                self.templates[event_type].update(valid_templates)
+            elif valid_templates:
+                self.templates[event_type] = valid_templates
+
+    def _validate_template(self, event_type: str, key: str, template: Any) -> None:
+        """校验单个模板的占位符是否可用
+
+        Raises:
+            ValueError: 模板无效
+        """
+        if event_type == "PushEvent" and key == "commit_message":
+            getters = self._get_commit_field_getters()
+        else:
+            target_type, _ = self.ALIASED_TEMPLATES.get((event_type, key), (event_type, key))
+            getters = self._get_field_getters(target_type)
+        self._compile_formatter(template, getters, f"{event_type}.{key}")
 
     def get_template(self, event_type: str, action: Optional[str] = None) -> str:
         """
@@ -115,129 +205,99 @@ class YandereTemplates:
                     f"[YandereTemplates] {event_type} 的template模板缺失，请在schema中配置！")
         return template_data
 
-    def _format_push_event(self, event: GitHubEventData) -> str:
-        """处理Push事件"""
-        commits = event.payload.get("commits", [])
-        template_vars = {
-            "username": event.actor["login"],
-            "repo": event.repo["name"],
-            "commit_count": len(commits)
-        }
-        template_data = self.templates.get("PushEvent")
-        if not template_data or "template" not in template_data or "commit_message" not in template_data:
-            raise ValueError(
-                "[YandereTemplates] PushEvent模板缺失，请在schema中配置PushEvent的template和commit_message！")
-        message = template_data["template"].format(**template_vars)
-        if commits:
-            commit_template = template_data["commit_message"]
-            for commit in commits[:3]:  # 最多显示3个提交
-                template_vars["message"] = commit["message"]
-                message += "\n" + commit_template.format(**template_vars)
-            if len(commits) > 3:
-                message += "\n还有更多提交...让我慢慢看完♥"
-        return message
+    def _compile_templates(self) -> Dict[Tuple[str, Optional[str]], Callable[[GitHubEventData], str]]:
+        """把所有模板编译为 (事件类型, 动作) -> 格式化函数 的映射"""
+        formatters = {}
+        for event_type, template_data in self.templates.items():
+            if not isinstance(template_data, dict):
+                template_data = {"template": template_data}
+            for key, template in template_data.items():
+                if key == "enabled":
+                    continue
+                if (event_type, key) in self.ALIASED_TEMPLATES:
+                    target = self.ALIASED_TEMPLATES[(event_type, key)]
+                elif event_type in self.ACTION_EVENT_TYPES:
+                    target = (event_type, key)
+                elif key == "template":
+                    target = (event_type, None)
+                else:
+                    # 例如 PushEvent 的 commit_message，随主模板一起编译
+                    continue
+                if event_type == "PushEvent":
+                    formatters[target] = self._compile_push_formatter(
+                        template, template_data.get("commit_message"))
+                else:
+                    formatters[target] = self._compile_formatter(
+                        template, self._get_field_getters(target[0]), f"{event_type}.{key}")
+        return formatters
 
-    def _format_ref_event(self, event: GitHubEventData) -> str:
-        """处理Create/Delete事件"""
-        return self.get_template(event.type).format(
-            username=event.actor["login"],
-            repo=event.repo["name"],
-            ref_type=event.payload.get("ref_type", ""),
-            ref=event.payload.get("ref", "")
-        )
+    @classmethod
+    def _get_field_getters(cls, event_type: str) -> Dict[str, Callable[[GitHubEventData], Any]]:
+        """获取事件类型可用的模板变量及其取值函数"""
+        getters = dict(cls.COMMON_FIELDS)
+        getters.update(cls.EVENT_FIELDS.get(event_type, {}))
+        return getters
 
-    def _format_issue_or_pr_event(self, event: GitHubEventData) -> str:
-        """处理Issue和PR事件"""
-        action = event.payload.get("action", "")
-        
-        # 基础变量
-        template_vars = {
-            "username": event.actor["login"],
-            "repo": event.repo["name"]
+    @classmethod
+    def _get_commit_field_getters(cls) -> Dict[str, Callable[[Tuple[Dict[str, Any], GitHubEventData]], Any]]:
+        """Push事件 commit_message 模板的变量，取值函数接收 (提交, 事件)"""
+        getters = {
+            key: (lambda pair, getter=getter: getter(pair[1]))
+            for key, getter in cls._get_field_getters("PushEvent").items()
         }
-        
-        # 获取标题
-        if event.type == "IssuesEvent":
-            issue = event.payload.get("issue", {})
-            template_vars["title"] = issue.get("title", "")
-            
-            # labeled/unlabeled 需要 label 变量
-            if action in ["labeled", "unlabeled"]:
-                label = event.payload.get("label", {})
-                template_vars["label"] = label.get("name", "")
-            
-            # assigned/unassigned 需要 assignee 变量
-            if action == "assigned":
-                assignee = event.payload.get("assignee", {})
-                template_vars["assignee"] = assignee.get("login", "某人")
-            
-            # milestoned/demilestoned 需要 milestone 变量
-            if action in ["milestoned", "demilestoned"]:
-                milestone = event.payload.get("milestone", {})
-                template_vars["milestone"] = milestone.get("title", "")
-        else:
-            # PullRequestEvent
-            pr = event.payload.get("pull_request", {})
-            template_vars["title"] = pr.get("title", "")
-        
-        return self.get_template(event.type, action).format(**template_vars)
+        getters["message"] = lambda pair: pair[0].get("message", "")
+        return getters
 
-    def _format_comment_event(self, event: GitHubEventData) -> str:
-        """处理评论事件，兼容 CommitCommentEvent 和 IssueCommentEvent"""
-        comment = event.payload.get("comment", {})
-        # 判断是否为 IssueCommentEvent
-        if event.type == "IssueCommentEvent":
-            issue_title = event.payload.get("issue", {}).get("title", "")
-            return self.get_template(event.type).format(
-                username=event.actor["login"],
-                repo=event.repo["name"],
-                issue_title=issue_title,
-                comment=comment.get("body", "")
-            )
-        else:
-            # CommitCommentEvent
-            return self.get_template(event.type).format(
-                username=event.actor["login"],
-                repo=event.repo["name"],
-                commit_id=comment.get("commit_id", "")[:7],
-                comment=comment.get("body", "")
-            )
+    @staticmethod
+    def _compile_formatter(template: str, getters: Dict[str, Callable[[GitHubEventData], Any]],
+                           name: str) -> Callable[[GitHubEventData], str]:
+        """编译单个模板：校验占位符，只计算模板用到的变量
 
-    def _format_member_event(self, event: GitHubEventData) -> str:
-        """处理成员事件"""
-        return self.get_template(event.type).format(
-            username=event.actor["login"],
-            repo=event.repo["name"],
-            target=event.payload.get("member", {}).get("login", "某个人")
-        )
+        Raises:
+            ValueError: 模板不是非空字符串，或使用了不可用的变量
+        """
+        if not isinstance(template, str) or not template:
+            raise ValueError(f"[YandereTemplates] {name} 模板为空或不是字符串")
+        try:
+            parsed = list(Formatter().parse(template))
+        except ValueError as e:
+            raise ValueError(f"[YandereTemplates] {name} 模板格式错误：{e}")
 
-    def _format_simple_event(self, event: GitHubEventData) -> str:
-        """处理简单事件（只需要用户名和仓库名）"""
-        return self.get_template(event.type).format(
-            username=event.actor["login"],
-            repo=event.repo["name"]
-        )
+        fields = {}
+        for _, field_name, _, _ in parsed:
+            if field_name is None:
+                continue
+            base_name = field_name.split(".", 1)[0].split("[", 1)[0]
+            if base_name not in getters:
+                raise ValueError(
+                    f"[YandereTemplates] {name} 模板使用了不可用的变量 {{{field_name}}}，"
+                    f"可用变量：{', '.join('{' + key + '}' for key in getters)}")
+            fields[base_name] = getters[base_name]
+        field_items = tuple(fields.items())
 
-    def _format_pr_review_event(self, event: GitHubEventData) -> str:
-        """处理PR Review事件"""
-        review_state = event.payload.get("review", {}).get("state", "").lower()
-        title = event.payload.get("pull_request", {}).get("title", "")
+        def render(event: GitHubEventData) -> str:
+            return template.format(**{key: getter(event) for key, getter in field_items})
+        return render
 
-        # 将review状态映射为更友好的描述
-        state_mapping = {
-            "approved": "同意了",
-            "changes_requested": "要求修改",
-            "commented": "评论了",
-            "dismissed": "忽略了",
-            "pending": "正在审查"
-        }
-        state = state_mapping.get(review_state, review_state)
+    @classmethod
+    def _compile_push_formatter(cls, template: str, commit_template: Optional[str]) -> Callable[[GitHubEventData], str]:
+        """编译Push事件：主模板加上最多3条提交消息"""
+        if commit_template is None:
+            raise ValueError("[YandereTemplates] PushEvent的commit_message模板缺失，请在schema中配置！")
+        getters = cls._get_field_getters("PushEvent")
+        render_main = cls._compile_formatter(template, getters, "PushEvent.template")
+        render_commit = cls._compile_formatter(
+            commit_template, cls._get_commit_field_getters(), "PushEvent.commit_message")
 
-        return self.get_template("PullRequestReviewEvent", "review").format(
-            username=event.actor["login"],
-            title=title,
-            state=state
-        )
+        def render(event: GitHubEventData) -> str:
+            message = render_main(event)
+            commits = event.payload.get("commits", [])
+            for commit in commits[:3]:  # 最多显示3个提交
+                message += "\n" + render_commit((commit, event))
+            if len(commits) > 3:
+                message += "\n还有更多提交...让我慢慢看完♥"
+            return message
+        return render
 
     def format_event_message(self, event: GitHubEventData) -> str:
         """
@@ -245,28 +305,16 @@ class YandereTemplates:
         :param event: GitHub事件数据
         :return: 格式化后的消息
         """
-        match event.type:
-            case "PushEvent":
-                return self._format_push_event(event)
-
-            case "CreateEvent" | "DeleteEvent":
-                return self._format_ref_event(event)
-
-            case "IssuesEvent" | "PullRequestEvent":
-                return self._format_issue_or_pr_event(event)
-
-            case "PullRequestReviewEvent":
-                return self._format_pr_review_event(event)
-
-            case "CommitCommentEvent" | "IssueCommentEvent":
-                return self._format_comment_event(event)
-
-            case "MemberEvent":
-                return self._format_member_event(event)
-
-            case "WatchEvent" | "ForkEvent" | "PublicEvent":
-                return self._format_simple_event(event)
-
-            case _:
-                # 未知事件类型的默认处理
-                return self._format_simple_event(event)
+        if event.type in self.ACTION_EVENT_TYPES:
+            key = (event.type, event.payload.get("action", ""))
+        else:
+            key = (event.type, None)
+        formatter = self._formatters.get(key)
+        if formatter is None:
+            if key[1]:
+                raise ValueError(
+                    f"[YandereTemplates] {event.type} 的 {key[1]} 模板缺失，请在schema中配置！")
+            raise ValueError(
+                f"[YandereTemplates] {event.type} 模板缺失，请在schema中配置！")
+        with metrics.timer("template_format_seconds", event_type=event.type):
+            return formatter(event)
@@ -0,0 +1,46 @@
+"""
+未安装 AstrBot 时插件用到的最小替代模块，测试和基准共用
+
+只提供插件用到的 logger、配置、消息链和组件。
+"""
+import logging
+import sys
+import types
+
+
+def install_astrbot_stand_ins() -> None:
+    """未安装 AstrBot 时注册插件用到的最小替代模块"""
+    try:
+        import astrbot.api  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    class MessageChain(list):
+        pass
+
+    class Plain:
+        def __init__(self, text: str):
+            self.text = text
+
+    class Image:
+        def __init__(self, file: str):
+            self.file = file
+
+        @classmethod
+        def fromFileSystem(cls, path: str):
+            return cls(path)
+
+    modules = {
+        "astrbot": {},
+        "astrbot.api": {"logger": logging.getLogger("astrbot"), "AstrBotConfig": dict},
+        "astrbot.api.star": {"Context": object},
+        "astrbot.core": {},
+        "astrbot.core.message": {},
+        "astrbot.core.message.message_event_result": {"MessageChain": MessageChain},
+        "astrbot.core.message.components": {"Plain": Plain, "Image": Image},
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
@@ -0,0 +1,93 @@
+"""
+测试公共设施：AstrBot 替代模块（仅在未安装 AstrBot 时）、内存 SQLite 数据库、记录发送的上下文和可控时钟
+
+测试用 asyncio.run 驱动协程，不依赖 pytest-asyncio。
+"""
+import importlib
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import List, Set, Tuple
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests.astrbot_stand_ins import install_astrbot_stand_ins  # noqa: E402
+
+install_astrbot_stand_ins()
+
+
+class MemoryDB:
+    """内存 SQLite；所有会话共享一个连接，测试中的数据库操作按顺序执行"""
+
+    def __init__(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        self.sessionmaker = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def get_db(self):
+        async with self.sessionmaker() as session:
+            yield session
+
+
+class FakeContext:
+    """AstrBot Context 的替代：提供数据库，记录发送的消息，发往 failing_sessions 的消息抛出异常"""
+
+    def __init__(self):
+        self.db = MemoryDB()
+        self.sent: List[Tuple[str, object]] = []
+        self.attempts: List[str] = []
+        self.failing_sessions: Set[str] = set()
+
+    def get_db(self) -> MemoryDB:
+        return self.db
+
+    async def send_message(self, session: str, message_chain) -> bool:
+        self.attempts.append(session)
+        if session in self.failing_sessions:
+            raise RuntimeError("send failed")
+        self.sent.append((session, message_chain))
+        return True
+
+    async def close(self) -> None:
+        await self.db.engine.dispose()
+
+
+@pytest.fixture
+def make_context():
+    """创建 FakeContext；每个测试在自己的事件循环里创建并关闭"""
+    return FakeContext
+
+
+class FakeClock:
+    """可控时钟：代替模块里的 time（time() 和 monotonic() 返回同一个值），sleep 只推进时间"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    async def sleep(self, delay: float) -> None:
+        self.now += delay
+
+
+@pytest.fixture
+def clock(request, monkeypatch):
+    """把参数指定模块中的 time 换成 FakeClock，用间接参数化选择模块：
+
+    pytestmark = pytest.mark.parametrize("clock", ["src.render_cache"], indirect=True)
+    """
+    fake_clock = FakeClock()
+    monkeypatch.setattr(importlib.import_module(request.param), "time", fake_clock)
+    return fake_clock
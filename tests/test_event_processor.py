@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from src.config_manager import ConfigManager
+from src.event_processor import EventProcessor
+from src.github_event_data import GitHubEventData
+from src.pushed_event_id_manager import PushedEventIdManager
+
+USERNAME = "octocat"
+
+
+def make_events(*ids):
+    """按时间倒序（ID从大到小）的事件"""
+    return [GitHubEventData.from_dict({
+        "id": str(event_id), "type": "PushEvent", "actor": {"login": USERNAME},
+        "repo": {"name": f"{USERNAME}/repo"}, "payload": {}, "created_at": "2024-01-01T12:00:00Z"
+    }) for event_id in sorted(ids, reverse=True)]
+
+
+def make_processor(context):
+    config_manager = ConfigManager({"notification_event_limit": 0})
+    return EventProcessor(0, PushedEventIdManager(context), config_manager)
+
+
+def ids_of(events):
+    return [event.id for event in events]
+
+
+def test_pending_marks_dedupe_before_flush(make_context):
+    async def run():
+        context = make_context()
+        try:
+            processor = make_processor(context)
+            events = make_events(101, 102, 103)
+            assert ids_of(await processor.process_events(events, USERNAME)) == ["103", "102", "101"]
+
+            for event in events:
+                await processor.mark_event_as_pushed(event.id, USERNAME, event.created_at)
+            # 尚未写入数据库，内存缓存已经阻止重复推送
+            assert await processor.process_events(events, USERNAME) == []
+            assert processor.has_pending_marks()
+            assert await processor.flush_marks(USERNAME)
+            assert not processor.has_pending_marks()
+            return await make_processor(context).process_events(events, USERNAME)
+        finally:
+            await context.close()
+
+    assert asyncio.run(run()) == []
+
+
+def test_failed_flush_keeps_marks_for_retry(make_context, monkeypatch):
+    async def run():
+        context = make_context()
+        try:
+            processor = make_processor(context)
+            manager = processor.pushed_event_ids_manager
+            add_pushed_event_ids = manager.add_pushed_event_ids
+
+            async def fail(username, events):
+                return False
+
+            await processor.mark_event_as_ignored("201", USERNAME, None)
+            monkeypatch.setattr(manager, "add_pushed_event_ids", fail)
+            assert not await processor.flush_marks()
+            assert processor.has_pending_marks()
+
+            monkeypatch.setattr(manager, "add_pushed_event_ids", add_pushed_event_ids)
+            assert await processor.flush_marks()
+            return await make_processor(context).process_events(make_events(201), USERNAME)
+        finally:
+            await context.close()
+
+    assert asyncio.run(run()) == []
+
+
+def test_watermark_stops_dedup_after_restart(make_context):
+    async def run():
+        context = make_context()
+        try:
+            processor = make_processor(context)
+            for event in make_events(101, 102, 103):
+                await processor.mark_event_as_pushed(event.id, USERNAME, event.created_at)
+            assert await processor.flush_marks(USERNAME)
+
+            # 新的处理器只能从数据库得到高水位：103 及以下都视为已处理
+            restarted = make_processor(context)
+            assert await restarted.get_watermark(USERNAME) == 103
+            new_events = await restarted.process_events(make_events(100, 101, 102, 103, 104, 105), USERNAME)
+            return ids_of(new_events)
+        finally:
+            await context.close()
+
+    assert asyncio.run(run()) == ["105", "104"]
+
+
+def test_failed_watermark_read_is_retried(make_context, monkeypatch):
+    async def run():
+        context = make_context()
+        try:
+            processor = make_processor(context)
+            for event in make_events(301, 302):
+                await processor.mark_event_as_pushed(event.id, USERNAME, event.created_at)
+            assert await processor.flush_marks(USERNAME)
+
+            restarted = make_processor(context)
+            manager = restarted.pushed_event_ids_manager
+            ensure_table_once = manager._ensure_table_once
+
+            async def fail_once():
+                monkeypatch.setattr(manager, "_ensure_table_once", ensure_table_once)
+                raise RuntimeError("database is locked")
+
+            # 读取失败不能让用户以"没有高水位"的状态进入缓存
+            monkeypatch.setattr(manager, "_ensure_table_once", fail_once)
+            with pytest.raises(RuntimeError):
+                await restarted.get_watermark(USERNAME)
+            return await restarted.get_watermark(USERNAME)
+        finally:
+            await context.close()
+
+    assert asyncio.run(run()) == 302
@@ -0,0 +1,46 @@
+import asyncio
+import socket
+
+import pytest
+
+from src.metrics import MetricsRegistry, MetricsServer
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_prometheus_file_is_written(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc("send_total", platform="aiocqhttp", result="ok")
+    path = tmp_path / "textfile" / "yandere.prom"
+    assert asyncio.run(registry.write_prometheus_file(str(path)))
+    assert path.read_text(encoding="utf-8") == registry.render_prometheus()
+    assert "send_total" in path.read_text(encoding="utf-8")
+
+
+def test_failed_port_is_retried_only_after_it_changes():
+    async def run():
+        server = MetricsServer(MetricsRegistry())
+        with socket.socket() as taken:
+            taken.bind(("127.0.0.1", 0))
+            taken.listen()
+            busy_port = taken.getsockname()[1]
+            with pytest.raises(OSError):
+                await server.start(busy_port)
+            # 同一个端口不再尝试绑定，也不再抛出异常
+            await server.start(busy_port)
+            assert not server.is_running
+
+            port = free_port()
+            await server.start(port)
+            try:
+                return server.is_running, server.port, server.failed_port, port
+            finally:
+                await server.stop()
+
+    running, server_port, failed_port, port = asyncio.run(run())
+    assert running and server_port == port
+    assert failed_port == 0
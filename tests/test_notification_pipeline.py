@@ -0,0 +1,339 @@
+"""
+用本地的动态接口驱动真实的通知流水线：ETag 与事件标记的顺序、失败时事件的去向
+"""
+import asyncio
+import copy
+import json
+import os
+
+from aiohttp import web
+
+from src.config_manager import ConfigManager
+from src.event_processor import EventProcessor
+from src.feed_validator_manager import FeedValidatorManager
+from src.github_api import GitHubAPI
+from src.notification_pipeline import NotificationPipeline
+from src.notification_renderer import NotificationRenderer
+from src.notification_sender import NotificationSender
+from src.pushed_event_id_manager import PushedEventIdManager
+from src.received_feed_router import ReceivedFeedRouter
+
+from conftest import ROOT
+
+USERNAME = "octocat"
+LOGIN = "yandere"
+SESSION = "aiocqhttp:GroupMessage:10000"
+
+
+class FakeFeed:
+    """本地的 /users/{u}/events 和 /users/{u}/received_events：ETag 取最新事件ID，记录每次响应的状态
+
+    Token 所属账号为 LOGIN，关注了 USERNAME。
+    """
+
+    def __init__(self):
+        with open(os.path.join(ROOT, "test_data.json"), "r", encoding="utf-8") as f:
+            self.template = json.load(f)[0]
+        self.events = []
+        self.next_id = 40000000000
+        self.responses = []
+        self.base_url = ""
+        self._runner = None
+
+    def add_events(self, count: int) -> list:
+        ids = []
+        for _ in range(count):
+            event = copy.deepcopy(self.template)
+            event["id"] = str(self.next_id)
+            event["actor"] = {"login": USERNAME, "display_login": USERNAME}
+            self.events.insert(0, event)
+            ids.append(event["id"])
+            self.next_id += 1
+        return ids
+
+    async def handle(self, request: web.Request) -> web.Response:
+        etag = f'W/"{self.events[0]["id"]}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.responses.append(304)
+            return web.Response(status=304, headers={"ETag": etag})
+        self.responses.append(200)
+        return web.json_response(self.events, headers={"ETag": etag})
+
+    async def handle_user(self, request: web.Request) -> web.Response:
+        return web.json_response({"login": LOGIN})
+
+    async def handle_following(self, request: web.Request) -> web.Response:
+        return web.json_response([{"login": USERNAME}])
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/users/{username}/events", self.handle)
+        app.router.add_get("/users/{username}/received_events", self.handle)
+        app.router.add_get("/user", self.handle_user)
+        app.router.add_get("/user/following", self.handle_following)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+class Harness:
+    """用真实的 GitHubAPI / EventProcessor / NotificationSender 组装流水线"""
+
+    def __init__(self, context, feed: FakeFeed, **config):
+        self.context = context
+        self.config_manager = ConfigManager({
+            "github_api_base_url": feed.base_url,
+            # 每页大小随事件限制而定，固定的限制让每次请求同一个URL（同一个ETag）
+            "notification_event_limit": 5,
+            "enable_image_notification": False,
+            "platform_send_rate": 0,
+            "outbox_max_attempts": 0,
+            **config
+        })
+        self.github_api = GitHubAPI(self.config_manager, FeedValidatorManager(context))
+        self.pushed_event_ids_manager = PushedEventIdManager(context)
+        self.event_processor = EventProcessor(5, self.pushed_event_ids_manager, self.config_manager)
+        self.renderer = NotificationRenderer(self.config_manager)
+        self.sender = NotificationSender(self.renderer, context, html_render=None)
+        self.pipeline = NotificationPipeline(
+            self.github_api, self.event_processor, self.sender, self.config_manager)
+        self.feed_router = ReceivedFeedRouter(self.github_api, self.config_manager)
+
+    async def poll(self) -> None:
+        future = await self.pipeline.submit(USERNAME, [SESSION])
+        await asyncio.gather(future, return_exceptions=True)
+        await self.pipeline.drain()
+
+    async def poll_feed(self) -> None:
+        """与插件的监控循环一样获取收到的动态并提交，等待处理完"""
+        if not self.pipeline.is_feed_busy():
+            routed_events = await self.feed_router.fetch_routed_events([USERNAME])
+            if routed_events is not None:
+                await self.pipeline.submit_feed(routed_events, [SESSION])
+        await self.pipeline.drain()
+
+    async def stored_ids(self, event_ids) -> set:
+        """从数据库（绕过内存缓存）读取已标记的事件ID"""
+        pushed_ids, _ = await PushedEventIdManager(self.context).get_dedup_snapshot(event_ids, USERNAME)
+        return pushed_ids
+
+    async def close(self) -> None:
+        await self.pipeline.stop()
+        await self.github_api.close()
+
+
+def run_with_harness(make_context, scenario, **config):
+    async def run():
+        context = make_context()
+        feed = FakeFeed()
+        await feed.start()
+        harness = Harness(context, feed, **config)
+        harness.pipeline.start()
+        try:
+            return await scenario(harness, feed, context)
+        finally:
+            await harness.close()
+            await feed.stop()
+            await context.close()
+
+    return asyncio.run(run())
+
+
+def test_etag_is_saved_after_events_are_marked(make_context):
+    async def scenario(harness, feed, context):
+        ids = feed.add_events(2)
+        await harness.poll()
+        await harness.poll()
+        validators = await FeedValidatorManager(context).load_all()
+        return ids, feed, context, validators, await harness.stored_ids(ids)
+
+    ids, feed, context, validators, stored = run_with_harness(make_context, scenario)
+    assert feed.responses == [200, 304]
+    assert len(context.sent) == 2
+    assert set(ids) == stored
+    assert list(validators.values()) == [(f'W/"{ids[-1]}"', None)]
+
+
+def test_failed_fetch_does_not_let_304_skip_the_events(make_context, monkeypatch):
+    async def scenario(harness, feed, context):
+        ids = feed.add_events(2)
+        process_events = harness.event_processor.process_events
+
+        async def fail_once(events, username):
+            monkeypatch.setattr(harness.event_processor, "process_events", process_events)
+            raise RuntimeError("dedup failed")
+
+        monkeypatch.setattr(harness.event_processor, "process_events", fail_once)
+        await harness.poll()
+        assert context.sent == []
+        await harness.poll()
+        return ids, feed, context, await harness.stored_ids(ids)
+
+    ids, feed, context, stored = run_with_harness(make_context, scenario)
+    assert feed.responses == [200, 200]
+    assert len(context.sent) == 2
+    assert set(ids) == stored
+
+
+def test_digest_marks_events_that_could_not_be_formatted(make_context, monkeypatch):
+    async def scenario(harness, feed, context):
+        ids = feed.add_events(3)
+        broken_id = ids[1]
+        process_event = harness.renderer.process_event
+
+        def fail_for_broken(event):
+            if event.id == broken_id:
+                raise ValueError("template error")
+            return process_event(event)
+
+        monkeypatch.setattr(harness.renderer, "process_event", fail_for_broken)
+        await harness.poll()
+        new_ids = feed.add_events(1)
+        await harness.poll()
+        return ids + new_ids, context, await harness.stored_ids(ids + new_ids)
+
+    ids, context, stored = run_with_harness(make_context, scenario, enable_digest_notification=True)
+    # 第一轮一条摘要（两个可展示的事件），第二轮只有新事件
+    assert len(context.sent) == 2
+    assert set(ids) == stored
+
+
+async def poll_twice_with_broken_rendering(harness, feed, context, monkeypatch):
+    """渲染一直失败：事件应当被标记为忽略，第二轮不再重复处理"""
+    ids = feed.add_events(2)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("render failed")
+
+    monkeypatch.setattr(harness.renderer, "create_text_notification", broken)
+    monkeypatch.setattr(harness.renderer, "create_text_digest", broken)
+    await harness.poll()
+    await harness.poll()
+    return ids, context, await harness.stored_ids(ids)
+
+
+def test_digest_render_failure_marks_events_as_ignored(make_context, monkeypatch):
+    async def scenario(harness, feed, context):
+        return await poll_twice_with_broken_rendering(harness, feed, context, monkeypatch)
+
+    ids, context, stored = run_with_harness(make_context, scenario, enable_digest_notification=True)
+    assert context.sent == []
+    assert set(ids) == stored
+
+
+def test_stop_discards_validators_of_dropped_jobs(make_context, monkeypatch):
+    async def scenario(harness, feed, context):
+        ids = feed.add_events(1)
+        deliver = harness.sender.deliver
+        entered = asyncio.Event()
+
+        async def hang(*args, **kwargs):
+            entered.set()
+            await asyncio.Event().wait()
+
+        monkeypatch.setattr(harness.sender, "deliver", hang)
+        await harness.pipeline.submit(USERNAME, [SESSION])
+        await entered.wait()
+        await harness.pipeline.stop()
+
+        monkeypatch.setattr(harness.sender, "deliver", deliver)
+        harness.pipeline.start()
+        await harness.poll()
+        return ids, feed, context, await harness.stored_ids(ids)
+
+    ids, feed, context, stored = run_with_harness(make_context, scenario)
+    assert feed.responses == [200, 200]
+    assert len(context.sent) == 1
+    assert set(ids) == stored
+
+
+def test_render_failure_marks_events_as_ignored(make_context, monkeypatch):
+    async def scenario(harness, feed, context):
+        return await poll_twice_with_broken_rendering(harness, feed, context, monkeypatch)
+
+    ids, context, stored = run_with_harness(make_context, scenario)
+    assert context.sent == []
+    assert set(ids) == stored
+
+
+def test_received_feed_etag_is_saved_after_events_are_marked(make_context):
+    async def scenario(harness, feed, context):
+        ids = feed.add_events(2)
+        await harness.poll_feed()
+        await harness.poll_feed()
+        return ids, feed, context, await harness.stored_ids(ids)
+
+    ids, feed, context, stored = run_with_harness(make_context, scenario, github_token="token")
+    assert feed.responses == [200, 304]
+    assert len(context.sent) == 2
+    assert set(ids) == stored
+
+
+def test_received_feed_failure_does_not_let_304_skip_the_events(make_context, monkeypatch):
+    async def scenario(harness, feed, context):
+        ids = feed.add_events(2)
+        process_events = harness.event_processor.process_events
+
+        async def fail_once(events, username):
+            monkeypatch.setattr(harness.event_processor, "process_events", process_events)
+            raise RuntimeError("dedup failed")
+
+        monkeypatch.setattr(harness.event_processor, "process_events", fail_once)
+        await harness.poll_feed()
+        assert context.sent == []
+        await harness.poll_feed()
+        return ids, feed, context, await harness.stored_ids(ids)
+
+    ids, feed, context, stored = run_with_harness(make_context, scenario, github_token="token")
+    assert feed.responses == [200, 200]
+    assert len(context.sent) == 2
+    assert set(ids) == stored
+
+
+def test_received_feed_is_fetched_again_when_a_busy_user_is_skipped(make_context, monkeypatch):
+    async def scenario(harness, feed, context):
+        ids = feed.add_events(1)
+        deliver = harness.sender.deliver
+        entered, release = asyncio.Event(), asyncio.Event()
+
+        async def wait_for_release(*args, **kwargs):
+            entered.set()
+            await release.wait()
+            return await deliver(*args, **kwargs)
+
+        # 单独轮询的通知还在发送，收到的动态里同一用户的新事件被跳过
+        monkeypatch.setattr(harness.sender, "deliver", wait_for_release)
+        await harness.pipeline.submit(USERNAME, [SESSION])
+        await entered.wait()
+        new_ids = feed.add_events(1)
+        routed_events = await harness.feed_router.fetch_routed_events([USERNAME])
+        await harness.pipeline.submit_feed(routed_events, [SESSION])
+        release.set()
+        await harness.pipeline.drain()
+
+        await harness.poll_feed()
+        return ids + new_ids, feed, context, await harness.stored_ids(ids + new_ids)
+
+    ids, feed, context, stored = run_with_harness(make_context, scenario, github_token="token")
+    assert feed.responses == [200, 200, 200]
+    assert len(context.sent) == 2
+    assert set(ids) == stored
+
+
+def test_rate_limited_poll_reports_no_result(make_context):
+    async def scenario(harness, feed, context):
+        feed.add_events(1)
+        harness.github_api.rate_limiter.blocked_until = float("inf")
+        future = await harness.pipeline.submit(USERNAME, [SESSION])
+        result = await future
+        await harness.pipeline.drain()
+        return result, feed
+
+    result, feed = run_with_harness(make_context, scenario)
+    assert result is None
+    assert feed.responses == []
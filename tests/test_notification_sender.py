@@ -0,0 +1,60 @@
+import asyncio
+import json
+import os
+
+from src.config_manager import ConfigManager
+from src.github_event_data import GitHubEventData
+from src.notification_renderer import NotificationRenderer
+from src.notification_sender import NotificationSender
+from src.render_cache import RenderCache
+
+from conftest import ROOT
+
+USERNAME = "octocat"
+
+
+def load_event() -> GitHubEventData:
+    with open(os.path.join(ROOT, "test_data.json"), "r", encoding="utf-8") as f:
+        return GitHubEventData.from_dict(json.load(f)[0])
+
+
+def test_pillow_fallback_is_not_cached_as_a_pillow_render(make_context, tmp_path, monkeypatch):
+    async def run():
+        context = make_context()
+        renderer = NotificationRenderer(ConfigManager({"image_renderer": "pillow"}))
+        backends = []
+
+        async def html_render(tmpl, data, return_url):
+            backends.append("html")
+            path = tmp_path / f"html-{len(backends)}.png"
+            path.write_bytes(b"html")
+            return str(path)
+
+        async def render_card(username, processed_events, remaining):
+            backends.append("pillow")
+            if backends.count("pillow") == 1:
+                raise RuntimeError("font missing glyph")
+            path = tmp_path / f"pillow-{len(backends)}.png"
+            path.write_bytes(b"pillow")
+            return str(path)
+
+        monkeypatch.setattr(renderer, "get_image_backend", lambda: "pillow")
+        monkeypatch.setattr(renderer, "render_card", render_card)
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=10_000, max_age_seconds=3600)
+        sender = NotificationSender(renderer, context, html_render=html_render, render_cache=cache)
+
+        event = load_event()
+        images = []
+        try:
+            for _ in range(3):
+                rendered = await sender.render_event(USERNAME, event, as_image=True)
+                images.append(open(rendered.image_path, "rb").read())
+                sender.release(rendered)
+        finally:
+            await context.close()
+        return backends, images
+
+    backends, images = asyncio.run(run())
+    # Pillow 失败时用 html_render 补上，但不会让之后的 Pillow 渲染一直命中 HTML 图片
+    assert backends == ["pillow", "html", "pillow"]
+    assert images == [b"html", b"pillow", b"pillow"]
@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+import pytest
+
+from astrbot.core.message.components import Plain
+from astrbot.core.message.message_event_result import MessageChain
+from src.config_manager import ConfigManager
+from src.notification_sender import NotificationSender, RenderedNotification
+from src.outbox_drainer import OutboxDrainer
+from src.outbox_manager import OutboxManager
+
+SESSION = "aiocqhttp:GroupMessage:10000"
+RETRY_DUE = OutboxDrainer.MAX_RETRY_DELAY + 1
+
+# 替换 outbox_drainer 中的 time，每次推进 RETRY_DUE 让重试立即到期
+pytestmark = pytest.mark.parametrize("clock", ["src.outbox_drainer"], indirect=True)
+
+
+def make_drainer(context, tmp_path, max_attempts):
+    config_manager = ConfigManager({"outbox_max_attempts": max_attempts, "outbox_retry_base_seconds": 1})
+    sender = NotificationSender(None, context, html_render=None)
+    outbox_manager = OutboxManager(context, str(tmp_path / "outbox"))
+    return sender, outbox_manager, OutboxDrainer(outbox_manager, sender, config_manager)
+
+
+async def send_until_settled(context, tmp_path, clock, max_attempts):
+    """首次发送失败后一直重试到没有到期的投递，返回 (发送次数, 是否放入了发件箱, 发件箱统计)"""
+    sender, outbox_manager, drainer = make_drainer(context, tmp_path, max_attempts)
+    context.failing_sessions.add(SESSION)
+    rendered = RenderedNotification(MessageChain([Plain("hi")]), text="hi")
+    results = await sender.deliver(rendered, [SESSION])
+    queued = await drainer.enqueue("octocat", rendered, results)
+    for _ in range(max_attempts + 2):
+        clock.advance(RETRY_DUE)
+        if not await drainer.drain_once():
+            break
+    return len(context.attempts), queued, await outbox_manager.get_counts()
+
+
+@pytest.mark.parametrize("max_attempts", [1, 2, 6])
+def test_max_attempts_counts_the_first_send(make_context, tmp_path, clock, max_attempts):
+    async def run():
+        context = make_context()
+        try:
+            return await send_until_settled(context, tmp_path, clock, max_attempts)
+        finally:
+            await context.close()
+
+    sends, queued, counts = asyncio.run(run())
+    assert sends == max_attempts
+    assert queued == (max_attempts > 1)
+    assert counts == {"pending": 0, "dead": 1 if max_attempts > 1 else 0}
+
+
+def test_zero_max_attempts_sends_once_without_outbox(make_context, tmp_path, clock):
+    async def run():
+        context = make_context()
+        try:
+            return await send_until_settled(context, tmp_path, clock, 0)
+        finally:
+            await context.close()
+
+    sends, queued, counts = asyncio.run(run())
+    assert (sends, queued) == (1, False)
+    assert counts == {"pending": 0, "dead": 0}
+
+
+def test_retry_delivers_and_removes_the_outbox_entry(make_context, tmp_path, clock):
+    async def run():
+        context = make_context()
+        try:
+            sender, outbox_manager, drainer = make_drainer(context, tmp_path, 3)
+            context.failing_sessions.add(SESSION)
+            rendered = RenderedNotification(MessageChain([Plain("hi")]), text="hi")
+            assert await drainer.enqueue("octocat", rendered, await sender.deliver(rendered, [SESSION]))
+
+            assert await drainer.drain_once() == 0  # 还没到重试时间
+            context.failing_sessions.clear()
+            clock.advance(RETRY_DUE)
+            assert await drainer.drain_once() == 1
+            assert await drainer.drain_once() == 0
+            return context, await outbox_manager.get_counts(), await drainer.get_stats()
+        finally:
+            await context.close()
+
+    context, counts, stats = asyncio.run(run())
+    assert [session for session, _ in context.sent] == [SESSION]
+    assert context.sent[0][1][0].text == "hi"
+    assert counts == {"pending": 0, "dead": 0}
+    assert (stats["retried"], stats["recovered"], stats["dead_lettered"]) == (1, 1, 0)
+
+
+def test_image_copy_is_kept_until_the_retry_succeeds(make_context, tmp_path, clock):
+    async def run():
+        context = make_context()
+        try:
+            _, outbox_manager, _ = make_drainer(context, tmp_path, 3)
+            image_path = tmp_path / "render.png"
+            image_path.write_bytes(b"\x89PNG")
+            assert await outbox_manager.enqueue("octocat", None, str(image_path), [SESSION], 1, 0)
+            # 原图在发送后可能被渲染缓存删除，发件箱保留自己的副本
+            image_path.unlink()
+            due = await outbox_manager.get_due(clock.time(), 10)
+            stored_path = due[0]["image_path"]
+            copied = open(stored_path, "rb").read()
+            assert await outbox_manager.record_attempts(
+                [{"outbox_id": due[0]["outbox_id"], "session": SESSION, "delivered": True}])
+            return copied, stored_path, await outbox_manager.get_counts()
+        finally:
+            await context.close()
+
+    copied, stored_path, counts = asyncio.run(run())
+    assert copied == b"\x89PNG"
+    assert not os.path.exists(stored_path)
+    assert counts == {"pending": 0, "dead": 0}
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from src import platform_rate_limiter
+from src.config_manager import ConfigManager
+from src.platform_rate_limiter import PlatformRateLimiter
+
+pytestmark = pytest.mark.parametrize("clock", ["src.platform_rate_limiter"], indirect=True)
+
+
+@pytest.fixture(autouse=True)
+def sleep_on_clock(clock, monkeypatch):
+    """等待令牌时只推进时钟"""
+    monkeypatch.setattr(platform_rate_limiter.asyncio, "sleep", clock.sleep)
+
+
+def test_bucket_allows_burst_then_paces_at_rate(clock):
+    async def run():
+        limiter = PlatformRateLimiter(ConfigManager({"platform_send_rate": 2, "platform_send_burst": 3}))
+        started = clock.now
+        finished = []
+        for _ in range(5):
+            await limiter.acquire("aiocqhttp:GroupMessage:1")
+            finished.append(clock.now - started)
+        return finished, limiter.get_stats()
+
+    finished, stats = asyncio.run(run())
+    assert finished == pytest.approx([0, 0, 0, 0.5, 1.0])
+    assert stats["throttled"] == 2
+    assert stats["throttled_seconds"] == pytest.approx(1.0)
+
+
+def test_platforms_have_separate_buckets(clock):
+    async def run():
+        limiter = PlatformRateLimiter(ConfigManager({"platform_send_rate": 1, "platform_send_burst": 1}))
+        await limiter.acquire("aiocqhttp:GroupMessage:1")
+        await limiter.acquire("telegram:GroupMessage:2")
+        after_two_platforms = clock.now
+        await limiter.acquire("aiocqhttp:FriendMessage:3")
+        return after_two_platforms, clock.now, limiter.get_stats()
+
+    started = clock.now
+    after_two_platforms, after_same_platform, stats = asyncio.run(run())
+    assert after_two_platforms == started
+    assert after_same_platform == pytest.approx(started + 1)
+    assert stats["platforms"] == 2
+
+
+def test_zero_rate_disables_limiting(clock):
+    async def run():
+        limiter = PlatformRateLimiter(ConfigManager({"platform_send_rate": 0}))
+        for _ in range(20):
+            await limiter.acquire("aiocqhttp:GroupMessage:1")
+        return limiter.get_stats()
+
+    started = clock.now
+    assert asyncio.run(run()) == {"platforms": 0, "throttled": 0, "throttled_seconds": 0.0}
+    assert clock.now == started
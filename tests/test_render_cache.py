@@ -0,0 +1,104 @@
+import asyncio
+import os
+
+import pytest
+
+from src.render_cache import RenderCache
+
+MAX_AGE = 3600
+
+pytestmark = pytest.mark.parametrize("clock", ["src.render_cache"], indirect=True)
+
+
+def make_renderer(tmp_path, calls, size=100):
+    """返回渲染函数：每次调用写一个新的临时图片并记录调用"""
+    async def render():
+        calls.append(1)
+        path = tmp_path / f"render-{len(calls)}.png"
+        path.write_bytes(str(len(calls)).encode() * size)
+        return str(path)
+    return render
+
+
+def test_pinned_entry_is_served_past_max_age_and_evicted_after_unpin(tmp_path, clock):
+    async def run():
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=10_000, max_age_seconds=MAX_AGE)
+        calls = []
+        render = make_renderer(tmp_path, calls)
+        key, path = await cache.get_or_render("<html>a</html>", render)
+        content = open(path, "rb").read()
+
+        clock.advance(MAX_AGE + 1)
+        # 仍在发送中的文件过期后再次请求：直接复用，不重新渲染、不覆盖
+        key2, path2 = await cache.get_or_render("<html>a</html>", render)
+        assert (key2, path2, len(calls)) == (key, path, 1)
+        assert open(path, "rb").read() == content
+
+        cache.unpin(key)
+        assert os.path.exists(path)  # 还有一次固定
+        cache.unpin(key2)
+        assert not os.path.exists(path)
+        assert cache.get(key) is None
+
+    asyncio.run(run())
+
+
+def test_unpinned_expired_entry_is_rendered_again(tmp_path, clock):
+    async def run():
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=10_000, max_age_seconds=MAX_AGE)
+        calls = []
+        render = make_renderer(tmp_path, calls)
+        key, _ = await cache.get_or_render("<html>a</html>", render)
+        cache.unpin(key)
+
+        clock.advance(MAX_AGE + 1)
+        assert cache.get(key) is None
+        _, path = await cache.get_or_render("<html>a</html>", render)
+        assert len(calls) == 2
+        assert open(path, "rb").read().startswith(b"2")
+
+    asyncio.run(run())
+
+
+def test_size_eviction_skips_pinned_entries(tmp_path, clock):
+    async def run():
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=250, max_age_seconds=0)
+        calls = []
+        render = make_renderer(tmp_path, calls)
+        pinned_key, pinned_path = await cache.get_or_render("<html>a</html>", render)
+        key_b, path_b = await cache.get_or_render("<html>b</html>", render)
+        cache.unpin(key_b)
+        key_c, path_c = await cache.get_or_render("<html>c</html>", render)
+        cache.unpin(key_c)
+
+        # 超出 250 字节时淘汰最久未用的未固定文件 b，固定中的 a 保留
+        assert os.path.exists(pinned_path)
+        assert not os.path.exists(path_b)
+        assert os.path.exists(path_c)
+        assert cache.get_stats()["bytes"] == 200
+
+        cache.unpin(pinned_key)
+        assert cache.get(pinned_key) == pinned_path
+
+    asyncio.run(run())
+
+
+def test_concurrent_identical_renders_share_one_render(tmp_path, clock):
+    async def run():
+        cache = RenderCache(str(tmp_path / "cache"), max_bytes=10_000, max_age_seconds=MAX_AGE)
+        calls = []
+        render = make_renderer(tmp_path, calls)
+
+        async def slow_render():
+            await asyncio.sleep(0.01)
+            return await render()
+
+        results = await asyncio.gather(*(cache.get_or_render("<html>a</html>", slow_render) for _ in range(3)))
+        assert len(calls) == 1
+        assert len(set(results)) == 1
+        key = results[0][0]
+        for _ in results:
+            cache.unpin(key)
+        assert cache.get_stats()["hits"] == 2
+
+    asyncio.run(run())
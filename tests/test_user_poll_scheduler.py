@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.config_manager import ConfigManager
+from src.user_poll_scheduler import UserPollScheduler
+
+BASE_INTERVAL = 60
+
+
+pytestmark = pytest.mark.parametrize("clock", ["src.user_poll_scheduler"], indirect=True)
+
+
+def make_scheduler(max_interval=600):
+    return UserPollScheduler(ConfigManager({"max_user_poll_interval": max_interval}))
+
+
+def test_new_users_are_due_immediately_and_removed_users_are_dropped(clock):
+    scheduler = make_scheduler()
+    scheduler.sync_users(["alice", "bob"])
+    assert sorted(scheduler.pop_due()) == ["alice", "bob"]
+    assert scheduler.pop_due() == []
+
+    scheduler.reschedule("alice", BASE_INTERVAL, True, None)
+    scheduler.reschedule("bob", BASE_INTERVAL, True, None)
+    scheduler.sync_users(["alice"])
+    clock.advance(BASE_INTERVAL)
+    assert scheduler.pop_due() == ["alice"]
+    assert scheduler.get_next_due_in() is None
+
+
+def test_idle_users_back_off_exponentially_up_to_the_maximum(clock):
+    scheduler = make_scheduler(max_interval=600)
+    intervals = [scheduler.reschedule("alice", BASE_INTERVAL, False, None) for _ in range(6)]
+    assert intervals == [120, 240, 480, 600, 600, 600]
+    assert scheduler.reschedule("alice", BASE_INTERVAL, True, None) == BASE_INTERVAL
+
+
+def test_interval_follows_the_age_of_the_latest_event(clock):
+    scheduler = make_scheduler(max_interval=3600)
+    now = datetime.utcnow()
+    assert scheduler.reschedule("alice", BASE_INTERVAL, False, now - timedelta(minutes=10)) == BASE_INTERVAL
+    assert scheduler.reschedule("alice", BASE_INTERVAL, False, now - timedelta(hours=3)) == BASE_INTERVAL * 4
+    assert scheduler.reschedule("alice", BASE_INTERVAL, False, now - timedelta(days=30)) == 3600
+
+
+def test_rescheduling_replaces_the_previous_due_time(clock):
+    scheduler = make_scheduler()
+    scheduler.reschedule("alice", BASE_INTERVAL, True, None)
+    scheduler.reschedule("alice", BASE_INTERVAL, False, None)
+    assert scheduler.get_user_schedule("alice") == (120, 120)
+
+    clock.advance(BASE_INTERVAL)
+    # 旧的到期条目已失效，不会提前取出
+    assert scheduler.pop_due() == []
+    assert scheduler.get_next_due_in() == 60
+    clock.advance(60)
+    assert scheduler.pop_due() == ["alice"]
+
+
+def test_skipped_polls_do_not_count_as_idle(clock):
+    scheduler = make_scheduler(max_interval=3600)
+    assert scheduler.reschedule("alice", BASE_INTERVAL, False, None) == 120
+    # 触发速率限制没有请求：保持当前退避，不再翻倍
+    assert scheduler.reschedule("alice", BASE_INTERVAL, None, None) == 120
+    assert scheduler.reschedule("alice", BASE_INTERVAL, None, None) == 120
+    assert scheduler.reschedule("bob", BASE_INTERVAL, None, None) == BASE_INTERVAL
+    assert scheduler.reschedule("alice", BASE_INTERVAL, False, None) == 240
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from src.config_manager import ConfigManager
+from src.github_api import GitHubAPI
+from src.user_profile_cache import UserProfileCache
+
+USERNAME = "octocat"
+TOKEN = "token"
+TTL = 3600
+
+pytestmark = pytest.mark.parametrize("clock", ["src.user_profile_cache"], indirect=True)
+
+
+class FakeProfiles:
+    """本地的 /users/{u} 和头像地址，记录每次请求的路径、Authorization 和 If-None-Match"""
+
+    def __init__(self):
+        self.requests = []
+        self.base_url = ""
+        self._runner = None
+
+    async def handle_user(self, request: web.Request) -> web.Response:
+        self.requests.append((request.path, request.headers.get("Authorization"), request.headers.get("If-None-Match")))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.json_response({
+            "login": USERNAME, "name": "The Octocat", "followers": 3,
+            "avatar_url": f"{self.base_url}/avatars/1?v=4"
+        }, headers={"ETag": '"v1"'})
+
+    async def handle_avatar(self, request: web.Request) -> web.Response:
+        self.requests.append((request.path, request.headers.get("Authorization"), None))
+        return web.Response(body=b"GIF89a" + b"\0" * 16, content_type="image/gif")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/users/{username}", self.handle_user)
+        app.router.add_get("/avatars/{id}", self.handle_avatar)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+def test_profile_is_revalidated_with_etag_and_avatar_is_fetched_without_token(tmp_path, clock):
+    async def run():
+        server = FakeProfiles()
+        await server.start()
+        github_api = GitHubAPI(ConfigManager({"github_token": TOKEN, "github_api_base_url": server.base_url}))
+        try:
+            cache = UserProfileCache(github_api, str(tmp_path), TTL)
+            await cache.refresh(USERNAME)
+            profile = cache.get_profile(USERNAME)
+
+            clock.advance(TTL + 1)
+            await cache.refresh(USERNAME)
+            return server.requests, profile, cache, github_api.get_connection_stats()
+        finally:
+            await github_api.close()
+            await server.stop()
+
+    requests, profile, cache, stats = asyncio.run(run())
+    assert requests == [
+        (f"/users/{USERNAME}", f"Bearer {TOKEN}", None),
+        ("/avatars/1", None, None),
+        (f"/users/{USERNAME}", f"Bearer {TOKEN}", '"v1"'),
+    ]
+    assert profile["name"] == "The Octocat"
+    assert profile["avatar"].startswith("data:image/gif;base64,")
+    assert (cache.requests, cache.not_modified, cache.avatar_downloads) == (2, 1, 1)
+    assert (stats["requests"], stats["not_modified"]) == (3, 1)
+    assert cache.is_fresh(USERNAME)